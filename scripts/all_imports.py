@@ -9,9 +9,11 @@ import pandas as pd
 from Bio import Entrez
 
 # Imports de módulos internos do projeto
-from scripts.utils import initialize_environment, save_data_to_file, load_csv_to_dataframe, save_xml_data, clear_all_processec, clear_directory
-from scripts.ncbi import request_count, request_data
-from scripts.parsing import parse_xml_to_bibliometrix_df, parse_xml_to_pubmed_df
+from scripts.utils import initialize_environment, save_data_to_file, save_side_tables, load_side_tables, load_csv_to_dataframe, save_xml_data, clear_all_processec, clear_directory
+from scripts.ncbi import request_count, request_count_outcome, resolve_queries, request_data, request_summaries, resolve_dois, resolve_titles, fetch_articles, HistorySession, AsyncEntrezClient, request_count_many, request_data_many
+from scripts.harvest import TermHarvester, harvest_term
+from scripts.coordinator import WorkQueue, Worker, run_workers, use_shared_budget
+from scripts.parsing import parse_xml_to_bibliometrix_df, parse_xml_to_pubmed_df, parse_xml_to_dfs, RecordAccumulator, SIDE_TABLES, register_shape, iter_xml_records, parse_esummary_to_bibliometrix_df, records_to_enrich
 from scripts.mapping import map_pubmed_to_bibliometrix, map_pubmed_to_bibtex, map_pubmed_to_ris, map_to_pubmed_format, map_web_of_science_file, map_pubmed_to_bibliometrix_extended
 
 
@@ -28,13 +30,38 @@ __all__ = [
     "Entrez",
     "initialize_environment",
     "save_data_to_file",
+    "save_side_tables",
+    "load_side_tables",
     "load_csv_to_dataframe",
     "save_xml_data",
     "clear_all_processec",
     "request_count",
+    "request_count_outcome",
+    "resolve_queries",
     "request_data",
+    "request_summaries",
+    "resolve_dois",
+    "resolve_titles",
+    "fetch_articles",
+    "HistorySession",
+    "AsyncEntrezClient",
+    "request_count_many",
+    "request_data_many",
+    "TermHarvester",
+    "harvest_term",
+    "WorkQueue",
+    "Worker",
+    "run_workers",
+    "use_shared_budget",
     "parse_xml_to_bibliometrix_df",
     "parse_xml_to_pubmed_df",
+    "parse_xml_to_dfs",
+    "RecordAccumulator",
+    "SIDE_TABLES",
+    "register_shape",
+    "iter_xml_records",
+    "parse_esummary_to_bibliometrix_df",
+    "records_to_enrich",
     "map_pubmed_to_bibliometrix",
     "map_pubmed_to_bibtex", 
     "map_pubmed_to_ris", 
@@ -0,0 +1,281 @@
+"""
+baseline.py
+
+This module resolves a reference list against locally downloaded PubMed baseline and
+update files (`pubmed*.xml.gz` from https://ftp.ncbi.nlm.nih.gov/pubmed/), without
+querying the E-utilities. The files are streamed in parallel, one file per worker
+process. Each worker keeps only the articles whose PMID or DOI is in the index of the
+input rows, and reports every other PMID of the file, and the PMIDs it deletes, as
+removed. The results are then applied in file order, so an update file overrides the
+earlier versions of its articles, even when the new version no longer matches the
+index, and a `DeleteCitation` removes them. Only the articles that remain are sent through the
+parsers.
+
+Run with `python -m scripts.baseline /data/pubmed/baseline /data/pubmed/updatefiles`,
+then `python -m scripts.pipeline --resume` queries PubMed only for the rows that were
+not found.
+"""
+
+import argparse
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from scripts import ncbi
+from scripts import parsing
+from scripts import utils
+from scripts.journal import JobJournal, input_fingerprint, FOUND
+
+
+BASELINE_PATTERN = "pubmed*.xml.gz"
+
+# Set in each worker process by `_init_worker`
+_INDEX = None
+
+
+class ReferenceIndex:
+    """
+    Hash index of the normalized DOIs and PMIDs of the input rows.
+
+    Example:
+        index = ReferenceIndex(df_search)
+        rows = index.rows_for(pmid, dois)
+    """
+
+    def __init__(self, df, doi_column="doi", pmid_column="pmid"):
+        self.dois = {}
+        self.pmids = {}
+
+        if doi_column in df.columns:
+            for row, doi in zip(df.index, df[doi_column]):
+                key = ncbi.normalize_doi(doi)
+                if key:
+                    self.dois.setdefault(key, []).append(row)
+        if pmid_column in df.columns:
+            for row, pmid in zip(df.index, df[pmid_column]):
+                if pd.notna(pmid) and str(pmid).strip():
+                    self.pmids.setdefault(str(pmid).strip().split(".")[0], []).append(row)
+
+    def __len__(self):
+        return len(self.dois) + len(self.pmids)
+
+    def keys(self):
+        """
+        Returns the DOI and PMID keys, the part of the index sent to the workers.
+        """
+        return frozenset(self.dois), frozenset(self.pmids)
+
+    def rows_for(self, pmid, dois):
+        """
+        Returns the input rows that reference an article, by PMID or by any of its DOIs.
+        """
+        rows = list(self.pmids.get(pmid, []))
+        for doi in dois:
+            rows.extend(self.dois.get(doi, []))
+        return list(dict.fromkeys(rows))
+
+
+def article_dois(article):
+    """
+    Returns the normalized DOIs of a PubmedArticle element (ELocationID and the article
+    ids of PubmedData; DOIs of the reference list are ignored).
+    """
+    dois = []
+    for element in article.findall("MedlineCitation/Article/ELocationID"):
+        if element.get("EIdType") == "doi":
+            dois.append(element.text)
+    for element in article.findall("PubmedData/ArticleIdList/ArticleId"):
+        if element.get("IdType") == "doi":
+            dois.append(element.text)
+    return tuple(dict.fromkeys(doi for doi in map(ncbi.normalize_doi, dois) if doi))
+
+
+def baseline_files(paths):
+    """
+    Expands directories into their `pubmed*.xml.gz` files and sorts all files by name,
+    which is the order NLM publishes them in (baseline first, then the updates).
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, BASELINE_PATTERN)))
+        else:
+            files.append(path)
+    return sorted(files, key=os.path.basename)
+
+
+def _init_worker(keys, backend):
+    global _INDEX
+    logging.disable(logging.INFO)
+    parsing.set_xml_backend(backend)
+    _INDEX = keys
+
+
+def scan_file(path, keys=None):
+    """
+    Streams one baseline or update file and keeps the articles of the index.
+
+    Args:
+        path (str): A `pubmed*.xml.gz` file (or plain XML).
+        keys (tuple, optional): (DOI keys, PMID keys) from `ReferenceIndex.keys`.
+            Defaults to the index given to the worker process.
+
+    Returns:
+        dict: {pmid: (article XML bytes, DOIs)} for the matching articles and
+        {pmid: None} for the PMIDs deleted by the file or whose version in it does not
+        match the index, in file order.
+    """
+    dois, pmids = keys or _INDEX
+    events = {}
+    for element in parsing.iter_article_elements(path, tags=("PubmedArticle", "DeleteCitation")):
+        if element.tag == "DeleteCitation":
+            for pmid in element.findall("PMID"):
+                events.pop(pmid.text, None)
+                events[pmid.text] = None
+            continue
+
+        pmid = element.findtext("MedlineCitation/PMID")
+        article_keys = article_dois(element)
+        # A later version replaces the earlier ones, also when it no longer matches
+        events.pop(pmid, None)
+        if pmid in pmids or any(doi in dois for doi in article_keys):
+            events[pmid] = (parsing.XML_BACKEND.tostring(element), article_keys)
+        else:
+            events[pmid] = None
+    return events
+
+
+def apply_updates(results):
+    """
+    Applies the events of every file in file order: the last version of each PMID
+    wins, and a deletion or a version that does not match the index removes the
+    versions published before it.
+
+    Args:
+        results (iterable): The `scan_file` results of every file, in file order.
+
+    Returns:
+        dict: {pmid: (article XML bytes, DOIs)} of the articles that remain.
+    """
+    articles = {}
+    for events in results:
+        for pmid, event in events.items():
+            if event is None:
+                articles.pop(pmid, None)
+            else:
+                articles[pmid] = event
+    return articles
+
+
+def wrap_article(article_xml):
+    """
+    Wraps one serialized PubmedArticle like an EFetch response, for the parsers and the XmlStore.
+    """
+    return b'<?xml version="1.0" encoding="utf-8"?>\n<PubmedArticleSet>' + article_xml + b"</PubmedArticleSet>"
+
+
+def ingest_baseline(df_search, paths, processes=None, backend="etree", store=None):
+    """
+    Finds the input rows in local baseline and update files and parses their articles.
+
+    A row is found when exactly one remaining article has its PMID or DOI; rows that
+    match several articles are left for the E-utilities, like ambiguous searches. Only
+    the last published version of a PMID is considered.
+
+    Args:
+        df_search (pd.DataFrame): Input rows with the 'doi' (and optionally 'pmid') columns.
+        paths (list): Baseline/update files or directories that contain them.
+        processes (int, optional): Worker processes. Defaults to the number of CPUs.
+        backend (str): XML backend of the workers.
+        store (XmlStore, optional): Stores the XML of the found articles, for `reparse`.
+
+    Returns:
+        tuple: ({"bibliometrix": DataFrame, "pubmed": DataFrame}, {row: pmid} of the
+        found rows).
+    """
+    index = ReferenceIndex(df_search)
+    files = baseline_files(paths)
+    processes = min(processes or os.cpu_count() or 1, max(len(files), 1))
+    logging.info(f"Baseline ingest: {len(files)} files, {len(index)} keys, {processes} processes")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(index.keys(), backend)) as executor:
+        # Applied while the files arrive, so only the matching articles are kept in memory
+        articles = apply_updates(executor.map(scan_file, files))
+
+    matches = {}
+    for pmid, (_, dois) in articles.items():
+        for row in index.rows_for(pmid, dois):
+            matches.setdefault(row, []).append(pmid)
+    found = {row: pmids[0] for row, pmids in matches.items() if len(pmids) == 1}
+    for row, pmids in matches.items():
+        if len(pmids) > 1:
+            logging.info({"error": "Baseline match is ambiguous", "row": int(row), "query": pmids})
+
+    accumulator = parsing.RecordAccumulator(["bibliometrix", "pubmed"])
+    for pmid in sorted(set(found.values()), key=int):
+        xml_data = wrap_article(articles[pmid][0])
+        accumulator.add_xml(xml_data)
+        if store is not None:
+            store.put(pmid, xml_data)
+
+    logging.info(
+        f"Baseline ingest: {len(found)} of {len(df_search)} rows found "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return accumulator.flush(), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve the reference list against local PubMed baseline files.")
+    parser.add_argument("paths", nargs="+", help="pubmed*.xml.gz files or directories that contain them")
+    parser.add_argument("--processes", type=int, help="worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    # initialize_environment resolves the project root as the parent of the working directory
+    os.chdir(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "notebook"))
+    utils.initialize_environment()
+    config = utils.CONFIG
+    input_file = os.path.join(utils.INPUT_PATH, config["files"].get("file_data_input", "InputSearchDoi.csv"))
+    pubmed_file = os.path.join(utils.OUTPUT_PATH, config["files"].get("file_parsing_pubmed", "PubMed_Metadata.csv"))
+    bibliometrix_file = os.path.join(
+        utils.OUTPUT_PATH, config["files"].get("file_parsing_bibliometrix", "Bibliometrix_Metadata.csv")
+    )
+    journal_file = os.path.join(utils.OUTPUT_PATH, config["files"].get("file_job_journal", "./metadata/job_journal.sqlite"))
+
+    df_search = utils.load_csv_to_dataframe(input_file, "|")
+    store = utils.XML_STORE if config["config"].get("save_xml", False) else None
+    dfs, found = ingest_baseline(
+        df_search, args.paths, args.processes, config["config"].get("xml_backend", "etree"), store,
+    )
+
+    # The found rows are committed to the job journal of the harvest, which then only
+    # queries PubMed for the remaining rows
+    journal = JobJournal(
+        os.path.normpath(journal_file), outputs=[pubmed_file, bibliometrix_file],
+        fingerprint=input_fingerprint(df_search),
+    )
+    journal.recover()
+    finished = journal.finished_rows()
+    done = journal.processed_pmids()
+    new_rows = {row: pmid for row, pmid in found.items() if int(row) not in finished}
+    for row, pmid in new_rows.items():
+        journal.record_article(pmid, row)
+        journal.record_row(row, FOUND, 1, [pmid])
+
+    written = set(new_rows.values()) - done
+    committed = journal.commit({
+        path: df[df["PMID"].isin(written)].replace(r"\n", " ", regex=True) if "PMID" in df.columns else None
+        for path, df in ((pubmed_file, dfs["pubmed"]), (bibliometrix_file, dfs["bibliometrix"]))
+    })
+    journal.close()
+    print(f"{len(found)} of {len(df_search)} rows found in the baseline files, {committed} committed to {journal_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+"""
+bench_parsing.py
+
+Benchmark of the PubMed XML parsers on synthetic MEDLINE records (scripts.mock_eutils).
+It compares the per-field descendant searches of the original parsers (one
+`ET.fromstring` and one set of `.//` lookups per output shape) with the compiled
+single-walk extraction of `parse_xml_records`, and checks that both give the same rows.
+The compiled parser is timed with every requested XML backend (scripts.xml_backend).
+Stored PubmedArticleSet files (e.g. EFetch batches) can be measured instead of the
+synthetic records with `--xml`.
+
+The legacy side is given each article as its own `root`, so its ELocationID and
+ArticleId columns are already scoped to the article like the compiled parser's. It
+measures the cost of the per-field lookups; it does not reproduce the rows of the
+original pubmed parser, which read those columns from the whole document.
+
+Run with `python -m scripts.bench_parsing --articles 2000 --backend etree lxml --output bench_output.txt`.
+"""
+
+import argparse
+import logging
+import time
+import xml.etree.ElementTree as ET
+
+from scripts import parsing
+from scripts.mock_eutils import SyntheticCorpus
+
+
+def _bibliometrix_record_findtext(article, root):
+    """
+    Builds the bibliometrix row of a PubmedArticle element with one descendant search
+    per field. Reference for `parsing.BIBLIOMETRIX_FIELDS`.
+    """
+    row = {}
+
+    # Direct mapping with XML tag names
+    row["PMID"] = article.findtext('.//PMID')
+    row["ArticleTitle"] = article.findtext('.//ArticleTitle')
+    row["JournalTitle"] = article.findtext('.//Journal/Title')
+    row["ISOAbbreviation"] = article.findtext('.//Journal/ISOAbbreviation')
+    row["Country"] = article.findtext('.//MedlineJournalInfo/Country')
+    row["Volume"] = article.findtext('.//JournalIssue/Volume')
+    row["Pages"] = article.findtext('.//Pagination/MedlinePgn')
+    row["ISSN"] = article.findtext('.//ISSN')
+    row["Language"] = article.findtext('.//Language')
+    row["AbstractText"] = parsing.extract_abstract_text(article) 
+    row["CopyrightInformation"] = article.findtext('.//Abstract/CopyrightInformation', "")
+    row["DOI"] = article.findtext(".//ELocationID[@EIdType='doi']")
+    row["PII"] = article.findtext(".//ELocationID[@EIdType='pii']")
+
+    row["PublicationYear"] = article.findtext('.//JournalIssue/PubDate/Year')
+    row["PublicationSeason"] = article.findtext('.//JournalIssue/PubDate/Season')
+
+
+    # Authors and affiliations
+    authors = []
+    affiliations = []
+    for author in article.findall('.//Author'):
+        last_name = author.findtext('LastName', default="")
+        fore_name = author.findtext('ForeName', default="")
+        initials = author.findtext('Initials', default="")
+        full_name = f"{last_name}, {fore_name} {initials}".strip(", ")
+        authors.append(full_name)
+
+        affiliation = author.findtext('.//AffiliationInfo/Affiliation', default="")
+        if affiliation:
+            affiliations.append(affiliation)
+
+    row["Authors"] = "; ".join(authors)
+    row["Affiliations"] = "; ".join(affiliations)
+
+    # Keywords and MeSH terms
+    keywords = [kw.text for kw in article.findall('.//Keyword') if kw.text]
+    #mesh_terms = [
+    #    f"{mesh.findtext('DescriptorName')} (MajorTopic: {mesh.find('DescriptorName').get('MajorTopicYN', 'N')})"
+    #    for mesh in article.findall('.//MeshHeading')
+    #]
+
+    row["Keywords"] = "; ".join(keywords)
+    #row["MeshTerms"] = "; ".join(mesh_terms)
+    row["MeshTerms"] = parsing.process_mesh_headings_bibliometrix(article)
+
+    # Chemical substances
+    chemicals = [
+        chemical.findtext('NameOfSubstance', default="")
+        for chemical in article.findall('.//Chemical')
+    ]
+    row["ChemicalSubstances"] = "; ".join(chemicals)
+
+    # Grants
+    grants = [grant.findtext('GrantID', default="") for grant in article.findall('.//Grant')]
+    grant_agencies = [grant.findtext('Agency', default="") for grant in article.findall('.//Grant')]
+
+    row["GrantIDs"] = "; ".join(grants)
+    row["GrantOrganizations"] = "; ".join(grant_agencies)
+
+    # Document types
+    doc_types = [dt.text for dt in article.findall('.//PublicationType') if dt.text]
+    row["DocumentTypes"] = "; ".join(doc_types)
+
+    # Additional fields
+    row["Status"] = article.find('.//MedlineCitation').get('Status', 'Unknown')
+
+    year_revised = article.findtext('.//DateRevised/Year')
+    month_revised = article.findtext('.//DateRevised/Month')
+    day_revised = article.findtext('.//DateRevised/Day')
+
+    row["LastRevisionDate"] = f"{year_revised or '0000'}-{month_revised or '00'}-{day_revised or '00'}"
+
+    year_completed = article.findtext('.//DateCompleted/Year')
+    month_completed = article.findtext('.//DateCompleted/Month')
+    day_completed = article.findtext('.//DateCompleted/Day')
+
+    row["CompletionDate"] = f"{year_completed or '0000'}-{month_completed or '00'}-{day_completed or '00'}"
+
+    # Publication history
+    history = []
+    for pub_date in article.findall('.//PubMedPubDate'):
+        status = pub_date.get("PubStatus", "unknown")
+        date = f"{pub_date.findtext('Year')}-{pub_date.findtext('Month')}-{pub_date.findtext('Day')}"
+        history.append(f"{status}: {date}")
+    row["PublicationHistory"] = "; ".join(history)
+
+    # Conflict of interest
+    row["ConflictOfInterest"] = article.findtext(".//CoiStatement")
+
+    # PubMed Central ID
+    row["PMCID"] = article.findtext(".//PubmedData/ArticleIdList/ArticleId[@IdType='pmc']")
+
+    # Citações
+    citations = []
+    for reference in article.findall('.//ReferenceList/Reference'):
+        citation_text = reference.findtext('Citation', default="")
+        if citation_text:
+            citations.append(citation_text)
+    row["Citations"] = "; ".join(citations)
+
+    return row
+
+
+def _pubmed_record_findtext(article, root):
+    """
+    Builds the pubmed row of a PubmedArticle element with one descendant search per
+    field. Reference for `parsing.PUBMED_FIELDS`; the original parser read the
+    ELocationID and ArticleId columns from the document `root`, not `article`.
+    """
+    row = {}
+
+    # Core fields from XML
+    row["PMID"] = article.findtext('.//PMID', "Unknown")
+    row["Owner"] = article.find('.//MedlineCitation').get('Owner', 'Unknown')
+
+    # MedlineCitation Status
+    row["MedlineCitation.Status"] = article.find('.//MedlineCitation').get('Status', "Unknown")
+    row["DataBankName"] = article.findtext('.//DataBankName', "Unknown")
+
+    row["PublicationStatus"] = article.findtext('.//PublicationStatus', "Unknown")
+
+
+    # DateCompleted and DateRevised
+    row["DateCompleted"] = "".join(
+        filter(None, [
+            article.findtext('.//DateCompleted/Year'),
+            article.findtext('.//DateCompleted/Month'),
+            article.findtext('.//DateCompleted/Day')
+        ])
+    )
+    row["DateRevised"] = "".join(
+        filter(None, [
+            article.findtext('.//DateRevised/Year'),
+            article.findtext('.//DateRevised/Month'),
+            article.findtext('.//DateRevised/Day')
+        ])
+    )
+    # Extração do campo ArticleDate no formato esperado
+    row["ArticleDate"] = "".join(
+        filter(None, [
+                article.findtext('.//ArticleDate/Year'),
+                article.findtext('.//ArticleDate/Month'),
+                article.findtext('.//ArticleDate/Day'),
+            ])
+    )
+
+    row["ELocationDOI"] = root.findtext('.//ELocationID[@EIdType="doi"]', "Unknown")
+    row["LocationPII"] = root.findtext('.//ELocationID[@EIdType="pii"]', "Unknown")
+    row["ArticleIdListPII"] = root.findtext('.//PubmedData/ArticleIdList/ArticleId[@IdType="pii"]', "Unknown")
+    row["ArticleIdListDOI"] = root.findtext('.//PubmedData/ArticleIdList/ArticleId[@IdType="doi"]', "Unknown")
+
+
+    # ISSN and Linking
+    row["ISSN"] = article.findtext('.//ISSN[@IssnType="Electronic"]', "Unknown")
+    row["ISSNLinking"] = article.findtext('.//ISSNLinking', "Unknown")
+
+    # Journal Issue
+    row["JournalIssue.Volume"] = article.findtext('.//JournalIssue/Volume', "Unknown")
+    row["JournalIssue.Issue"] = article.findtext('.//JournalIssue/Issue', "Unknown")
+    row["PubDate.Year"] = article.findtext('.//PubDate/Year', "Unknown")
+    row["PublicationSeason"] = article.findtext('.//JournalIssue/PubDate/Season', "Unknown")
+
+    # Article Title and Abstract
+    row["ArticleTitle"] = article.findtext('.//ArticleTitle', "Unknown")
+    #row["Abstract.AbstractText"] = " ".join(
+    #    [abstract.text.strip() for abstract in article.findall('.//Abstract/AbstractText') if abstract.text]
+    #)
+    row["Abstract.AbstractText"] = parsing.extract_abstract_text(article)
+    row["CopyrightInformation"] = article.findtext('.//Abstract/CopyrightInformation', "Unknown")
+
+    # StartPage and MedlinePgn
+    row["StartPage"] = article.findtext('.//StartPage', "Unknown")
+    row["MedlinePgn"] = article.findtext('.//MedlinePgn', "Unknown")
+
+    # AccessionNumber
+    accession_number = article.findtext('.//AccessionNumberList/AccessionNumber', None)
+    row["AccessionNumber"] = accession_number if accession_number else "Unknown"
+
+    # PubMedPubDate fields
+    pub_dates = article.findall('.//PubMedPubDate')
+    for pub_date in pub_dates:
+        status = pub_date.get('PubStatus', "unknown")
+        year = pub_date.findtext('Year', "")
+        month = pub_date.findtext('Month', "").zfill(2)
+        day = pub_date.findtext('Day', "").zfill(2)
+        hour = pub_date.findtext('Hour', "00").zfill(2)
+        minute = pub_date.findtext('Minute', "00").zfill(2)
+        formatted_date = f"{year}/{month}/{day} {hour}:{minute}"
+        if status == "received":
+            row["PubMedPubDateReceived"] = formatted_date
+        elif status == "accepted":
+            row["PubMedPubDateAccepted"] = formatted_date
+        elif status == "entrez": 
+            row["PubMedPubDateEntrez"] = formatted_date
+        elif status == "pubmed":
+            row["PubMedPubDatePubmed"] = formatted_date
+        elif status == "medline":
+            row["PubMedPubDateMedline"] = formatted_date
+
+    # PublicationStatus
+    row["PublicationStatus"] = article.findtext('.//PublicationStatus', "Unknown")
+
+    # Country
+    row["Country"] = article.findtext('.//MedlineJournalInfo/Country', "Unknown")
+
+    # MedlineTA
+    row["MedlineTA"] = article.findtext('.//MedlineJournalInfo/MedlineTA', "Unknown")
+
+    # Title
+    row["Title"] = article.findtext('.//Journal/Title', "Unknown")
+
+    # NlmUniqueID
+    row["NlmUniqueID"] = article.findtext('.//MedlineJournalInfo/NlmUniqueID', "Unknown")
+
+    # CitationSubset
+    row["CitationSubset"] = article.findtext('.//CitationSubset', "Unknown")
+
+    row["MeshHeadingList"] = parsing.process_mesh_headings(article)
+
+    # OT
+    keyword_list = article.find('.//KeywordList')
+    if keyword_list is not None:
+        row["Keyword"] = keyword_list.get("Owner", "Unknown")
+    else:
+        row["Keyword"] = "Unknown"
+
+    keywords = []
+    for keyword in article.findall('.//Keyword'):
+        keyword_value = keyword.text.strip() if keyword.text else "Unknown"
+        major_topic_yn = keyword.get("MajorTopicYN", "Unknown")
+        keywords.append(f"{keyword_value}")
+
+    # Adicionar ao campo KeywordList
+    row["KeywordList"] = "; ".join(keywords)
+
+    # ArticleIdList PMC
+    row["ArticleIdListPMC"] = article.findtext('.//PubmedData/ArticleIdList/ArticleId[@IdType="pmc"]', "Unknown")
+
+    # Language and PublicationType
+    row["Language"] = article.findtext('.//Language', "Unknown")
+    row["PublicationType"] = "; ".join(
+        [pt.text for pt in article.findall('.//PublicationType') if pt.text]
+    )
+
+    # Author list
+    # Author list
+    authors = []
+    authors_dtl = []
+
+    # Inicializando listas para armazenar informações dos autores
+    authors = []
+    authors_dtl = []
+
+    # Iterando pela lista de autores
+    for author in article.findall('.//Author'):
+        # Extraindo detalhes básicos
+        fore_name = author.findtext('ForeName', "").strip()
+        last_name = author.findtext('LastName', "").strip()
+        initials = author.findtext('Initials', "").strip()
+        full_name = f"{last_name}, {fore_name}".strip(", ")
+        authors.append(full_name)
+
+        # Extraindo ORCID (se disponível)
+        orcid = author.findtext(".//Identifier[@Source='ORCID']", "").strip()
+
+        # Extraindo afiliações
+        affiliations = [
+            aff.text.strip() for aff in author.findall(".//AffiliationInfo/Affiliation") if aff.text
+        ]
+
+        # Formatando a string detalhada do autor
+        author_detail = f"FAU:{full_name}|AU:{last_name} {initials}"
+        if orcid:
+            author_detail += f"|AUID:{orcid}"
+        if affiliations:
+            author_detail += f"|AD:{' |AD: '.join(affiliations)}"
+        authors_dtl.append(author_detail)
+
+        # Salvando as informações em um dicionário ou DataFrame
+        row["AuthorListAuthor"] = "| ".join(authors)
+        row["AuthorListDTL"] = "| ".join(authors_dtl)
+
+        # Exibindo o resultado
+        #print("Autores Simples:", row["AuthorListAuthor"])
+        #print("Autores Detalhados:", row["AuthorListDTL"])
+
+    # CoiStatement
+    row["CoiStatement"] = article.findtext('.//CoiStatement', "Unknown")
+
+    return row
+
+
+LEGACY_BUILDERS = {
+    "bibliometrix": _bibliometrix_record_findtext,
+    "pubmed": _pubmed_record_findtext,
+}
+
+
+def build_payloads(articles, batch_size, seed=1):
+    """
+    Returns PubmedArticleSet payloads of `batch_size` synthetic articles each.
+    """
+    corpus = SyntheticCorpus(articles, seed=seed)
+    pmids = corpus.pmids()
+    return [
+        ("<?xml version=\"1.0\"?>\n<PubmedArticleSet>"
+         + "".join(corpus.article_xml(pmid) for pmid in pmids[start:start + batch_size])
+         + "</PubmedArticleSet>").encode("utf-8")
+        for start in range(0, len(pmids), batch_size)
+    ]
+
+
+def load_payloads(paths):
+    """
+    Returns the content of stored PubmedArticleSet files (plain or gzip) as payloads.
+    """
+    payloads = []
+    for path in paths:
+        stream, close = parsing.open_xml_source(path)
+        payloads.append(stream.read())
+        if close:
+            stream.close()
+    return payloads
+
+
+def parse_legacy(payload, shapes):
+    """
+    Parses a payload the way the notebook did before the single-pass parser: one
+    `ET.fromstring` and one descendant search per field for every shape. Each article
+    is passed as its own root (see the module docstring).
+    """
+    records = {}
+    for name in shapes:
+        root = ET.fromstring(payload)
+        records[name] = [LEGACY_BUILDERS[name](article, article) for article in root.findall('.//PubmedArticle')]
+    return records
+
+
+def parse_compiled(payload, shapes):
+    return parsing.parse_xml_records(payload, shapes)
+
+
+def _timed(parser, payloads, shapes, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            parser(payload, shapes)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _count_articles(payloads):
+    return sum(len(ET.fromstring(payload).findall('.//PubmedArticle')) for payload in payloads)
+
+
+def run_benchmark(articles=1000, batch_sizes=(1, 200), repeat=3, shape_sets=None, backends=("etree",), xml_files=None):
+    """
+    Times the legacy and compiled parsers and checks that their rows are identical.
+
+    Args:
+        articles (int): Synthetic articles per run.
+        batch_sizes (tuple): Synthetic articles per payload.
+        repeat (int): Runs per measurement; the best is kept.
+        shape_sets (list, optional): Tuples of shape names parsed together.
+        backends (tuple): XML backends of the compiled parser ("etree", "lxml", "auto").
+        xml_files (list, optional): Stored PubmedArticleSet files used instead of the
+            synthetic records, one payload each.
+
+    Returns:
+        list: One dict per (batch size, shapes, backend) with the timings and the speedup.
+    """
+    shape_sets = shape_sets or [("bibliometrix",), ("pubmed",), ("bibliometrix", "pubmed")]
+    if xml_files:
+        payloads = load_payloads(xml_files)
+        batches = [("files", payloads, _count_articles(payloads))]
+    else:
+        batches = [(batch_size, build_payloads(articles, batch_size), articles) for batch_size in batch_sizes]
+
+    previous = parsing.XML_BACKEND.name
+    results = []
+    try:
+        for batch_size, payloads, count in batches:
+            for shapes in shape_sets:
+                legacy_records = [parse_legacy(payload, shapes) for payload in payloads]
+                legacy = _timed(parse_legacy, payloads, shapes, repeat)
+
+                for backend in backends:
+                    backend_name = parsing.set_xml_backend(backend)
+                    if [parse_compiled(payload, shapes) for payload in payloads] != legacy_records:
+                        raise AssertionError(
+                            f"Parsers disagree for shapes {shapes} (batch size {batch_size}, backend {backend_name})"
+                        )
+
+                    compiled = _timed(parse_compiled, payloads, shapes, repeat)
+                    results.append({
+                        "batch_size": batch_size,
+                        "shapes": "+".join(shapes),
+                        "backend": backend_name,
+                        "articles": count,
+                        "legacy_s": legacy,
+                        "compiled_s": compiled,
+                        "articles_per_s": count / compiled,
+                        "speedup": legacy / compiled,
+                    })
+    finally:
+        parsing.set_xml_backend(previous)
+    return results
+
+
+def format_results(results):
+    lines = [
+        f"{'batch':>6} {'shapes':<20} {'backend':<8} {'legacy s':>9} {'compiled s':>11} "
+        f"{'articles/s':>11} {'speedup':>8}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result['batch_size']:>6} {result['shapes']:<20} {result['backend']:<8} {result['legacy_s']:>9.3f} "
+            f"{result['compiled_s']:>11.3f} {result['articles_per_s']:>11.0f} {result['speedup']:>7.2f}x"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PubMed XML parsers.")
+    parser.add_argument("--articles", type=int, default=1000, help="synthetic articles per run")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 200], help="articles per payload")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is kept)")
+    parser.add_argument("--backend", nargs="+", default=["etree"], choices=["auto", "etree", "lxml"],
+                        help="XML backends of the compiled parser")
+    parser.add_argument("--xml", nargs="+", help="stored PubmedArticleSet files (plain or gzip) instead of synthetic records")
+    parser.add_argument("--output", help="also write the table to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    table = format_results(run_benchmark(
+        args.articles, args.batch, args.repeat, backends=args.backend, xml_files=args.xml
+    ))
+    print(table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+cache.py
+
+This module keeps a persistent SQLite cache of ESearch results, so reruns of the same
+reference list do not repeat queries that were already answered by PubMed.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+# Seconds in a day, used to convert the TTLs configured in config.yaml
+DAY = 86400
+
+# Default time to live (in days) of positive and negative results per query type
+DEFAULT_TTL_DAYS = {"doi": 90, "title": 30, "term": 7}
+DEFAULT_NEGATIVE_TTL_DAYS = {"doi": 7, "title": 7, "term": 1}
+
+FIELD_QUERY = re.compile(r"^\s*\"?(?P<value>.*?)\"?\s*\[(?P<field>[^\]]+)\]\s*$", re.DOTALL)
+FIELD_TAG = re.compile(r"\[([^\]]+)\]")
+# Quoted phrases, and the boolean operators outside them (PubMed only treats upper case
+# AND, OR and NOT as operators)
+QUERY_TOKEN = re.compile(r"(\"[^\"]*\"|(?<![^\s()])(?:AND|OR|NOT)(?![^\s()]))")
+OPERATORS = ("AND", "OR", "NOT")
+DOI_FIELDS = ("doi", "lid", "aid")
+TITLE_FIELDS = ("title", "ti")
+
+
+def _fold_query(text):
+    """
+    Case-folds the values of a query but keeps its boolean operators as written, since
+    "a OR b" is a boolean query and "a or b" a search for three words.
+
+    Returns:
+        tuple: (folded text, list of the operators found).
+    """
+    parts = []
+    operators = []
+    for part in QUERY_TOKEN.split(text):
+        if part in OPERATORS:
+            operators.append(part)
+            parts.append(part)
+        else:
+            parts.append(part.casefold())
+    return "".join(parts), operators
+
+
+def normalize_query(query):
+    """
+    Builds the cache key of an ESearch query.
+
+    DOI queries (`<doi>[DOI]`) are keyed by the case-folded DOI, other single-field
+    queries by field and value, and free-text queries (the title fallback) by the
+    whitespace-collapsed, case-folded text. PubMed searches are case-insensitive, so
+    these variants return the same result. Boolean operators keep their case, and
+    OR-joined DOI batches and `[Title]` batches get the TTL of their query type.
+
+    Args:
+        query (str): The search term sent to ESearch.
+
+    Returns:
+        tuple: (query_type, field, normalized_value), where query_type is "doi",
+        "title" or "term".
+    """
+    text = " ".join(str(query).split())
+    folded, operators = _fold_query(text)
+    match = FIELD_QUERY.match(text)
+
+    if match and not operators:
+        field = match.group("field").strip().lower()
+        value = match.group("value").strip().casefold()
+        if field in DOI_FIELDS:
+            return "doi", "doi", value
+        if field in TITLE_FIELDS:
+            return "title", "title", value
+        return "term", field, value
+
+    fields = {field.strip().lower() for field in FIELD_TAG.findall(text)}
+    if not fields:
+        # Free text without field tags is the title fallback of the notebook
+        return "title", "", folded
+    if fields <= set(DOI_FIELDS) and set(operators) <= {"OR"}:
+        return "doi", "", folded
+    if fields <= set(TITLE_FIELDS) and "NOT" not in operators:
+        return "title", "", folded
+
+    return "term", "", folded
+
+
+class SearchCache:
+    """
+    On-disk ESearch cache keyed by normalized query.
+
+    Each entry stores the result count, the IdList and the time it was stored. Entries
+    expire after a TTL that depends on the query type, with a separate (usually shorter)
+    TTL for queries without results. Hit and miss counters are kept in `stats`.
+    """
+
+    def __init__(self, path, ttl_days=None, negative_ttl_days=None):
+        self.path = path
+        self.ttl = {key: value * DAY for key, value in {**DEFAULT_TTL_DAYS, **(ttl_days or {})}.items()}
+        self.negative_ttl = {
+            key: value * DAY for key, value in {**DEFAULT_NEGATIVE_TTL_DAYS, **(negative_ttl_days or {})}.items()
+        }
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stored": 0}
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS esearch (
+                query_type TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                retmax INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                id_list TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (query_type, field, value, retmax)
+            )
+            """
+        )
+        self._connection.commit()
+
+    def _expired(self, query_type, count, stored_at):
+        ttl = self.ttl if count else self.negative_ttl
+        return time.time() - stored_at > ttl.get(query_type, ttl["term"])
+
+    def get(self, query, retmax):
+        """
+        Returns the cached (count, id_list) of a query, or None on a miss.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT count, id_list, stored_at FROM esearch "
+                "WHERE query_type = ? AND field = ? AND value = ? AND retmax = ?",
+                (*key, retmax),
+            ).fetchone()
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            count, id_list, stored_at = row
+            if self._expired(key[0], count, stored_at):
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self.stats["hits"] += 1
+            return count, json.loads(id_list)
+
+    def set(self, query, retmax, count, id_list):
+        """
+        Stores the result of a query.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO esearch VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, retmax, int(count), json.dumps(list(id_list)), time.time()),
+            )
+            self._connection.commit()
+            self.stats["stored"] += 1
+
+    def purge_expired(self):
+        """
+        Deletes expired entries and returns how many were removed.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT rowid, query_type, count, stored_at FROM esearch"
+            ).fetchall()
+            expired = [(rowid,) for rowid, query_type, count, stored_at in rows
+                       if self._expired(query_type, count, stored_at)]
+            self._connection.executemany("DELETE FROM esearch WHERE rowid = ?", expired)
+            self._connection.commit()
+
+        logging.info(f"Search cache: {len(expired)} expired entries removed")
+        return len(expired)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,476 @@
+"""
+coordinator.py
+
+This module splits one reference list across several worker processes, on one machine
+or on several machines that share a directory. Workers claim chunks of input rows from a
+SQLite work queue through expiring leases, so the chunks of a crashed worker are claimed
+again once its lease runs out. All workers draw their E-utilities requests from one
+shared token bucket, which keeps the combined traffic within the NCBI limit of the key.
+
+SQLite locking needs a local disk or a network file system with working POSIX locks.
+"""
+
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+from scripts import ncbi
+
+
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+SQLITE_TIMEOUT = 60.0
+LEASE_POLL_SECONDS = 10.0
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+Chunk = namedtuple("Chunk", ["chunk_id", "start", "stop", "attempts"])
+
+
+def _connect(path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    # Autocommit mode, so every transaction is opened explicitly with BEGIN IMMEDIATE
+    connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SharedTokenBucket:
+    """
+    Token bucket stored in a SQLite file and shared by every process that opens it.
+
+    It has the interface of `ncbi.TokenBucket`, so it can replace the local limiter with
+    `ncbi.configure_rate_limiter`. Each reservation is one short write transaction; the
+    reserved waiting time is spent outside the transaction. Wall-clock time is used, so
+    the clocks of the machines sharing the file should be synchronized.
+    """
+
+    def __init__(self, path, rate=ncbi.DEFAULT_RATE_LIMIT, capacity=1, name="eutils"):
+        self.path = path
+        self.name = name
+        self._lock = threading.Lock()
+        self._connection = _connect(path)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS budget (
+                name TEXT PRIMARY KEY,
+                rate REAL NOT NULL,
+                capacity REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                base_rate REAL
+            )
+            """
+        )
+        columns = [column[1] for column in self._connection.execute("PRAGMA table_info(budget)")]
+        if "base_rate" not in columns:
+            self._connection.execute("ALTER TABLE budget ADD COLUMN base_rate REAL")
+        # The first process defines the budget; later ones join it with the same rate
+        self._connection.execute(
+            "INSERT OR IGNORE INTO budget VALUES (?, ?, ?, ?, ?, ?)",
+            (name, float(rate), float(capacity), float(capacity), time.time(), float(rate)),
+        )
+        self._connection.execute(
+            "UPDATE budget SET base_rate = ? WHERE name = ? AND base_rate IS NULL", (float(rate), name)
+        )
+
+    def _update(self, change, base_rate=None):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rate, capacity, tokens, updated = self._connection.execute(
+                    "SELECT rate, capacity, tokens, updated FROM budget WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.time()
+                tokens = min(capacity, tokens + max(now - updated, 0.0) * rate)
+                rate, capacity, tokens, result = change(rate, capacity, tokens)
+                self._connection.execute(
+                    "UPDATE budget SET rate = ?, capacity = ?, tokens = ?, updated = ?, "
+                    "base_rate = COALESCE(?, base_rate) WHERE name = ?",
+                    (rate, capacity, tokens, now, base_rate, self.name),
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return result
+
+    @property
+    def rate(self):
+        with self._lock:
+            return self._connection.execute("SELECT rate FROM budget WHERE name = ?", (self.name,)).fetchone()[0]
+
+    @property
+    def base_rate(self):
+        """
+        The configured rate of the budget, restored by the circuit breaker of every process.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT base_rate FROM budget WHERE name = ?", (self.name,)).fetchone()[0]
+
+    def set_rate(self, rate, capacity=None, base=False):
+        """
+        Changes the refill rate (requests per second) of every process sharing the budget.
+        With `base`, the rate also becomes the configured rate of the budget.
+        """
+        def change(_, current_capacity, tokens):
+            new_capacity = float(capacity) if capacity is not None else current_capacity
+            return float(rate), new_capacity, min(tokens, new_capacity), None
+
+        self._update(change, float(rate) if base else None)
+
+    def reserve(self):
+        """
+        Reserves one token and returns how many seconds the caller must wait to use it.
+        """
+        def change(rate, capacity, tokens):
+            tokens -= 1
+            return rate, capacity, tokens, 0.0 if tokens >= 0 else -tokens / rate
+
+        return self._update(change)
+
+    def pause(self, seconds):
+        """
+        Delays every pending and future reservation of all processes by `seconds`.
+        """
+        def change(rate, capacity, tokens):
+            return rate, capacity, min(tokens, 0.0) - seconds * rate, None
+
+        self._update(change)
+
+    def acquire(self):
+        """
+        Blocks until a token is available.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class WorkQueue:
+    """
+    SQLite queue of input row chunks, claimed by workers through expiring leases.
+
+    A leased chunk whose lease expired (its worker crashed or lost the connection) is
+    handed out again. A chunk that raised `max_attempts` times is marked as failed.
+    """
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._connection = _connect(path)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id INTEGER PRIMARY KEY,
+                start INTEGER NOT NULL,
+                stop INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+            """
+        )
+
+    def _execute(self, statement, params=()):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._connection.execute(statement, params)
+                self._connection.execute("COMMIT")
+                return cursor.rowcount
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def populate(self, total_rows, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Splits rows [0, total_rows) into chunks. Does nothing if the queue already has chunks,
+        so every worker can call it and a restarted run keeps its progress.
+
+        Returns:
+            int: The number of chunks in the queue.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._connection.execute("SELECT COUNT(*), MAX(stop) FROM chunks").fetchone()
+                if existing[0]:
+                    if existing[1] != total_rows:
+                        logging.warning(f"Work queue {self.path} covers {existing[1]} rows, not {total_rows}")
+                    self._connection.execute("COMMIT")
+                    return existing[0]
+
+                self._connection.executemany(
+                    "INSERT INTO chunks (chunk_id, start, stop, status) VALUES (?, ?, ?, ?)",
+                    [
+                        (chunk_id, start, min(start + chunk_size, total_rows), PENDING)
+                        for chunk_id, start in enumerate(range(0, total_rows, chunk_size))
+                    ],
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+        count = -(-total_rows // chunk_size)
+        logging.info(f"Work queue {self.path}: {count} chunks of {chunk_size} rows")
+        return count
+
+    def claim(self, worker_id):
+        """
+        Leases the next pending chunk, or a chunk whose lease expired.
+
+        Returns:
+            Chunk: The leased chunk, or None when nothing is left to claim.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._connection.execute(
+                    "SELECT chunk_id, start, stop, attempts, status, worker FROM chunks "
+                    "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY chunk_id LIMIT 1",
+                    (PENDING, LEASED, now),
+                ).fetchone()
+
+                if row is None:
+                    self._connection.execute("COMMIT")
+                    return None
+
+                chunk_id, start, stop, attempts, status, previous = row
+                if status == LEASED:
+                    logging.warning(f"Reclaiming chunk {chunk_id} from {previous}: lease expired")
+
+                self._connection.execute(
+                    "UPDATE chunks SET status = ?, worker = ?, lease_expires = ?, attempts = ? WHERE chunk_id = ?",
+                    (LEASED, worker_id, now + self.lease_seconds, attempts + 1, chunk_id),
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+        return Chunk(chunk_id, start, stop, attempts + 1)
+
+    def renew(self, chunk, worker_id):
+        """
+        Extends the lease of a chunk. Returns False when the worker no longer holds it.
+        """
+        return self._execute(
+            "UPDATE chunks SET lease_expires = ? WHERE chunk_id = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease_seconds, chunk.chunk_id, worker_id, LEASED),
+        ) == 1
+
+    def complete(self, chunk, worker_id):
+        """
+        Marks a chunk as done. Returns False when the lease had been lost to another worker.
+        """
+        return self._execute(
+            "UPDATE chunks SET status = ?, lease_expires = NULL, error = NULL "
+            "WHERE chunk_id = ? AND worker = ? AND status = ?",
+            (DONE, chunk.chunk_id, worker_id, LEASED),
+        ) == 1
+
+    def fail(self, chunk, worker_id, error):
+        """
+        Releases a chunk after an error, or marks it as failed after `max_attempts`.
+        """
+        status = FAILED if chunk.attempts >= self.max_attempts else PENDING
+        self._execute(
+            "UPDATE chunks SET status = ?, worker = NULL, lease_expires = NULL, error = ? "
+            "WHERE chunk_id = ? AND worker = ? AND status = ?",
+            (status, str(error), chunk.chunk_id, worker_id, LEASED),
+        )
+
+    def reset_failed(self):
+        """
+        Makes failed chunks claimable again. Returns how many were reset.
+        """
+        return self._execute(
+            "UPDATE chunks SET status = ?, attempts = 0, error = NULL WHERE status = ?", (PENDING, FAILED)
+        )
+
+    def progress(self):
+        """
+        Returns the number of chunks per status.
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) FROM chunks GROUP BY status").fetchall()
+        return {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class Worker:
+    """
+    Processes chunks of a DataFrame until every chunk is done or failed.
+
+    `process_chunk(chunk, rows)` receives the leased `Chunk` and the matching rows of the
+    DataFrame and writes its own output (e.g. one CSV per worker). The lease is renewed
+    in the background while it runs, so only a dead worker loses its chunks.
+
+    Example:
+        queue = WorkQueue("./data/coordinator/queue.sqlite")
+        queue.populate(len(df), chunk_size=100)
+        Worker(queue, process_chunk).run(df)
+    """
+
+    def __init__(self, queue, process_chunk, worker_id=None):
+        self.queue = queue
+        self.process_chunk = process_chunk
+        self.worker_id = worker_id or default_worker_id()
+        self.processed = 0
+
+    def _renew_lease(self, chunk, stop):
+        while not stop.wait(self.queue.lease_seconds / 3):
+            if not self.queue.renew(chunk, self.worker_id):
+                logging.warning(f"Worker {self.worker_id} lost the lease of chunk {chunk.chunk_id}")
+                return
+
+    def run(self, rows):
+        """
+        Claims and processes chunks of `rows` until none are left. While other workers
+        still hold leases, it keeps polling so their chunks are taken over if they die.
+
+        Returns:
+            int: The number of chunks this worker completed.
+        """
+        while True:
+            chunk = self.queue.claim(self.worker_id)
+            if chunk is None:
+                # Chunks leased by other workers may still be reclaimed if their worker dies
+                if not self.queue.progress()[LEASED]:
+                    break
+                time.sleep(min(self.queue.lease_seconds / 3, LEASE_POLL_SECONDS))
+                continue
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._renew_lease, args=(chunk, stop), daemon=True)
+            heartbeat.start()
+            try:
+                self.process_chunk(chunk, rows.iloc[chunk.start:chunk.stop])
+            except Exception as e:
+                logging.error(f"Worker {self.worker_id} failed on chunk {chunk.chunk_id}: {e}\n{traceback.format_exc()}")
+                self.queue.fail(chunk, self.worker_id, e)
+                continue
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            if self.queue.complete(chunk, self.worker_id):
+                self.processed += 1
+            else:
+                logging.warning(f"Chunk {chunk.chunk_id} was reclaimed before {self.worker_id} finished it")
+
+        logging.info(f"Worker {self.worker_id}: {self.processed} chunks processed - {self.queue.progress()}")
+        return self.processed
+
+
+def use_shared_budget(path, rate=None, capacity=None):
+    """
+    Makes every E-utilities request of this process draw from the shared budget at `path`.
+
+    Args:
+        path (str): SQLite file of the budget, shared by all workers.
+        rate (float, optional): Requests per second of the whole pool of workers.
+            Defaults to the rate configured by `ncbi.configure_client`.
+        capacity (int, optional): Burst size. Defaults to the configured burst.
+
+    Returns:
+        SharedTokenBucket: The installed limiter.
+    """
+    limiter = SharedTokenBucket(
+        path,
+        rate=rate or ncbi.RATE_LIMITER.base_rate,
+        capacity=capacity or getattr(ncbi.RATE_LIMITER, "capacity", 1),
+    )
+    ncbi.configure_rate_limiter(limiter)
+    return limiter
+
+
+def _worker_main(queue_path, budget_path, rows, process_chunk, lease_seconds, max_attempts):
+    use_shared_budget(budget_path)
+    queue = WorkQueue(queue_path, lease_seconds, max_attempts)
+    try:
+        Worker(queue, process_chunk).run(rows)
+    finally:
+        queue.close()
+
+
+def run_workers(rows, process_chunk, queue_path, budget_path, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Processes a DataFrame with several local worker processes sharing one request budget.
+
+    Workers on other machines join the same run by calling `Worker(...).run(rows)` with
+    the same `queue_path` and `budget_path` on a shared directory.
+
+    Args:
+        rows (pd.DataFrame): The input rows (e.g. from `load_csv_to_dataframe`).
+        process_chunk (callable): Called as `process_chunk(chunk, rows)` in each worker.
+        queue_path (str): SQLite file of the work queue.
+        budget_path (str): SQLite file of the shared request budget.
+        processes (int, optional): Number of worker processes. Defaults to the CPU count.
+        chunk_size (int): Input rows per chunk.
+        lease_seconds (float): Seconds before the chunk of a silent worker is reclaimed.
+        max_attempts (int): Attempts before a chunk is marked as failed.
+
+    Returns:
+        dict: The number of chunks per status at the end of the run.
+    """
+    queue = WorkQueue(queue_path, lease_seconds, max_attempts)
+    queue.populate(len(rows), chunk_size)
+
+    # The budget is created, or reset after a throttled earlier run, with the configured
+    # rate, so every worker joins it
+    rate, capacity = ncbi.RATE_LIMITER.base_rate, getattr(ncbi.RATE_LIMITER, "capacity", 1)
+    budget = SharedTokenBucket(budget_path, rate, capacity)
+    budget.set_rate(rate, capacity, base=True)
+    budget.close()
+
+    workers = [
+        multiprocessing.Process(
+            target=_worker_main,
+            args=(queue_path, budget_path, rows, process_chunk, lease_seconds, max_attempts),
+        )
+        for _ in range(processes or os.cpu_count() or 1)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        if worker.exitcode:
+            logging.error(f"Worker process {worker.pid} exited with code {worker.exitcode}")
+
+    progress = queue.progress()
+    queue.close()
+    logging.info(f"Coordinated run finished: {progress}")
+    return progress
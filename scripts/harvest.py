@@ -0,0 +1,218 @@
+"""
+harvest.py
+
+This module harvests every PMID of a large term search. ESearch cannot page beyond
+position 9,999, so the query is split into publication (or entrez) date slices that are
+small enough to be paged completely, and the slices are fetched in parallel under the
+shared rate limit of scripts.ncbi.
+"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import date, timedelta
+
+from scripts import ncbi
+
+
+# ESearch returns at most 10,000 records per query (retstart cannot go beyond 9,999)
+MAX_RECORDS_PER_SLICE = 9999
+PAGE_SIZE = 5000
+DEFAULT_START_DATE = date(1800, 1, 1)
+# Open upper bound, like the "3000" maximum date of PubMed: ahead-of-print articles carry
+# the later date of their issue, so the slices must reach past today
+DEFAULT_END_DATE = date(3000, 12, 31)
+
+
+def date_term(term, start, end, datetype="PDAT"):
+    """
+    Restricts a query to a date range.
+
+    Args:
+        term (str): The search term.
+        start (date): First day of the range.
+        end (date): Last day of the range.
+        datetype (str): PubMed date field: "PDAT" (publication) or "EDAT" (entrez).
+
+    Returns:
+        str: The query restricted to the range.
+    """
+    return (f'({term}) AND ("{start:%Y/%m/%d}"[{datetype}] : "{end:%Y/%m/%d}"[{datetype}])')
+
+
+class TermHarvester:
+    """
+    Harvests all PMIDs of a term search through date-sliced partitioning.
+
+    `plan` bisects the date range until every slice has at most `max_records` results,
+    counting each level of slices in parallel. The counts are always requested from
+    ESearch, never from the search cache, since a stale count would hide records. Then
+    `iter_pmids` pages every slice in parallel and yields each PMID once, as soon as its
+    page arrives.
+
+    Example:
+        harvester = TermHarvester("parkinson disease AND olfaction")
+        for pmid, xml_data in harvester.iter_articles():
+            ...
+    """
+
+    def __init__(self, term, start=None, end=None, datetype="PDAT", max_records=MAX_RECORDS_PER_SLICE,
+                 page_size=PAGE_SIZE, max_in_flight=None):
+        self.term = term
+        self.start = start or DEFAULT_START_DATE
+        self.end = end or DEFAULT_END_DATE
+        self.datetype = datetype
+        self.max_records = max_records
+        self.page_size = min(page_size, max_records)
+        self.max_in_flight = max_in_flight or ncbi.CLIENT_SETTINGS["max_in_flight"]
+        self.slices = None
+        self.truncated_slices = []
+        self.failed_pages = []
+        self.failed_articles = []
+        self.seen = set()
+
+    def _count_slice(self, start, end):
+        # A failed or malformed query raises instead of being counted as an empty slice
+        record = ncbi.call_with_retry(
+            ncbi.read_eutils, "esearch", db="pubmed", term=date_term(self.term, start, end, self.datetype), retmax=0
+        )
+        return int(record["Count"])
+
+    def _count(self, executor, ranges):
+        futures = {executor.submit(self._count_slice, start, end): (start, end) for start, end in ranges}
+        counts = {}
+        for future in as_completed(futures):
+            try:
+                counts[futures[future]] = future.result()
+            except Exception as e:
+                raise RuntimeError(f"Could not count slice {futures[future]} of '{self.term}': {e}") from e
+        return counts
+
+    def plan(self):
+        """
+        Splits the date range into slices with at most `max_records` results each.
+
+        Returns:
+            list: (start, end, count) tuples, in date order, of the non-empty slices.
+        """
+        slices = []
+        pending = [(self.start, self.end)]
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while pending:
+                counts = self._count(executor, pending)
+                pending = []
+
+                for (start, end), count in counts.items():
+                    if count == 0:
+                        continue
+                    if count <= self.max_records:
+                        slices.append((start, end, count))
+                    elif start == end:
+                        # A single day cannot be split further, so only part of it can be paged
+                        logging.warning(f"Slice {start} has {count} results; only {self.max_records} can be harvested")
+                        self.truncated_slices.append((start, count))
+                        slices.append((start, end, self.max_records))
+                    else:
+                        middle = start + timedelta(days=(end - start).days // 2)
+                        pending.extend([(start, middle), (middle + timedelta(days=1), end)])
+
+        self.slices = sorted(slices)
+        total = sum(count for _, _, count in self.slices)
+        logging.info(f"Harvest plan for '{self.term}': {len(self.slices)} slices - {total} records")
+        return self.slices
+
+    def _request_page(self, start, end, retstart):
+        term = date_term(self.term, start, end, self.datetype)
+        retmax = min(self.page_size, self.max_records - retstart)
+        page = ncbi.call_with_retry(
+            ncbi.read_eutils, "esearch", db="pubmed", term=term, retstart=retstart, retmax=retmax
+        )
+        return int(page["Count"]), [str(pmid) for pmid in page.get("IdList", [])]
+
+    def iter_pmids(self):
+        """
+        Pages every slice in parallel and yields each PMID once.
+
+        The first page of each slice is requested first, and the other pages of the
+        slice are taken from the `Count` of that response, so records added since `plan`
+        are harvested too. Pages that keep failing after the retries are kept in
+        `failed_pages` as (start, end, retstart) tuples; when a first page fails, the
+        rest of its slice is unknown and only that page is listed.
+
+        Yields:
+            str: PMIDs in the order their pages arrive.
+        """
+        if self.slices is None:
+            self.plan()
+
+        self.failed_pages = []
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = {
+                executor.submit(self._request_page, start, end, 0): (start, end, 0)
+                for start, end, _ in self.slices
+            }
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end, retstart = futures.pop(future)
+                    try:
+                        count, pmids = future.result()
+                    except Exception as e:
+                        logging.error(f"Harvest page {(start, end, retstart)} failed: {e}")
+                        self.failed_pages.append((start, end, retstart))
+                        continue
+
+                    if retstart == 0:
+                        if count > self.max_records and start not in {day for day, _ in self.truncated_slices}:
+                            logging.warning(f"Slice {start} - {end} grew to {count} results; only {self.max_records} can be harvested")
+                            self.truncated_slices.append((start, count))
+                        for next_start in range(self.page_size, min(count, self.max_records), self.page_size):
+                            futures[executor.submit(self._request_page, start, end, next_start)] = (start, end, next_start)
+
+                    for pmid in pmids:
+                        if pmid not in self.seen:
+                            self.seen.add(pmid)
+                            yield pmid
+
+        logging.info(f"Harvest of '{self.term}': {len(self.seen)} unique PMIDs - {len(self.failed_pages)} failed pages")
+
+    def iter_articles(self, batch_size=ncbi.FETCH_BATCH_SIZE):
+        """
+        Streams the harvested PMIDs to the fetch stage in batches.
+
+        The PMIDs of EFetch batches that kept failing are kept in `failed_articles`.
+
+        Yields:
+            tuple: (pmid, xml_data) for every harvested article.
+        """
+        self.failed_articles = []
+        batch = []
+        for pmid in self.iter_pmids():
+            batch.append(pmid)
+            if len(batch) >= batch_size:
+                yield from ncbi.fetch_articles(batch, batch_size, self.failed_articles)
+                batch = []
+
+        if batch:
+            yield from ncbi.fetch_articles(batch, batch_size, self.failed_articles)
+
+        if self.failed_articles:
+            logging.error(f"Harvest of '{self.term}': {len(self.failed_articles)} articles could not be fetched")
+
+
+def harvest_term(term, start=None, end=None, datetype="PDAT"):
+    """
+    Returns every PMID of a term search, without the 9,999 record ESearch limit.
+
+    Args:
+        term (str): The search term.
+        start (date, optional): First publication date. Defaults to 1800-01-01.
+        end (date, optional): Last publication date. Defaults to an open upper bound
+            (3000-12-31), so articles dated ahead of print are included.
+        datetype (str): PubMed date field used to slice the search ("PDAT" or "EDAT").
+
+    Returns:
+        list: The unique PMIDs found.
+    """
+    return list(TermHarvester(term, start, end, datetype).iter_pmids())
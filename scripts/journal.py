@@ -0,0 +1,234 @@
+"""
+journal.py
+
+This module keeps a durable journal of a harvest job, so a crashed run restarts where
+it stopped. The outcome of every input row and every PMID is committed in the same step
+as the metadata flush that contains its rows, together with the size of each output
+file. On resume the output files are truncated back to the last committed size, which
+removes rows appended by a flush that did not reach its journal commit, and only the
+rows without a committed outcome are processed again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+
+# Row outcomes
+FOUND = "found"
+NOT_FOUND = "not_found"
+AMBIGUOUS = "ambiguous"
+ERROR = "error"
+
+# Outcomes that are not retried on resume
+FINISHED = (FOUND, NOT_FOUND, AMBIGUOUS)
+
+
+def input_fingerprint(df, columns=("doi", "title")):
+    """
+    Hashes the identifying columns of the input rows, to detect a changed input file on resume.
+    """
+    digest = hashlib.sha256()
+    for column in columns:
+        if column in df.columns:
+            digest.update(column.encode("utf-8"))
+            digest.update("\x1f".join(df[column].fillna("").astype(str)).encode("utf-8"))
+    digest.update(str(len(df)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class JobJournal:
+    """
+    SQLite journal of the rows and PMIDs processed by a job.
+
+    Outcomes recorded with `record_row` and `record_article` stay pending until `commit`,
+    which appends the given DataFrames to their output files and then stores the pending
+    outcomes and the new file sizes in one transaction.
+
+    Example:
+        journal = JobJournal(path, outputs=[pubmed_file, bibliometrix_file])
+        journal.recover()
+        for i in journal.unfinished_rows(df_search.index):
+            ...
+            journal.record_row(i, FOUND, count, id_list)
+        journal.commit({pubmed_file: df_pubmed, bibliometrix_file: df_bibliometrix})
+    """
+
+    def __init__(self, path, outputs=(), fingerprint=None):
+        self.path = path
+        self.outputs = [os.path.normpath(str(output)) for output in outputs]
+        self._rows = {}
+        self._articles = {}
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS job (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                pmids TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS articles (
+                pmid TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (pmid, row)
+            );
+            CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, size INTEGER NOT NULL);
+            """
+        )
+
+        if fingerprint is not None:
+            stored = self._connection.execute("SELECT value FROM job WHERE key = 'fingerprint'").fetchone()
+            if stored is None:
+                self._connection.execute("INSERT INTO job VALUES ('fingerprint', ?)", (fingerprint,))
+            elif stored[0] != fingerprint and self.finished_rows():
+                raise ValueError(
+                    f"The input rows changed since the journal {path} was started. "
+                    "Remove the journal and the output files to start a new job."
+                )
+
+        # Files that existed before the job started keep their content on recovery
+        for output in self.outputs:
+            size = os.path.getsize(output) if os.path.exists(output) else 0
+            self._connection.execute("INSERT OR IGNORE INTO outputs VALUES (?, ?)", (output, size))
+        self._connection.commit()
+
+    def recover(self):
+        """
+        Truncates every output file to the size of the last committed flush.
+
+        Returns:
+            dict: Bytes removed per output file.
+        """
+        removed = {}
+        for output, size in self._connection.execute("SELECT path, size FROM outputs").fetchall():
+            if os.path.exists(output) and os.path.getsize(output) > size:
+                removed[output] = os.path.getsize(output) - size
+                with open(output, "r+b") as handle:
+                    handle.truncate(size)
+                logging.warning(f"Journal recovery: {removed[output]} uncommitted bytes removed from {output}")
+        return removed
+
+    def finished_rows(self):
+        """
+        Returns the input rows with a committed final outcome.
+        """
+        placeholders = ", ".join("?" for _ in FINISHED)
+        return {
+            row for (row,) in self._connection.execute(
+                f"SELECT row FROM rows WHERE status IN ({placeholders})", FINISHED
+            )
+        }
+
+    def unfinished_rows(self, rows):
+        """
+        Filters `rows` (e.g. `df_search.index`) down to the rows that still need processing.
+        """
+        finished = self.finished_rows()
+        return [row for row in rows if int(row) not in finished]
+
+    def processed_pmids(self):
+        """
+        Returns the PMIDs already parsed, committed or pending.
+        """
+        committed = {pmid for (pmid,) in self._connection.execute("SELECT DISTINCT pmid FROM articles")}
+        return committed | {pmid for pmid, _ in self._articles}
+
+    def record_row(self, row, status, count=0, pmids=()):
+        """
+        Records the outcome of an input row until the next `commit`.
+        """
+        self._rows[int(row)] = (status, int(count or 0), json.dumps([str(pmid) for pmid in pmids or ()]))
+
+    def record_article(self, pmid, row, status=FOUND):
+        """
+        Records that a PMID of an input row was fetched and parsed, until the next `commit`.
+        """
+        self._articles[(str(pmid), int(row))] = status
+
+    @property
+    def pending(self):
+        return len(self._rows)
+
+    def commit(self, frames=None):
+        """
+        Appends the DataFrames to their output files, then commits the pending outcomes
+        together with the new file sizes.
+
+        Args:
+            frames (dict, optional): {output file path: DataFrame} to append, written like
+                `save_data_to_file` ("|" separated, header only in a new file).
+        """
+        for output, df in (frames or {}).items():
+            if df is None or df.empty:
+                continue
+            output = os.path.normpath(str(output))
+            new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+            with open(output, "a", newline="", encoding="utf-8") as handle:
+                df.to_csv(handle, sep="|", index=False, header=new_file)
+                handle.flush()
+                os.fsync(handle.fileno())
+
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?)",
+                [(row, status, count, pmids, now) for row, (status, count, pmids) in self._rows.items()],
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?)",
+                [(pmid, row, status, now) for (pmid, row), status in self._articles.items()],
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?)",
+                [(output, os.path.getsize(output) if os.path.exists(output) else 0) for output in self.outputs],
+            )
+
+        committed = len(self._rows)
+        self._rows = {}
+        self._articles = {}
+        return committed
+
+    def sync_outputs(self, outputs):
+        """
+        Stores the current size of output files rewritten outside the job, such as the
+        metadata files replaced by `reparse`, so `recover` does not truncate them.
+
+        Args:
+            outputs (list): Paths of the rewritten files. Files the journal does not
+                track are ignored.
+
+        Returns:
+            list: The tracked files whose size was updated.
+        """
+        updated = []
+        with self._connection:
+            for output in outputs:
+                output = os.path.normpath(str(output))
+                size = os.path.getsize(output) if os.path.exists(output) else 0
+                if self._connection.execute("UPDATE outputs SET size = ? WHERE path = ?", (size, output)).rowcount:
+                    updated.append(output)
+        return updated
+
+    def summary(self):
+        """
+        Returns the number of committed rows per outcome and the number of parsed PMIDs.
+        """
+        summary = dict(self._connection.execute("SELECT status, COUNT(*) FROM rows GROUP BY status").fetchall())
+        summary["pmids"] = self._connection.execute("SELECT COUNT(DISTINCT pmid) FROM articles").fetchone()[0]
+        return summary
+
+    def close(self):
+        self._connection.close()
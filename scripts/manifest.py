@@ -0,0 +1,119 @@
+"""
+manifest.py
+
+This module keeps the parse manifest of the incremental re-parse: for every PMID, the
+hash of the raw XML it was parsed from, the parser version that parsed it and the
+parsed rows. A re-parse only parses the articles whose XML or parser version changed
+since the last run and reuses the stored rows of the others.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+
+
+class ParseManifest:
+    """
+    SQLite manifest of the parsed records, keyed by PMID.
+
+    Example:
+        manifest = ParseManifest(path, parsing.parser_version(names))
+        stale = manifest.stale(hashes)
+        ...
+        manifest.update(parsed, hashes)
+        rows = manifest.rows()
+    """
+
+    def __init__(self, path, parser_version):
+        self.path = path
+        self.parser_version = parser_version
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                pmid TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                parser_version TEXT NOT NULL,
+                rows TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            """
+        )
+        self._connection.commit()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def stale(self, hashes):
+        """
+        Returns the PMIDs that must be parsed: new PMIDs, PMIDs whose XML changed and
+        PMIDs parsed by another parser version.
+
+        Args:
+            hashes (dict): {pmid: content hash} of the current XML.
+        """
+        known = {
+            pmid: (content_hash, version)
+            for pmid, content_hash, version in self._connection.execute(
+                "SELECT pmid, content_hash, parser_version FROM records"
+            )
+        }
+        return [pmid for pmid, content_hash in hashes.items() if known.get(pmid) != (content_hash, self.parser_version)]
+
+    def forget(self, pmids):
+        """
+        Removes the records of PMIDs whose XML is no longer stored.
+
+        Args:
+            pmids (iterable): The PMIDs that are still stored; every other record is removed.
+
+        Returns:
+            int: Number of records removed.
+        """
+        current = set(pmids)
+        removed = [
+            (pmid,) for (pmid,) in self._connection.execute("SELECT pmid FROM records") if pmid not in current
+        ]
+        with self._connection:
+            self._connection.executemany("DELETE FROM records WHERE pmid = ?", removed)
+        return len(removed)
+
+    def update(self, parsed, hashes):
+        """
+        Stores the rows of freshly parsed articles in one transaction.
+
+        Args:
+            parsed (list): (pmid, {shape or table name: list of rows}) pairs.
+            hashes (dict): {pmid: content hash} of the XML the rows were parsed from.
+        """
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                [
+                    (pmid, hashes[pmid], self.parser_version, json.dumps(rows, ensure_ascii=False), now)
+                    for pmid, rows in parsed
+                ],
+            )
+        logging.info(f"Parse manifest: {len(parsed)} records updated in {self.path}")
+
+    def rows(self):
+        """
+        Yields the stored rows of every PMID in numeric PMID order.
+
+        Yields:
+            tuple: (pmid, {shape or table name: list of rows}).
+        """
+        records = self._connection.execute("SELECT pmid, rows FROM records").fetchall()
+        for pmid, rows in sorted(records, key=lambda record: int(record[0]) if record[0].isdigit() else float("inf")):
+            yield pmid, json.loads(rows)
+
+    def close(self):
+        self._connection.close()
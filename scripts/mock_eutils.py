@@ -0,0 +1,676 @@
+"""
+mock_eutils.py
+
+This module runs a local stand-in for the NCBI E-utilities (ESearch, EFetch, ESummary
+and EPost) used by scripts.ncbi. Responses come from a synthetic PubMed corpus or from
+recorded traffic, and latency, throttling, server errors and truncated bodies can be
+injected to benchmark batching, concurrency and retries without network access.
+
+Usage:
+    python -m scripts.mock_eutils --mode synthetic --articles 20000 --port 8080 --rate-429 0.05
+
+Then point the client to it in config.yaml:
+    ncbi:
+      base_url: "http://127.0.0.1:8080/entrez/eutils/"
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qsl, urlsplit
+from urllib.request import Request, urlopen
+from xml.sax.saxutils import escape
+
+
+ESEARCH_DOCTYPE = ('<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+                   '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">')
+EPOST_DOCTYPE = ('<!DOCTYPE ePostResult PUBLIC "-//NLM//DTD epost 20060628//EN" '
+                 '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/epost.dtd">')
+ESUMMARY_DOCTYPE = ('<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary v1 20041029//EN" '
+                    '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20041029/esummary-v1.dtd">')
+PUBMED_DOCTYPE = ('<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2024//EN" '
+                  '"https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd">')
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" ?>'
+
+# ESearch refuses to page beyond this position, as the real service does
+ESEARCH_MAX_POSITION = 9999
+
+# Status codes of the injected "5xx" faults
+SERVER_ERROR_CODES = (500, 502, 503)
+
+# Parameters that identify the client but not the request, ignored by record/replay
+IDENTIFICATION_PARAMS = ("tool", "email", "api_key")
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+WORDS = (
+    "parkinson", "disease", "olfaction", "speech", "dopamine", "neurodegeneration", "cohort",
+    "biomarker", "alpha-synuclein", "gait", "sleep", "cognitive", "decline", "imaging", "genetic",
+    "risk", "therapy", "clinical", "trial", "patients", "motor", "symptoms", "brain", "network",
+    "machine", "learning", "prodromal", "progression", "inflammation", "mitochondrial",
+)
+JOURNALS = (
+    ("NPJ Parkinsons Dis", "NPJ Parkinson's disease", "2373-8057", "United States"),
+    ("Mov Disord", "Movement disorders : official journal of the Movement Disorder Society", "1531-8257", "United States"),
+    ("Sci Data", "Scientific data", "2052-4463", "England"),
+    ("Brain", "Brain : a journal of neurology", "1460-2156", "England"),
+    ("Neurology", "Neurology", "1526-632X", "United States"),
+)
+LAST_NAMES = ("Silva", "Souza", "Smith", "Chen", "Müller", "Rossi", "Kumar", "Tanaka", "Garcia", "Dubois")
+FORE_NAMES = ("Ana", "Leandro", "John", "Wei", "Anna", "Marco", "Priya", "Yuki", "Lucia", "Pierre")
+MESH_TERMS = ("Parkinson Disease", "Humans", "Olfaction Disorders", "Speech", "Biomarkers", "Dopamine",
+              "Cohort Studies", "Brain", "Aged", "Male", "Female", "Neuroimaging")
+PUBLICATION_TYPES = ("Journal Article", "Review", "Research Support, Non-U.S. Gov't", "Clinical Trial")
+
+
+def journal_id(medline_ta):
+    return str(zlib.crc32(medline_ta.encode("utf-8")) % 10**9)
+
+
+def normalize_text(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).casefold()).split())
+
+
+class SyntheticCorpus:
+    """
+    Deterministic synthetic PubMed corpus.
+
+    Every article has the DOI `10.5555/mock.<pmid>` and complete MEDLINE-like XML, so the
+    parsers and mappers can run on it as on real EFetch output.
+    """
+
+    def __init__(self, size=10000, seed=42, first_pmid=30000000):
+        self.size = size
+        self.seed = seed
+        self.first_pmid = first_pmid
+        self._records = {}
+        self._titles = {}
+        self._dois = {}
+
+        for offset in range(size):
+            pmid = str(first_pmid + offset)
+            record = self._build_record(pmid, random.Random(f"{seed}-{pmid}"))
+            self._records[pmid] = record
+            self._dois[record["doi"]] = pmid
+            self._titles[pmid] = normalize_text(record["title"])
+
+    def _build_record(self, pmid, rng):
+        journal = rng.choice(JOURNALS)
+        published = date(2005, 1, 1) + timedelta(days=rng.randrange(20 * 365))
+        entrez = published - timedelta(days=rng.randrange(1, 60))
+        authors = [
+            (rng.choice(LAST_NAMES), rng.choice(FORE_NAMES), f"{rng.randrange(10**15):016d}" if rng.random() < 0.4 else "")
+            for _ in range(rng.randint(1, 8))
+        ]
+        return {
+            "pmid": pmid,
+            "doi": f"10.5555/mock.{pmid}",
+            "title": " ".join(rng.sample(WORDS, rng.randint(5, 12))).capitalize() + ".",
+            "abstract": [
+                (label, " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) + ".")
+                for label in rng.sample(("BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS"), rng.randint(1, 4))
+            ],
+            "journal": journal,
+            "volume": str(rng.randint(1, 40)),
+            "issue": str(rng.randint(1, 12)),
+            "first_page": rng.randint(1, 900),
+            "published": published,
+            "entrez": entrez,
+            "authors": authors,
+            "affiliations": [f"Department of {rng.choice(WORDS).capitalize()}, University {rng.randint(1, 50)}, {journal[3]}."
+                             for _ in authors],
+            "mesh": rng.sample(MESH_TERMS, rng.randint(2, 6)),
+            "keywords": rng.sample(WORDS, rng.randint(0, 5)),
+            "publication_types": rng.sample(PUBLICATION_TYPES, rng.randint(1, 2)),
+            "grants": [(f"R01 NS{rng.randint(10000, 99999)}", "NINDS NIH HHS") for _ in range(rng.randint(0, 2))],
+            "references": [f"Reference {n} of {pmid}." for n in range(rng.randint(0, 30))],
+            "pmc": f"PMC{rng.randint(1000000, 9999999)}" if rng.random() < 0.5 else "",
+        }
+
+    def __contains__(self, pmid):
+        return str(pmid) in self._records
+
+    def pmids(self):
+        return list(self._records)
+
+    def search(self, term):
+        """
+        Evaluates the subset of the PubMed query syntax used by scripts.ncbi.
+
+        Supported: OR-joined `[DOI]` and quoted `[Title]` clauses, OR-joined groups of
+        `word[Title]` terms joined by AND, one publication/entrez date range
+        (`"2020/01/01"[PDAT] : "2020/12/31"[PDAT]`) and free-text words, which must all
+        appear in the title or abstract.
+
+        Returns:
+            list: Matching PMIDs, most recent first.
+        """
+        text = term
+        candidates = None
+
+        dois = re.findall(r'"?([^"\s()]+?)"?\[(?:doi|lid|aid)\]', text, flags=re.IGNORECASE)
+        titles = re.findall(r'"([^"]+)"\[(?:title|ti)\]', text, flags=re.IGNORECASE)
+        title_groups = [
+            [normalize_text(word) for word in re.findall(r'([^\s()"]+)\[(?:title|ti)\]', group, flags=re.IGNORECASE)]
+            for group in re.findall(r"\(([^()]*\[(?:title|ti)\][^()]*)\)", text, flags=re.IGNORECASE)
+        ]
+        if dois or titles or title_groups:
+            candidates = set()
+            for doi in dois:
+                pmid = self._dois.get(doi.strip().lower())
+                if pmid:
+                    candidates.add(pmid)
+            for title in titles:
+                phrase = normalize_text(title)
+                candidates.update(pmid for pmid, value in self._titles.items() if phrase and phrase in value)
+            for words in title_groups:
+                candidates.update(pmid for pmid, value in self._titles.items()
+                                  if words and all(word in value.split() for word in words))
+            text = re.sub(r'"?[^"\s()]+?"?\[(?:doi|lid|aid)\]|"[^"]+"\[(?:title|ti)\]|[^\s()"]+\[(?:title|ti)\]',
+                          " ", text, flags=re.IGNORECASE)
+
+        date_range = re.search(
+            r'"?(\d{4}(?:/\d{1,2}(?:/\d{1,2})?)?)"?\[(\w+)\]\s*:\s*"?(\d{4}(?:/\d{1,2}(?:/\d{1,2})?)?)"?\[\w+\]', text
+        )
+        if date_range:
+            start, field, end = date_range.groups()
+            text = text.replace(date_range.group(0), " ")
+
+        words = [word for word in normalize_text(re.sub(r"\[[^\]]*\]|\b(?:AND|OR|NOT)\b", " ", text)).split()]
+
+        matches = []
+        for pmid in (candidates if candidates is not None else self._records):
+            record = self._records[pmid]
+            if date_range:
+                key = "entrez" if field.lower() in ("edat", "crdt") else "published"
+                if not self._in_range(record[key], start, end):
+                    continue
+            if words:
+                content = self._titles[pmid] + " " + normalize_text(" ".join(text for _, text in record["abstract"]))
+                if not all(word in content for word in words):
+                    continue
+            matches.append(pmid)
+
+        return sorted(matches, key=int, reverse=True)
+
+    @staticmethod
+    def _in_range(value, start, end):
+        def parse(text, upper):
+            parts = [int(part) for part in text.split("/")]
+            if len(parts) == 1:
+                return date(parts[0], 12, 31) if upper else date(parts[0], 1, 1)
+            if len(parts) == 2:
+                if not upper:
+                    return date(parts[0], parts[1], 1)
+                following = date(parts[0] + parts[1] // 12, parts[1] % 12 + 1, 1)
+                return following - timedelta(days=1)
+            return date(*parts)
+
+        return parse(start, False) <= value <= parse(end, True)
+
+    def article_xml(self, pmid):
+        """
+        Returns the `<PubmedArticle>` XML of an article.
+        """
+        r = self._records[str(pmid)]
+        published, entrez = r["published"], r["entrez"]
+        medline_ta, journal_title, issn, country = r["journal"]
+        pages = f"{r['first_page']}-{r['first_page'] + 9}"
+
+        authors = []
+        for (last_name, fore_name, orcid), affiliation in zip(r["authors"], r["affiliations"]):
+            identifier = f'<Identifier Source="ORCID">{orcid}</Identifier>' if orcid else ""
+            authors.append(
+                f'<Author ValidYN="Y"><LastName>{escape(last_name)}</LastName><ForeName>{escape(fore_name)}</ForeName>'
+                f"<Initials>{fore_name[0]}</Initials>{identifier}"
+                f"<AffiliationInfo><Affiliation>{escape(affiliation)}</Affiliation></AffiliationInfo></Author>"
+            )
+        abstract = "".join(f'<AbstractText Label="{label}">{escape(text)}</AbstractText>' for label, text in r["abstract"])
+        mesh = "".join(
+            f'<MeshHeading><DescriptorName UI="D{index:06d}" MajorTopicYN="{"Y" if index == 0 else "N"}">{escape(term)}</DescriptorName></MeshHeading>'
+            for index, term in enumerate(r["mesh"])
+        )
+        keywords = "".join(f'<Keyword MajorTopicYN="N">{escape(keyword)}</Keyword>' for keyword in r["keywords"])
+        grants = "".join(
+            f"<Grant><GrantID>{grant_id}</GrantID><Agency>{agency}</Agency><Country>United States</Country></Grant>"
+            for grant_id, agency in r["grants"]
+        )
+        publication_types = "".join(
+            f'<PublicationType UI="D016428">{escape(publication_type)}</PublicationType>'
+            for publication_type in r["publication_types"]
+        )
+        references = "".join(
+            f"<Reference><Citation>{escape(citation)}</Citation></Reference>" for citation in r["references"]
+        )
+        grant_list = f'<GrantList CompleteYN="Y">{grants}</GrantList>' if grants else ""
+        keyword_list = f'<KeywordList Owner="NOTNLM">{keywords}</KeywordList>' if keywords else ""
+        reference_list = f"<ReferenceList>{references}</ReferenceList>" if references else ""
+        pmc_id = f'<ArticleId IdType="pmc">{r["pmc"]}</ArticleId>' if r["pmc"] else ""
+
+        def pub_date(status, value):
+            return (f'<PubMedPubDate PubStatus="{status}"><Year>{value.year}</Year><Month>{value.month}</Month>'
+                    f"<Day>{value.day}</Day><Hour>0</Hour><Minute>0</Minute></PubMedPubDate>")
+
+        return (
+            f'<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM" IndexingMethod="Automated">'
+            f'<PMID Version="1">{r["pmid"]}</PMID>'
+            f"<DateCompleted><Year>{published.year}</Year><Month>{published.month:02d}</Month><Day>{published.day:02d}</Day></DateCompleted>"
+            f"<DateRevised><Year>{published.year + 1}</Year><Month>{published.month:02d}</Month><Day>{published.day:02d}</Day></DateRevised>"
+            f'<Article PubModel="Electronic-eCollection"><Journal><ISSN IssnType="Electronic">{issn}</ISSN>'
+            f'<JournalIssue CitedMedium="Internet"><Volume>{r["volume"]}</Volume><Issue>{r["issue"]}</Issue>'
+            f"<PubDate><Year>{published.year}</Year><Month>{MONTHS[published.month - 1]}</Month></PubDate></JournalIssue>"
+            f"<Title>{escape(journal_title)}</Title><ISOAbbreviation>{escape(medline_ta)}</ISOAbbreviation></Journal>"
+            f"<ArticleTitle>{escape(r['title'])}</ArticleTitle>"
+            f"<Pagination><StartPage>{r['first_page']}</StartPage><MedlinePgn>{pages}</MedlinePgn></Pagination>"
+            f'<ELocationID EIdType="doi" ValidYN="Y">{r["doi"]}</ELocationID>'
+            f'<ELocationID EIdType="pii" ValidYN="Y">{r["first_page"]}</ELocationID>'
+            f"<Abstract>{abstract}<CopyrightInformation>© {published.year} The Author(s).</CopyrightInformation></Abstract>"
+            f'<AuthorList CompleteYN="Y">{"".join(authors)}</AuthorList>'
+            f"<Language>eng</Language>{grant_list}"
+            f"<PublicationTypeList>{publication_types}</PublicationTypeList>"
+            f'<ArticleDate DateType="Electronic"><Year>{published.year}</Year><Month>{published.month:02d}</Month><Day>{published.day:02d}</Day></ArticleDate>'
+            f"</Article><MedlineJournalInfo><Country>{country}</Country><MedlineTA>{escape(medline_ta)}</MedlineTA>"
+            f"<NlmUniqueID>{journal_id(medline_ta)}</NlmUniqueID><ISSNLinking>{issn}</ISSNLinking></MedlineJournalInfo>"
+            f"<CitationSubset>IM</CitationSubset><MeshHeadingList>{mesh}</MeshHeadingList>"
+            f"{keyword_list}"
+            f"<CoiStatement>The authors declare no competing interests.</CoiStatement></MedlineCitation>"
+            f"<PubmedData><History>{pub_date('received', published - timedelta(days=90))}"
+            f"{pub_date('accepted', published - timedelta(days=20))}{pub_date('entrez', entrez)}"
+            f"{pub_date('pubmed', entrez)}{pub_date('medline', entrez)}</History>"
+            f"<PublicationStatus>epublish</PublicationStatus><ArticleIdList>"
+            f'<ArticleId IdType="pubmed">{r["pmid"]}</ArticleId><ArticleId IdType="doi">{r["doi"]}</ArticleId>'
+            f'<ArticleId IdType="pii">{r["first_page"]}</ArticleId>'
+            f"{pmc_id}</ArticleIdList>{reference_list}</PubmedData></PubmedArticle>"
+        )
+
+    def summary_xml(self, pmid):
+        """
+        Returns the ESummary (version 1.0) `<DocSum>` of an article.
+        """
+        r = self._records[str(pmid)]
+        published = r["published"]
+        medline_ta, journal_title, issn, _ = r["journal"]
+        pub_date = f"{published.year} {MONTHS[published.month - 1]} {published.day}"
+        pages = f"{r['first_page']}-{r['first_page'] + 9}"
+        source = f"{published.year} {MONTHS[published.month - 1]};{r['volume']}({r['issue']}):{pages}"
+
+        def item(name, value, item_type="String"):
+            return f'<Item Name="{name}" Type="{item_type}">{escape(str(value))}</Item>'
+
+        authors = "".join(item("Author", f"{last_name} {fore_name[0]}") for last_name, fore_name, _ in r["authors"])
+        article_ids = item("pubmed", r["pmid"]) + item("doi", r["doi"]) + (item("pmc", r["pmc"]) if r["pmc"] else "")
+        publication_types = "".join(item("PubType", value) for value in r["publication_types"])
+
+        return (
+            f"<DocSum><Id>{r['pmid']}</Id>"
+            f"{item('PubDate', pub_date, 'Date')}{item('EPubDate', pub_date, 'Date')}{item('Source', medline_ta)}"
+            f'<Item Name="AuthorList" Type="List">{authors}</Item>'
+            f"{item('LastAuthor', r['authors'][-1][0] + ' ' + r['authors'][-1][1][0])}"
+            f"{item('Title', r['title'])}{item('Volume', r['volume'])}{item('Issue', r['issue'])}{item('Pages', pages)}"
+            f'<Item Name="LangList" Type="List">{item("Lang", "English")}</Item>'
+            f"{item('NlmUniqueID', journal_id(medline_ta))}{item('ISSN', '')}{item('ESSN', issn)}"
+            f'<Item Name="PubTypeList" Type="List">{publication_types}</Item>'
+            f"{item('RecordStatus', 'PubMed - indexed for MEDLINE')}{item('PubStatus', 'epublish')}"
+            f'<Item Name="ArticleIds" Type="List">{article_ids}</Item>{item("DOI", r["doi"])}'
+            f'<Item Name="History" Type="List"></Item><Item Name="References" Type="List"></Item>'
+            f"{item('HasAbstract', 1, 'Integer')}{item('PmcRefCount', 0, 'Integer')}"
+            f"{item('FullJournalName', journal_title)}{item('ELocationID', 'doi: ' + r['doi'])}"
+            f"{item('SO', source)}"
+            f"</DocSum>"
+        )
+
+
+class FaultInjector:
+    """
+    Random faults added to mock responses.
+
+    Args:
+        latency (float): Fixed delay in seconds added to every response.
+        jitter (float): Maximum random delay in seconds added on top of `latency`.
+        rate_429 (float): Probability of an HTTP 429 reply with a `Retry-After` header.
+        rate_5xx (float): Probability of an HTTP 500/502/503 reply.
+        rate_truncate (float): Probability of cutting the body in half and closing the connection.
+        rate_limit (float): Requests per second served before answering 429, as NCBI does (0 disables it).
+        retry_after (float): Value of the `Retry-After` header of 429 replies.
+        seed (int, optional): Seed for reproducible fault sequences.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, rate_5xx=0.0, rate_truncate=0.0,
+                 rate_limit=0.0, retry_after=1.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rate_truncate = rate_truncate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = []
+
+    def delay(self):
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra
+
+    def _over_rate_limit(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 1.0]
+        if len(self._window) >= self.rate_limit:
+            return True
+        self._window.append(now)
+        return False
+
+    def choose(self):
+        """
+        Returns the fault for the next response: None, "429", "5xx" or "truncate".
+        """
+        with self._lock:
+            if self._over_rate_limit():
+                return "429"
+            draw = self._random.random()
+            if draw < self.rate_429:
+                return "429"
+            if draw < self.rate_429 + self.rate_5xx:
+                return "5xx"
+            if draw < self.rate_429 + self.rate_5xx + self.rate_truncate:
+                return "truncate"
+            return None
+
+    def server_error(self):
+        """
+        Returns the status code of a "5xx" fault: 500, 502 or 503.
+        """
+        with self._lock:
+            return self._random.choice(SERVER_ERROR_CODES)
+
+
+def request_key(utility, params):
+    """
+    Returns the record/replay key of a request: the utility and its sorted parameters,
+    without the client identification.
+    """
+    items = sorted((key, value) for key, value in params.items() if key not in IDENTIFICATION_PARAMS)
+    return hashlib.sha1(json.dumps([utility, items]).encode("utf-8")).hexdigest()
+
+
+class MockEutilsServer(ThreadingHTTPServer):
+    """
+    Local E-utilities server.
+
+    Modes:
+        - "synthetic": answers from a `SyntheticCorpus`.
+        - "replay": answers from responses saved in `recordings_dir`.
+        - "record": forwards every request to `upstream` and saves the response for replay.
+
+    Example:
+        server = MockEutilsServer(mode="synthetic", corpus=SyntheticCorpus(5000))
+        server.start()
+        configure_client({"base_url": server.base_url})
+        ...
+        server.stop()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, mode="synthetic", corpus=None, recordings_dir=None,
+                 upstream="https://eutils.ncbi.nlm.nih.gov/entrez/eutils/", faults=None):
+        if mode not in ("synthetic", "replay", "record"):
+            raise ValueError(f"Unknown mock mode: {mode}")
+        if mode in ("replay", "record") and not recordings_dir:
+            raise ValueError(f"Mode '{mode}' requires recordings_dir")
+
+        super().__init__((host, port), MockEutilsHandler)
+        self.mode = mode
+        self.corpus = corpus if corpus is not None or mode != "synthetic" else SyntheticCorpus()
+        self.recordings_dir = recordings_dir
+        self.upstream = upstream.rstrip("/") + "/"
+        self.faults = faults or FaultInjector()
+        self.history = {}
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        if recordings_dir and not os.path.exists(recordings_dir):
+            os.makedirs(recordings_dir)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/entrez/eutils/"
+
+    def start(self):
+        """
+        Serves requests from a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        logging.info(f"Mock E-utilities server ({self.mode}) listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    # History server -----------------------------------------------------
+
+    def store_history(self, pmids, webenv=None):
+        with self._lock:
+            webenv = webenv if webenv in self.history else f"MCID_{uuid.uuid4().hex}"
+            keys = self.history.setdefault(webenv, {})
+            query_key = str(len(keys) + 1)
+            keys[query_key] = list(pmids)
+        return webenv, query_key
+
+    def load_history(self, webenv, query_key):
+        with self._lock:
+            return self.history.get(webenv, {}).get(str(query_key))
+
+    # Synthetic responses ---------------------------------------------------
+
+    def synthetic_response(self, utility, params):
+        corpus = self.corpus
+        retstart = int(params.get("retstart", 0) or 0)
+
+        if utility == "esearch":
+            retmax = int(params.get("retmax", 20) or 0)
+            if retstart > ESEARCH_MAX_POSITION:
+                return 200, (f"{XML_DECLARATION}\n{ESEARCH_DOCTYPE}\n<eSearchResult><ERROR>Search Backend failed: "
+                             f"retstart cannot be larger than {ESEARCH_MAX_POSITION}</ERROR></eSearchResult>")
+            pmids = corpus.search(params.get("term", ""))
+            history = ""
+            if params.get("usehistory") == "y":
+                webenv, query_key = self.store_history(pmids, params.get("WebEnv"))
+                history = f"<QueryKey>{query_key}</QueryKey><WebEnv>{webenv}</WebEnv>"
+            page = pmids[retstart:retstart + retmax]
+            ids = "".join(f"<Id>{pmid}</Id>" for pmid in page)
+            return 200, (
+                f"{XML_DECLARATION}\n{ESEARCH_DOCTYPE}\n<eSearchResult><Count>{len(pmids)}</Count>"
+                f"<RetMax>{len(page)}</RetMax><RetStart>{retstart}</RetStart>{history}<IdList>{ids}</IdList>"
+                f"<TranslationSet/><QueryTranslation>{escape(params.get('term', ''))}</QueryTranslation></eSearchResult>"
+            )
+
+        if utility == "epost":
+            pmids = [pmid.strip() for pmid in params.get("id", "").split(",") if pmid.strip()]
+            webenv, query_key = self.store_history(pmids, params.get("WebEnv"))
+            return 200, (f"{XML_DECLARATION}\n{EPOST_DOCTYPE}\n<ePostResult><QueryKey>{query_key}</QueryKey>"
+                         f"<WebEnv>{webenv}</WebEnv></ePostResult>")
+
+        if utility in ("efetch", "esummary"):
+            if params.get("WebEnv") and params.get("query_key"):
+                pmids = self.load_history(params["WebEnv"], params["query_key"])
+                if pmids is None:
+                    return 400, "<ERROR>Unable to obtain query #1</ERROR>"
+                pmids = pmids[retstart:retstart + int(params.get("retmax", 20) or 0)]
+            else:
+                pmids = [pmid.strip() for pmid in params.get("id", "").split(",") if pmid.strip()]
+            pmids = [pmid for pmid in pmids if pmid in corpus]
+
+            if utility == "efetch":
+                articles = "\n".join(corpus.article_xml(pmid) for pmid in pmids)
+                return 200, f"{XML_DECLARATION}\n{PUBMED_DOCTYPE}\n<PubmedArticleSet>\n{articles}\n</PubmedArticleSet>\n"
+
+            summaries = "".join(corpus.summary_xml(pmid) for pmid in pmids)
+            return 200, f"{XML_DECLARATION}\n{ESUMMARY_DOCTYPE}\n<eSummaryResult>{summaries}</eSummaryResult>"
+
+        return 400, f"<ERROR>Unsupported utility: {escape(utility)}</ERROR>"
+
+    # Record and replay -------------------------------------------------------
+
+    def _recording_path(self, utility, params):
+        return os.path.join(self.recordings_dir, f"{utility}_{request_key(utility, params)}.json")
+
+    def replay_response(self, utility, params):
+        path = self._recording_path(utility, params)
+        if not os.path.exists(path):
+            return 404, f"<ERROR>No recording for {escape(utility)} request</ERROR>"
+        with open(path, "r", encoding="utf-8") as file:
+            recording = json.load(file)
+        return recording["status"], recording["body"]
+
+    def record_response(self, utility, params, raw_query, raw_body):
+        if raw_body:
+            request = Request(f"{self.upstream}{utility}.fcgi", data=raw_body.encode("utf-8"), method="POST")
+        else:
+            request = Request(f"{self.upstream}{utility}.fcgi?{raw_query}", method="GET")
+
+        try:
+            with urlopen(request, timeout=60) as response:
+                status, text = response.status, response.read().decode("utf-8")
+        except HTTPError as e:
+            status, text = e.code, e.read().decode("utf-8", errors="replace")
+
+        recording = {"utility": utility,
+                     "params": {key: value for key, value in params.items() if key not in IDENTIFICATION_PARAMS},
+                     "status": status, "body": text}
+        with open(self._recording_path(utility, params), "w", encoding="utf-8") as file:
+            json.dump(recording, file)
+        return status, text
+
+    def respond(self, utility, params, raw_query, raw_body):
+        if self.mode == "synthetic":
+            return self.synthetic_response(utility, params)
+        if self.mode == "replay":
+            return self.replay_response(utility, params)
+        return self.record_response(utility, params, raw_query, raw_body)
+
+
+class MockEutilsHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for `MockEutilsServer`. Supports keep-alive and gzip responses.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug(f"Mock E-utilities: {format % args}")
+
+    def _handle(self, raw_body):
+        url = urlsplit(self.path)
+        utility = os.path.basename(url.path).replace(".fcgi", "")
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        params.update(dict(parse_qsl(raw_body, keep_blank_values=True)))
+
+        server = self.server
+        server.count(utility)
+        time.sleep(server.faults.delay())
+
+        fault = server.faults.choose()
+        if fault == "429":
+            server.count("fault_429")
+            return self._send(429, '{"error":"API rate limit exceeded"}', content_type="application/json",
+                              headers={"Retry-After": str(server.faults.retry_after)})
+        if fault == "5xx":
+            server.count("fault_5xx")
+            return self._send(server.faults.server_error(), "<ERROR>Internal server error</ERROR>")
+
+        status, body = server.respond(utility, params, url.query, raw_body)
+        self._send(status, body, truncate=(fault == "truncate"))
+
+    def _send(self, status, body, content_type="text/xml; charset=UTF-8", headers=None, truncate=False):
+        data = body.encode("utf-8")
+        if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            data = gzip.compress(data, mtime=0)
+            headers = {**(headers or {}), "Content-Encoding": "gzip"}
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        if truncate:
+            # Announce the full length but send half of it, then drop the connection
+            self.server.count("fault_truncate")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = True
+            return
+
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle("")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._handle(self.rfile.read(length).decode("utf-8") if length else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the NCBI E-utilities.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--mode", choices=("synthetic", "replay", "record"), default="synthetic")
+    parser.add_argument("--articles", type=int, default=10000, help="Size of the synthetic corpus.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--recordings", help="Directory of recorded responses (replay/record modes).")
+    parser.add_argument("--upstream", default="https://eutils.ncbi.nlm.nih.gov/entrez/eutils/")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--rate-truncate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second before answering 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    faults = FaultInjector(args.latency, args.jitter, args.rate_429, args.rate_5xx, args.rate_truncate,
+                           args.rate_limit, args.retry_after, args.seed)
+    corpus = SyntheticCorpus(args.articles, args.seed) if args.mode == "synthetic" else None
+    server = MockEutilsServer(args.host, args.port, args.mode, corpus, args.recordings, args.upstream, faults)
+
+    print(f"Mock E-utilities ({args.mode}) on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Requests served: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
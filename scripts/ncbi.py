@@ -1,50 +1,1638 @@
+import asyncio
+import http.client
+import io
 import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
 #from tqdm import tqdm
 from Bio import Entrez
+from Bio.Entrez.Parser import CorruptedXMLError, NotXMLError
+
+from scripts.cache import SearchCache
+
+
+# NCBI allows 3 requests per second per client, or 10 with an API key
+DEFAULT_RATE_LIMIT = 3.0
+API_KEY_RATE_LIMIT = 10.0
+DEFAULT_MAX_IN_FLIGHT = 5
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every E-utilities request.
+
+    Each call to `acquire` reserves one token and waits until it becomes available, so
+    concurrent callers are spaced out to the configured rate instead of sleeping a
+    fixed time between requests.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, capacity=1):
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        self.base_rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate, capacity=None, base=False):
+        """
+        Changes the refill rate (requests per second) and optionally the burst capacity.
+        With `base`, the rate also becomes the configured rate that the circuit breaker
+        restores after throttling.
+        """
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+            if base:
+                self.base_rate = float(rate)
+            if capacity is not None:
+                self.capacity = float(capacity)
+                self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        Reserves one token and returns how many seconds the caller must wait to use it.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def pause(self, seconds):
+        """
+        Delays every pending and future reservation by `seconds`.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def acquire(self):
+        """
+        Blocks until a token is available.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+RATE_LIMITER = TokenBucket()
+CLIENT_SETTINGS = {"max_in_flight": DEFAULT_MAX_IN_FLIGHT}
+
+
+EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+# NCBI asks for POST when the parameters are long or list 200 or more identifiers
+POST_PARAMS_LENGTH = 1000
+POST_ID_COUNT = 200
+
+
+class EutilsResponse(io.RawIOBase):
+    """
+    Binary file-like response that decompresses gzip/deflate bodies while they are read.
+
+    The connection goes back to the session pool when the body was read to the end, and
+    is closed otherwise, so a partially read keep-alive connection is never reused.
+    """
+
+    def __init__(self, session, connection, response):
+        self._session = session
+        self._connection = connection
+        self._response = response
+        self.url = session.url
+        self.headers = response.headers
+
+        self._encoding = (response.getheader("Content-Encoding") or "").lower()
+        if self._encoding == "gzip":
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self._encoding == "deflate":
+            self._decompressor = zlib.decompressobj()
+        else:
+            self._decompressor = None
+
+        self._buffer = b""
+        self._eof = False
+        self._first_chunk = True
+
+    def readable(self):
+        return True
+
+    def _read_chunk(self, size):
+        data = self._response.read(size)
+        if not data:
+            self._eof = True
+            if self._decompressor is not None:
+                return self._decompressor.flush()
+            return b""
+
+        if self._decompressor is None:
+            return data
+
+        first_chunk, self._first_chunk = self._first_chunk, False
+        try:
+            return self._decompressor.decompress(data)
+        except zlib.error:
+            # Some servers send raw deflate data without the zlib header
+            if not first_chunk or self._encoding != "deflate":
+                raise
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompressor.decompress(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._buffer]
+            self._buffer = b""
+            while not self._eof:
+                chunks.append(self._read_chunk(STREAM_CHUNK_SIZE))
+            return b"".join(chunks)
+
+        while len(self._buffer) < size and not self._eof:
+            self._buffer += self._read_chunk(size)
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self._connection is not None:
+            reusable = self._eof and not self._response.will_close
+            self._session._release(self._connection, reusable)
+            self._connection = None
+        super().close()
+
+
+class EutilsSession:
+    """
+    Pooled keep-alive HTTP session for all E-utilities requests.
+
+    Connections are reused between requests, so the TCP and TLS setup is paid once per
+    pooled connection instead of once per call, and responses are requested with
+    gzip/deflate content encoding. `base_url` can point to a local stand-in server.
+    """
+
+    def __init__(self, base_url=EUTILS_BASE_URL, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported E-utilities base URL: {base_url}")
+
+        self.url = base_url
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path.rstrip("/") + "/"
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        connection = connection_class(self.host, self.port, timeout=self.connect_timeout)
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+        return connection
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, connection, reusable):
+        if reusable:
+            try:
+                self._pool.put_nowait(connection)
+                return
+            except queue.Full:
+                pass
+        connection.close()
+
+    def close(self):
+        """
+        Closes every idle pooled connection.
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _build_params(self, params):
+        params = {key: value for key, value in params.items() if value is not None}
+        if isinstance(params.get("id"), (list, tuple, set)):
+            params["id"] = ",".join(str(id) for id in params["id"])
+
+        # Identification required by NCBI, as sent by Bio.Entrez
+        params.setdefault("tool", Entrez.tool)
+        if Entrez.email:
+            params.setdefault("email", Entrez.email)
+        if Entrez.api_key:
+            params.setdefault("api_key", Entrez.api_key)
+        return params
+
+    def request(self, utility, post=None, **params):
+        """
+        Sends an E-utilities request and returns the open response.
+
+        Args:
+            utility (str): Name of the E-utility (e.g. "esearch", "efetch").
+            post (bool, optional): Force POST or GET. By default POST is used for long
+                parameter lists or 200 or more identifiers, as NCBI recommends.
+            **params: Parameters of the E-utility.
+
+        Returns:
+            EutilsResponse: Binary file-like response body.
+
+        Raises:
+            urllib.error.HTTPError: If the server answers with an HTTP error status.
+        """
+        params = self._build_params(params)
+        body = urlencode(params)
+        if post is None:
+            post = len(body) > POST_PARAMS_LENGTH or str(params.get("id", "")).count(",") + 1 >= POST_ID_COUNT
+
+        path = f"{self.path}{utility}.fcgi"
+        headers = {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        if post:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        else:
+            path = f"{path}?{body}"
+
+        connection, reused = self._acquire()
+        try:
+            try:
+                connection.request("POST" if post else "GET", path, body=body.encode("utf-8") if post else None, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A pooled connection may have been closed by the server while idle
+                connection.close()
+                if not reused:
+                    raise
+                connection = self._connect()
+                connection.request("POST" if post else "GET", path, body=body.encode("utf-8") if post else None, headers=headers)
+                response = connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+
+        handle = EutilsResponse(self, connection, response)
+        if response.status >= 400:
+            error_body = handle.read()
+            handle.close()
+            raise HTTPError(f"{self.url}{utility}.fcgi", response.status, response.reason,
+                            response.headers, io.BytesIO(error_body))
+        return handle
+
+
+SESSION = EutilsSession()
+
+
+def configure_client(ncbi_config=None, api_key=None):
+    """
+    Configures the shared rate limit and concurrency of the E-utilities client.
+
+    Args:
+        ncbi_config (dict, optional): The `ncbi` section of config.yaml. Supported keys are
+            `requests_per_second`, `requests_per_second_api_key`, `burst`, `max_in_flight`,
+            `base_url`, `pool_size`, `connect_timeout` and `read_timeout`.
+        api_key (str, optional): The NCBI API key. When set, the API key rate limit is used.
+    """
+    global SESSION
+    ncbi_config = ncbi_config or {}
+
+    if api_key:
+        rate = float(ncbi_config.get("requests_per_second_api_key", API_KEY_RATE_LIMIT))
+    else:
+        rate = float(ncbi_config.get("requests_per_second", DEFAULT_RATE_LIMIT))
+
+    RATE_LIMITER.set_rate(rate, capacity=int(ncbi_config.get("burst", 1)), base=True)
+    CLIENT_SETTINGS["max_in_flight"] = int(ncbi_config.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+
+    SESSION.close()
+    SESSION = EutilsSession(
+        base_url=ncbi_config.get("base_url") or EUTILS_BASE_URL,
+        pool_size=int(ncbi_config.get("pool_size", DEFAULT_POOL_SIZE)),
+        connect_timeout=float(ncbi_config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT)),
+        read_timeout=float(ncbi_config.get("read_timeout", DEFAULT_READ_TIMEOUT)),
+    )
+    logging.info(f"E-utilities client: {SESSION.url} - {rate} requests/s - {CLIENT_SETTINGS['max_in_flight']} in flight")
+
+
+def configure_rate_limiter(limiter):
+    """
+    Replaces the rate limiter shared by every E-utilities request.
+
+    Used by scripts.coordinator to make several processes draw from one request budget.
+    The limiter must provide `rate`, `base_rate`, `set_rate`, `reserve`, `pause` and `acquire`.
+    """
+    global RATE_LIMITER
+    RATE_LIMITER = limiter
+    CIRCUIT_BREAKER.limiter = limiter
+
+
+SEARCH_CACHE = None
+XML_STORE = None
+XML_STORE_WRITE = False
+
+
+def configure_cache(cache_config=None, path_root="."):
+    """
+    Enables the persistent ESearch cache used by `request_count`.
+
+    Args:
+        cache_config (dict, optional): The `cache` section of config.yaml with the keys
+            `enabled`, `path`, `ttl_days` and `negative_ttl_days`.
+        path_root (str): Root directory the cache path is relative to.
+    """
+    global SEARCH_CACHE
+    cache_config = cache_config or {}
+
+    if SEARCH_CACHE is not None:
+        SEARCH_CACHE.close()
+        SEARCH_CACHE = None
+
+    if not cache_config.get("enabled", False):
+        return
+
+    path = os.path.normpath(os.path.join(path_root, cache_config.get("path", "./data/cache/esearch.sqlite")))
+    SEARCH_CACHE = SearchCache(path, cache_config.get("ttl_days"), cache_config.get("negative_ttl_days"))
+    logging.info(f"Search cache enabled: {path}")
+
+
+def configure_xml_store(store, write=False):
+    """
+    Sets the raw XML store that `request_data` and `fetch_articles` read from first.
+
+    Args:
+        store (XmlStore or None): The store, or None to always go to the network.
+        write (bool): Whether articles fetched from the network are also written to the store.
+    """
+    global XML_STORE, XML_STORE_WRITE
+    XML_STORE = store
+    XML_STORE_WRITE = bool(write)
+
+
+def cache_stats():
+    """
+    Returns the hit/miss counters of the ESearch cache, or None when it is disabled.
+    """
+    return dict(SEARCH_CACHE.stats) if SEARCH_CACHE is not None else None
+
+
+def open_eutils(utility, **params):
+    """
+    Opens an E-utilities request through the shared session after taking a rate limit token.
+
+    Args:
+        utility (str): Name of the E-utility (e.g. "esearch", "efetch").
+        **params: Parameters passed to the E-utility.
+
+    Returns:
+        EutilsResponse: Binary file-like response handle.
+    """
+    RATE_LIMITER.acquire()
+    return SESSION.request(utility, **params)
+
+
+def read_eutils(utility, **params):
+    """
+    Performs an E-utilities request and parses the XML reply with `Entrez.read`.
+    """
+    handle = open_eutils(utility, **params)
+    try:
+        return Entrez.read(handle)
+    finally:
+        handle.close()
+
+FOUND = "found"
+NOT_FOUND = "not_found"
+TRANSIENT = "transient"
+
+
+class QueryOutcome(namedtuple("QueryOutcome", ["status", "count", "id_list", "error"])):
+    """
+    Typed result of an ESearch query.
+
+    `status` is FOUND, NOT_FOUND or TRANSIENT. A TRANSIENT outcome means the request kept
+    failing with throttling, timeouts or truncated replies, so the query must be retried
+    later rather than reported as missing from PubMed.
+    """
+
+    __slots__ = ()
+
+
+class TransientError(Exception):
+    """
+    Raised when a request keeps failing with a transient error after every retry.
+    """
+
+
+THROTTLE_CODES = (429, 503)
+TRANSIENT_EXCEPTIONS = (
+    URLError,
+    TimeoutError,
+    ConnectionError,
+    http.client.HTTPException,
+    ET.ParseError,
+    CorruptedXMLError,
+    NotXMLError,
+)
+
+
+def is_throttled(error):
+    """
+    Returns True if the error is an HTTP throttling response from NCBI.
+    """
+    return isinstance(error, HTTPError) and error.code in THROTTLE_CODES
+
+
+def is_transient(error):
+    """
+    Returns True if the request may succeed when it is tried again.
+
+    HTTP 429 and 5xx responses, network errors, timeouts and truncated or corrupted XML
+    are transient. Other HTTP 4xx errors are caused by the request itself.
+    """
+    if isinstance(error, HTTPError):
+        return error.code == 429 or error.code >= 500
+    # Entrez.read raises RuntimeError for <ERROR> replies such as "Search Backend failed"
+    return isinstance(error, TRANSIENT_EXCEPTIONS) or isinstance(error, RuntimeError)
+
+
+def retry_after(error):
+    """
+    Returns the delay in seconds requested by a `Retry-After` header, or None.
+    """
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, honoring `Retry-After` when NCBI sends it.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, error=None):
+        """
+        Returns the wait in seconds before the next attempt (attempt starts at 0).
+        """
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(requested, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Slows the whole client down when NCBI starts throttling.
+
+    When `threshold` throttling responses arrive within `window` seconds, the shared
+    rate limit is multiplied by `slowdown` and every pending request is paused. The
+    configured rate of the limiter (`base_rate`) is restored after `cooldown` seconds
+    without new throttling; it is read from the limiter rather than remembered, since a
+    limiter shared by several processes may already have been lowered by another one.
+    """
+
+    def __init__(self, limiter, threshold=3, window=30.0, cooldown=60.0, slowdown=0.5):
+        self._lock = threading.Lock()
+        self.limiter = limiter
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.slowdown = slowdown
+        self._events = []
+        self._tripped_at = None
+
+    @property
+    def is_open(self):
+        return self._tripped_at is not None
+
+    def record_throttle(self, pause=None):
+        """
+        Records a throttling response and trips the breaker when the threshold is reached.
+
+        Args:
+            pause (float, optional): Seconds requested by the server before the next request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._events = [t for t in self._events if now - t < self.window] + [now]
+
+            if len(self._events) >= self.threshold:
+                self.limiter.set_rate(max(self.limiter.rate * self.slowdown, 0.5))
+                self._tripped_at = now
+                self._events = []
+                logging.warning(f"NCBI throttling detected: rate limit lowered to {self.limiter.rate} requests/s")
+
+            if pause:
+                self.limiter.pause(pause)
+
+    def record_success(self):
+        """
+        Restores the configured rate once the cooldown has passed without throttling.
+        """
+        if self._tripped_at is None:
+            return
+
+        with self._lock:
+            if self._tripped_at is not None and time.monotonic() - self._tripped_at >= self.cooldown:
+                base_rate = self.limiter.base_rate
+                self.limiter.set_rate(base_rate)
+                logging.info(f"NCBI throttling cleared: rate limit restored to {base_rate} requests/s")
+                self._tripped_at = None
+
+
+RETRY_POLICY = RetryPolicy()
+CIRCUIT_BREAKER = CircuitBreaker(RATE_LIMITER)
+
+
+def call_with_retry(func, *args, policy=None, **kwargs):
+    """
+    Calls `func` and retries transient failures with backoff.
+
+    Args:
+        func (callable): The request function. It must perform the whole request,
+            including reading the response, so truncated replies are retried too.
+        policy (RetryPolicy, optional): Retry settings. Defaults to `RETRY_POLICY`.
+
+    Returns:
+        The value returned by `func`.
+
+    Raises:
+        TransientError: If every attempt failed with a transient error.
+        Exception: Non-transient errors are raised immediately.
+    """
+    policy = policy or RETRY_POLICY
+
+    for attempt in range(policy.max_attempts):
+        try:
+            result = func(*args, **kwargs)
+            CIRCUIT_BREAKER.record_success()
+            return result
+        except Exception as e:
+            if not is_transient(e):
+                raise
+
+            if is_throttled(e):
+                CIRCUIT_BREAKER.record_throttle(retry_after(e))
+
+            if attempt + 1 >= policy.max_attempts:
+                raise TransientError(f"{e} (after {policy.max_attempts} attempts)") from e
+
+            delay = policy.delay(attempt, e)
+            logging.warning(f"Transient error (attempt {attempt + 1}/{policy.max_attempts}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+
+def request_count_outcome(query, retmax=200):
+    """
+    Performs a search query on the PubMed database and returns a typed outcome.
+
+    Throttling, timeouts and truncated replies are retried with backoff. If they keep
+    failing, the outcome is TRANSIENT instead of an empty result. When the ESearch cache
+    is enabled, cached results are returned without a request, and only FOUND and
+    NOT_FOUND outcomes are stored.
+
+    Args:
+        query (str): The search term to query the PubMed database.
+        retmax (int): Maximum number of PMIDs to return.
+
+    Returns:
+        QueryOutcome: The status (FOUND, NOT_FOUND or TRANSIENT), the total number of
+        results, the list of PMIDs and the last error, if any.
+    """
+    if SEARCH_CACHE is not None:
+        cached = SEARCH_CACHE.get(query, retmax)
+        if cached is not None:
+            count, id_list = cached
+            return QueryOutcome(FOUND if count else NOT_FOUND, count, id_list, None)
+
+    try:
+        record = call_with_retry(read_eutils, "esearch", db="pubmed", term=query, retmax=retmax)
+    except TransientError as e:
+        logging.error(f"Transient failure during query execution: {e}")
+        return QueryOutcome(TRANSIENT, 0, [], str(e))
+    except Exception as e:
+        # Errors caused by the query itself will not go away on a retry
+        logging.error(f"Error during query execution: {e}")
+        return QueryOutcome(NOT_FOUND, 0, [], str(e))
+
+    count = int(record["Count"])
+    id_list = [str(id) for id in record.get("IdList", [])]
+    if SEARCH_CACHE is not None:
+        SEARCH_CACHE.set(query, retmax, count, id_list)
+
+    return QueryOutcome(FOUND if count else NOT_FOUND, count, id_list, None)
 
 
 # Função para contar resultados da consulta
-def request_count(query):
+def request_count(query, retmax=200):
     """
     Performs a search query on the PubMed database and retrieves the total count of results and a list of article IDs.
 
     Args:
         query (str): The search term to query the PubMed database.
+        retmax (int): Maximum number of PMIDs to return.
 
     Returns:
         tuple: A tuple containing:
             - int: The total number of results found.
             - list: A list of PubMed IDs (PMIDs) for the articles retrieved by the query.
     
-    Raises:
-        Exception: If an error occurs during the request, it will be logged.
+    Note:
+        Failures are logged and returned as (0, []). Use `request_count_outcome` to tell
+        a transient failure apart from a query without results.
+    """
+    outcome = request_count_outcome(query, retmax)
+    return outcome.count, outcome.id_list
+
+
+def resolve_queries(queries, retmax=200, requeue_rounds=2, requeue_delay=30.0):
     """
+    Runs many queries and re-queues only those whose outcome is still TRANSIENT.
+
+    Args:
+        queries (list): Search terms to query the PubMed database.
+        retmax (int): Maximum number of PMIDs to return per query.
+        requeue_rounds (int): Extra passes over the queries that failed transiently.
+        requeue_delay (float): Seconds to wait before each extra pass.
+
+    Returns:
+        dict: A dictionary mapping each query to its QueryOutcome.
+    """
+    outcomes = {}
+    pending = list(dict.fromkeys(queries))
+
+    for round_number in range(requeue_rounds + 1):
+        if round_number:
+            logging.info(f"Re-queuing {len(pending)} transient queries (round {round_number})")
+            time.sleep(requeue_delay)
+
+        for query in pending:
+            outcomes[query] = request_count_outcome(query, retmax)
+
+        pending = [query for query in pending if outcomes[query].status == TRANSIENT]
+        if not pending:
+            break
+
+    return outcomes
+
+
+def _efetch(id):
+    handle = open_eutils("efetch", db="pubmed", id=id, retmode="xml")
     try:
-        # Perform the search query on PubMed
-        handle = Entrez.esearch(db="pubmed", term=query, retmax=200)
-        record = Entrez.read(handle)
+        return handle.read()
+    finally:
         handle.close()
-        
-        # Return the total count and the list of IDs
-        return int(record["Count"]), record.get("IdList", [])
-    
-    except Exception as e:
-        # Log the error and return default values
-        logging.error(f"Error during query execution: {e}")
-        return 0, []
-    
-    
+
+
 def request_data(id):
+    """
+    Fetches the PubMed XML of a single article.
+
+    The XML store is read first, so articles already harvested are not requested again.
+
+    Args:
+        id (str): The PubMed ID (PMID) of the article.
+
+    Returns:
+        bytes: The EFetch XML response, or an empty list if the request fails.
+    """
+    if XML_STORE is not None:
+        xml_data = XML_STORE.get(id)
+        if xml_data is not None:
+            return xml_data
+
     try:
-        handle = Entrez.efetch(db="pubmed", query_key="1", id=id, retstart=0,
-                                retmax=5, rettype="xml")
-        xml_data = handle.read()
-        #print(xml_data)
-        handle.close()
-          
+        xml_data = call_with_retry(_efetch, id)
+        if XML_STORE is not None and XML_STORE_WRITE and xml_data:
+            XML_STORE.put(id, xml_data)
         return xml_data
     except Exception as e:
         logging.error(f"Error during data fetch: {e}")
         return []
 
 
+# Identifier limits for batched queries. Long terms are sent with POST, but very
+# long boolean expressions are rejected by the PubMed query translator.
+DOI_BATCH_SIZE = 100
+DOI_MAX_MATCHES = 100
+MAX_TERM_LENGTH = 4000
+SUMMARY_BATCH_SIZE = 200
+
+
+DOI_PREFIX = re.compile(r"^(?:https?://)?(?:dx\.)?doi\.org/|^doi:\s*", re.IGNORECASE)
+DOI_TRIM = " \t\r\n.,;:\"'"
+
+
+def normalize_doi(doi):
+    """
+    Normalizes a DOI so that values from the input list and from PubMed can be compared.
+
+    Resolver prefixes (`https://doi.org/`, `http://dx.doi.org/`, `doi:`) are removed, the
+    value is case-folded and surrounding whitespace, quotes and punctuation are trimmed.
+    Brackets are only trimmed when unbalanced, since they are valid inside DOIs.
+
+    Args:
+        doi (str): Raw DOI value.
+
+    Returns:
+        str: The normalized DOI, or an empty string.
+    """
+    if doi is None or (isinstance(doi, float) and doi != doi):
+        return ""
+    text = DOI_PREFIX.sub("", str(doi).strip(DOI_TRIM)).strip(DOI_TRIM)
+    for opening, closing in ("()", "[]", "<>"):
+        if text.startswith(opening) and text.endswith(closing) and text[1:].startswith("10."):
+            text = text[1:-1]
+        if text.startswith(opening) and text.count(opening) > text.count(closing):
+            text = text[1:]
+        if text.endswith(closing) and text.count(closing) > text.count(opening):
+            text = text[:-1]
+    return text.strip(DOI_TRIM).casefold()
+
+
+def build_doi_queries(dois, batch_size=DOI_BATCH_SIZE, max_term_length=MAX_TERM_LENGTH):
+    """
+    Packs DOIs into OR-joined `[DOI]` ESearch terms within the batch and length limits.
+
+    Args:
+        dois (list): DOIs to be searched. Empty values are ignored.
+        batch_size (int): Maximum number of DOIs per query.
+        max_term_length (int): Maximum length in characters of a single query term.
+
+    Returns:
+        list: A list of tuples (term, dois) with the query string and the DOIs it contains.
+    """
+    queries = []
+    current_terms = []
+    current_dois = []
+    current_length = 0
+
+    for doi in dois:
+        # Double quotes would break the phrase search, so such DOIs are searched unquoted
+        clause = f'"{doi}"[DOI]' if '"' not in doi else f"{doi}[DOI]"
+        clause_length = len(clause) + 4  # " OR "
+
+        if current_terms and (len(current_terms) >= batch_size or current_length + clause_length > max_term_length):
+            queries.append((" OR ".join(current_terms), current_dois))
+            current_terms, current_dois, current_length = [], [], 0
+
+        current_terms.append(clause)
+        current_dois.append(doi)
+        current_length += clause_length
+
+    if current_terms:
+        queries.append((" OR ".join(current_terms), current_dois))
+
+    return queries
+
+
+def _summary_dois(summary):
+    """
+    Collects every DOI listed in an ESummary document (ArticleIds and ELocationID).
+
+    Args:
+        summary (dict): A DocSum record returned by `Entrez.read`.
+
+    Returns:
+        set: Normalized DOIs found in the record.
+    """
+    dois = set()
+
+    article_ids = summary.get("ArticleIds") or {}
+    if isinstance(article_ids, dict):
+        doi = article_ids.get("doi")
+        if doi:
+            dois.add(normalize_doi(doi))
+
+    if summary.get("DOI"):
+        dois.add(normalize_doi(summary["DOI"]))
+
+    # ELocationID looks like "doi: 10.1000/xyz. pii: S0000-0000(00)00000-0"
+    elocation = summary.get("ELocationID") or ""
+    for part in str(elocation).split(" "):
+        part = part.rstrip(".")
+        if part.startswith("10."):
+            dois.add(normalize_doi(part))
+
+    dois.discard("")
+    return dois
+
+
+def request_summaries(id_list, batch_size=SUMMARY_BATCH_SIZE, failed=None):
+    """
+    Retrieves the ESummary records of a list of PMIDs through batched requests.
+
+    Args:
+        id_list (list): PubMed IDs to be summarized.
+        batch_size (int): Number of PMIDs per ESummary request.
+        failed (list, optional): Receives the PMIDs of the batches whose request failed,
+            so the caller can retry them. When omitted, a failed batch raises the error.
+
+    Returns:
+        dict: A dictionary mapping each PMID to its DocSum record.
+
+    Raises:
+        TransientError: If a batch keeps failing and `failed` is not given.
+    """
+    summaries = {}
+    id_list = [str(pmid) for pmid in id_list]
+
+    for start in range(0, len(id_list), batch_size):
+        batch = id_list[start:start + batch_size]
+        try:
+            records = call_with_retry(read_eutils, "esummary", db="pubmed", id=",".join(batch))
+        except Exception as e:
+            if failed is None:
+                raise
+            logging.error(f"Error during summary fetch of {len(batch)} PMIDs: {e}")
+            failed.extend(batch)
+            continue
+
+        for summary in records:
+            summaries[str(summary.get("Id"))] = summary
+
+    return summaries
+
+
+def request_summary_dois(id_list, batch_size=SUMMARY_BATCH_SIZE, failed=None):
+    """
+    Retrieves the DOIs of a list of PMIDs through batched ESummary requests.
+
+    Args:
+        id_list (list): PubMed IDs to be summarized.
+        batch_size (int): Number of PMIDs per ESummary request.
+        failed (list, optional): Receives the PMIDs of the batches whose request failed.
+
+    Returns:
+        dict: A dictionary mapping each PMID to the set of its normalized DOIs.
+    """
+    summaries = request_summaries(id_list, batch_size, failed)
+    return {pmid: _summary_dois(summary) for pmid, summary in summaries.items()}
+
+
+def _search_batches(queries, build, per_item, max_results):
+    """
+    Runs packed ESearch terms and splits the batches whose results were truncated.
+
+    Each term is searched with `retmax = len(items) * per_item`. When PubMed reports
+    more results than that, the batch is split in halves and searched again, so no PMID
+    is dropped. A single item with too many results is searched once more with up to
+    `max_results` PMIDs and reported as truncated if that is still not enough.
+
+    Args:
+        queries (list): (term, items) tuples from `build_doi_queries` or `build_title_queries`.
+        build (callable): Packs a list of items into (term, items) tuples again.
+        per_item (int): Number of results expected per item.
+        max_results (int): Maximum number of results read for a single item.
+
+    Returns:
+        tuple: A tuple containing:
+            - list: (items, PMIDs) of every batch that was searched.
+            - list: Items whose search failed with a transient error.
+            - list: Items whose results were truncated.
+    """
+    searched, failed, truncated = [], [], []
+    pending = list(queries)
+
+    while pending:
+        term, batch = pending.pop(0)
+        outcome = request_count_outcome(term, retmax=len(batch) * per_item)
+        if outcome.status != TRANSIENT and outcome.count > len(outcome.id_list) and len(batch) == 1:
+            outcome = request_count_outcome(term, retmax=min(outcome.count, max_results))
+        logging.info(f"Batch search: {len(batch)} items - Number of results: {outcome.count}")
+
+        if outcome.status == TRANSIENT:
+            failed.extend(batch)
+            continue
+
+        if outcome.count > len(outcome.id_list):
+            if len(batch) > 1:
+                half = len(batch) // 2
+                logging.warning(
+                    f"Batch search truncated at {len(outcome.id_list)} of {outcome.count} results: "
+                    f"splitting {len(batch)} items"
+                )
+                pending[:0] = build(batch[:half]) + build(batch[half:])
+                continue
+            logging.warning(f"Search truncated at {len(outcome.id_list)} of {outcome.count} results: {batch[0]}")
+            truncated.extend(batch)
+
+        searched.append((batch, outcome.id_list))
+
+    return searched, failed, truncated
+
+
+def resolve_dois(dois, batch_size=DOI_BATCH_SIZE, max_term_length=MAX_TERM_LENGTH):
+    """
+    Resolves a list of DOIs to PMIDs with batched ESearch and ESummary requests.
+
+    The DOIs are packed into OR-joined `[DOI]` queries, and the returned PMIDs are mapped
+    back to the input DOIs using the DOIs listed in each article summary. DOIs whose
+    search or summary request kept failing are reported as "failed", never as
+    "unmatched", so the caller can retry them.
+
+    Args:
+        dois (list): DOIs to be resolved.
+        batch_size (int): Maximum number of DOIs per ESearch query.
+        max_term_length (int): Maximum length in characters of a single query term.
+
+    Returns:
+        dict: A dictionary containing:
+            - "resolved" (dict): DOI -> PMID for DOIs matching exactly one article.
+            - "ambiguous" (dict): DOI -> list of PMIDs for DOIs matching several articles.
+            - "unmatched" (list): DOIs that were not found in PubMed.
+            - "failed" (list): DOIs whose requests failed with a transient error.
+            - "truncated" (list): DOIs with more than `DOI_MAX_MATCHES` results.
+    """
+    # Keep the first spelling of every DOI to report results with the input values
+    unique_dois = {}
+    for doi in dois:
+        key = normalize_doi(doi)
+        if key and key not in unique_dois:
+            unique_dois[key] = doi
+
+    def build(keys):
+        return build_doi_queries(keys, batch_size, max_term_length)
+
+    # A DOI may match more than one record, so leave room for the extra hits
+    searched, failed, truncated = _search_batches(build(list(unique_dois)), build, 2, DOI_MAX_MATCHES)
+
+    summary_failed = []
+    found_ids = [pmid for _, id_list in searched for pmid in id_list]
+    doi_pmids = {}
+    for pmid, pmid_dois in request_summary_dois(dict.fromkeys(found_ids), failed=summary_failed).items():
+        for doi in pmid_dois:
+            if doi in unique_dois:
+                doi_pmids.setdefault(doi, []).append(pmid)
+
+    # Without every summary of a batch, its DOIs can be neither matched nor ruled out
+    summary_failed = set(summary_failed)
+    for batch, id_list in searched:
+        if summary_failed.intersection(id_list):
+            failed.extend(batch)
+    failed = set(failed)
+
+    result = {"resolved": {}, "ambiguous": {}, "unmatched": [], "failed": [], "truncated": []}
+    for key, doi in unique_dois.items():
+        pmids = doi_pmids.get(key, [])
+        if key in failed:
+            result["failed"].append(doi)
+        elif len(pmids) == 1:
+            result["resolved"][doi] = pmids[0]
+        elif pmids:
+            result["ambiguous"][doi] = pmids
+        else:
+            result["unmatched"].append(doi)
+    result["truncated"] = [unique_dois[key] for key in truncated]
+
+    logging.info(
+        f"DOI resolution: {len(result['resolved'])} resolved - "
+        f"{len(result['ambiguous'])} ambiguous - {len(result['unmatched'])} unmatched - "
+        f"{len(result['failed'])} failed"
+    )
+    return result
+
+
+# Title fallback. Each title becomes an AND of its most distinctive words restricted to
+# [Title], and several titles are OR-joined in one ESearch. The candidates are then
+# scored locally against the input titles.
+TITLE_BATCH_SIZE = 20
+TITLE_QUERY_WORDS = 6
+TITLE_CANDIDATES_PER_TITLE = 20
+TITLE_MAX_CANDIDATES = 200
+TITLE_MATCH_THRESHOLD = 0.9
+TITLE_AMBIGUITY_MARGIN = 0.05
+TITLE_STOPWORDS = frozenset((
+    "about", "after", "among", "and", "are", "based", "between", "but", "can", "does", "for", "from",
+    "has", "have", "how", "into", "its", "not", "of", "on", "or", "over", "than", "that", "the",
+    "their", "this", "through", "using", "via", "was", "were", "what", "when", "which", "with", "within",
+))
+
+
+def normalize_title(title):
+    """
+    Normalizes a title for comparison: accents removed, case-folded, punctuation
+    replaced by spaces and whitespace collapsed.
+
+    Args:
+        title (str): Raw title.
+
+    Returns:
+        str: The normalized title, or an empty string.
+    """
+    if title is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(title))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", text.casefold()).split())
+
+
+def title_similarity(title_a, title_b):
+    """
+    Returns a similarity score between 0 and 1 of two normalized titles.
+    """
+    if not title_a or not title_b:
+        return 0.0
+    matcher = SequenceMatcher(None, title_a, title_b, autojunk=False)
+    if matcher.quick_ratio() < TITLE_MATCH_THRESHOLD - TITLE_AMBIGUITY_MARGIN:
+        return matcher.quick_ratio()
+    return matcher.ratio()
+
+
+def _title_clause(title):
+    words = [word for word in normalize_title(title).split()
+             if len(word) >= 4 and word not in TITLE_STOPWORDS and word.isalnum()]
+    if not words:
+        return None
+
+    # Longer words are the most selective ones; keep the original order for readability
+    selected = set(sorted(dict.fromkeys(words), key=len, reverse=True)[:TITLE_QUERY_WORDS])
+    return "(" + " AND ".join(f"{word}[Title]" for word in dict.fromkeys(words) if word in selected) + ")"
+
+
+def build_title_queries(titles, batch_size=TITLE_BATCH_SIZE, max_term_length=MAX_TERM_LENGTH):
+    """
+    Packs titles into OR-joined, `[Title]`-restricted ESearch terms.
+
+    Args:
+        titles (list): Titles to be searched. Titles without searchable words are ignored.
+        batch_size (int): Maximum number of titles per query.
+        max_term_length (int): Maximum length in characters of a single query term.
+
+    Returns:
+        list: A list of tuples (term, titles) with the query string and the titles it contains.
+    """
+    queries = []
+    current_terms = []
+    current_titles = []
+    current_length = 0
+
+    for title in titles:
+        clause = _title_clause(title)
+        if clause is None:
+            continue
+        clause_length = len(clause) + 4  # " OR "
+
+        if current_terms and (len(current_terms) >= batch_size or current_length + clause_length > max_term_length):
+            queries.append((" OR ".join(current_terms), current_titles))
+            current_terms, current_titles, current_length = [], [], 0
+
+        current_terms.append(clause)
+        current_titles.append(title)
+        current_length += clause_length
+
+    if current_terms:
+        queries.append((" OR ".join(current_terms), current_titles))
+
+    return queries
+
+
+def resolve_titles(titles, batch_size=TITLE_BATCH_SIZE, threshold=TITLE_MATCH_THRESHOLD):
+    """
+    Resolves titles to PMIDs with batched `[Title]` searches and local scoring.
+
+    This is the fallback for references whose DOI is not found. Instead of one free-text
+    query per title, many titles share one ESearch, the candidate titles are read with a
+    batched ESummary, and each input title is matched to the candidate with the highest
+    similarity score.
+
+    Args:
+        titles (list): Titles to be resolved.
+        batch_size (int): Maximum number of titles per ESearch query.
+        threshold (float): Minimum similarity (0 to 1) for a candidate to match.
+
+    Returns:
+        dict: A dictionary containing:
+            - "resolved" (dict): title -> PMID for titles with one clear best match.
+            - "ambiguous" (dict): title -> list of PMIDs for titles with several close matches.
+            - "unmatched" (list): titles without any candidate above the threshold, and
+              titles without a searchable word, which are not searched at all.
+            - "failed" (list): titles whose requests failed with a transient error.
+            - "truncated" (list): titles with more than `TITLE_MAX_CANDIDATES` candidates,
+              scored against the first ones only.
+            - "scores" (dict): title -> best similarity score found.
+    """
+    unique_titles = {}
+    for title in titles:
+        key = normalize_title(title)
+        if key and key not in unique_titles:
+            unique_titles[key] = title
+
+    # Titles made only of short words and stopwords get no query, so the candidates of
+    # other titles must not be scored against them
+    unsearchable = {key for key, title in unique_titles.items() if _title_clause(title) is None}
+
+    def build(batch):
+        return build_title_queries(batch, batch_size)
+
+    searched, failed, truncated = _search_batches(
+        build(list(unique_titles.values())), build, TITLE_CANDIDATES_PER_TITLE, TITLE_MAX_CANDIDATES,
+    )
+
+    summary_failed = []
+    candidates = [pmid for _, id_list in searched for pmid in id_list]
+    candidate_titles = {
+        pmid: normalize_title(summary.get("Title"))
+        for pmid, summary in request_summaries(dict.fromkeys(candidates), failed=summary_failed).items()
+    }
+
+    # A missing candidate could be the best match, so the whole batch is retried
+    summary_failed = set(summary_failed)
+    for batch, id_list in searched:
+        if summary_failed.intersection(id_list):
+            failed.extend(batch)
+    failed = set(failed)
+
+    result = {"resolved": {}, "ambiguous": {}, "unmatched": [], "failed": [], "truncated": truncated, "scores": {}}
+    for key, title in unique_titles.items():
+        if title in failed:
+            result["failed"].append(title)
+            continue
+        if key in unsearchable:
+            result["unmatched"].append(title)
+            result["scores"][title] = 0.0
+            continue
+
+        scored = sorted(
+            ((title_similarity(key, candidate), pmid) for pmid, candidate in candidate_titles.items()),
+            reverse=True,
+        )
+        matches = [(score, pmid) for score, pmid in scored if score >= threshold]
+        result["scores"][title] = scored[0][0] if scored else 0.0
+
+        if not matches:
+            result["unmatched"].append(title)
+        elif len(matches) == 1 or matches[0][0] - matches[1][0] >= TITLE_AMBIGUITY_MARGIN:
+            result["resolved"][title] = matches[0][1]
+        else:
+            close = [pmid for score, pmid in matches if matches[0][0] - score < TITLE_AMBIGUITY_MARGIN]
+            result["ambiguous"][title] = close
+
+    logging.info(
+        f"Title resolution: {len(result['resolved'])} resolved - "
+        f"{len(result['ambiguous'])} ambiguous - {len(result['unmatched'])} unmatched - "
+        f"{len(result['failed'])} failed - {len(result['truncated'])} truncated"
+    )
+    return result
+
+
+# Number of PMIDs sent in a single EFetch request. Requests with 200 or more
+# identifiers are sent as HTTP POST by `EutilsSession`.
+FETCH_BATCH_SIZE = 200
+ARTICLE_TAGS = ("PubmedArticle", "PubmedBookArticle")
+
+
+def _article_pmid(element):
+    """
+    Returns the PMID of a `<PubmedArticle>` or `<PubmedBookArticle>` element.
+    """
+    pmid = element.findtext("MedlineCitation/PMID") or element.findtext("BookDocument/PMID")
+    return pmid.strip() if pmid else None
+
+
+def iter_pubmed_articles(stream, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Splits a streamed PubmedArticleSet into single-article XML documents.
+
+    The stream is read in chunks and fed to an incremental parser, so each article is
+    yielded as soon as its closing tag arrives and is cleared from memory right after.
+
+    Args:
+        stream: A binary file-like object with the EFetch XML response.
+        chunk_size (int): Number of bytes read from the stream at a time.
+
+    Yields:
+        tuple: (pmid, xml_data), where xml_data are the bytes of a `<PubmedArticleSet>`
+        containing only that article, accepted by `parse_xml_to_*` and `save_xml_data`.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parser.feed(chunk)
+
+        for event, element in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = element
+                continue
+
+            if element.tag in ARTICLE_TAGS:
+                element.tail = None
+                article_xml = ET.tostring(element, encoding="unicode")
+                yield _article_pmid(element), (
+                    f"<?xml version=\"1.0\" encoding=\"utf-8\"?>\n"
+                    f"<PubmedArticleSet>{article_xml}</PubmedArticleSet>"
+                ).encode("utf-8")
+
+                # Release the processed article so memory does not grow with the response
+                element.clear()
+                if root is not None and len(root):
+                    root.clear()
+
+    parser.close()
+
+
+def stream_articles_with_retry(utility, policy=None, **params):
+    """
+    Streams the articles of one EFetch request, retrying transient failures.
+
+    If the response breaks after some articles were already yielded, the request is
+    repeated and those articles are skipped, so every article is yielded once.
+
+    Args:
+        utility (str): Name of the E-utility, normally "efetch".
+        policy (RetryPolicy, optional): Retry settings. Defaults to `RETRY_POLICY`.
+        **params: Parameters passed to the E-utility.
+
+    Yields:
+        tuple: (pmid, xml_data) for every article in the response.
+
+    Raises:
+        TransientError: If every attempt failed with a transient error.
+    """
+    policy = policy or RETRY_POLICY
+    seen = set()
+
+    for attempt in range(policy.max_attempts):
+        try:
+            handle = open_eutils(utility, **params)
+            try:
+                for pmid, xml_data in iter_pubmed_articles(handle):
+                    if pmid in seen:
+                        continue
+                    seen.add(pmid)
+                    yield pmid, xml_data
+            finally:
+                handle.close()
+            CIRCUIT_BREAKER.record_success()
+            return
+        except Exception as e:
+            if not is_transient(e):
+                raise
+
+            if is_throttled(e):
+                CIRCUIT_BREAKER.record_throttle(retry_after(e))
+
+            if attempt + 1 >= policy.max_attempts:
+                raise TransientError(f"{e} (after {policy.max_attempts} attempts)") from e
+
+            delay = policy.delay(attempt, e)
+            logging.warning(f"Transient error while streaming (attempt {attempt + 1}/{policy.max_attempts}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+
+def fetch_articles(id_list, batch_size=FETCH_BATCH_SIZE, failed=None):
+    """
+    Fetches PubMed XML for many PMIDs with batched EFetch requests.
+
+    Each response is split while it streams in, so callers can parse and save the
+    articles one at a time without holding the whole PubmedArticleSet in memory.
+    Articles found in the XML store are yielded first and are not requested again.
+
+    Args:
+        id_list (list): PubMed IDs to be fetched.
+        batch_size (int): Number of PMIDs per EFetch request.
+        failed (list, optional): Receives the PMIDs of the batches whose request failed,
+            so the caller can retry them. When omitted, a failed batch raises the error.
+
+    Yields:
+        tuple: (pmid, xml_data) for every article returned by PubMed.
+
+    Raises:
+        TransientError: If a batch keeps failing and `failed` is not given.
+    """
+    id_list = [str(pmid) for pmid in dict.fromkeys(id_list)]
+
+    if XML_STORE is not None:
+        missing = []
+        for pmid in id_list:
+            xml_data = XML_STORE.get(pmid)
+            if xml_data is None:
+                missing.append(pmid)
+            else:
+                yield pmid, xml_data
+        id_list = missing
+
+    for start in range(0, len(id_list), batch_size):
+        batch = id_list[start:start + batch_size]
+        fetched_ids = set()
+        try:
+            for pmid, xml_data in stream_articles_with_retry("efetch", db="pubmed", id=",".join(batch), retmode="xml"):
+                fetched_ids.add(pmid)
+                if XML_STORE is not None and XML_STORE_WRITE:
+                    XML_STORE.put(pmid, xml_data)
+                yield pmid, xml_data
+
+            logging.info(f"Batch fetch: {len(fetched_ids)} of {len(batch)} articles retrieved")
+        except Exception as e:
+            if failed is None:
+                raise
+            logging.error(f"Error during batch data fetch of {len(batch)} PMIDs: {e}")
+            # Articles already yielded before the failure are not listed again
+            failed.extend(pmid for pmid in batch if pmid not in fetched_ids)
+
+
+class HistorySession:
+    """
+    Entrez History server session for paging large PMID sets.
+
+    The PMIDs are sent once with EPost (or kept on the server by an ESearch with
+    `usehistory`), and EFetch/ESummary pages are then requested through the stored
+    `WebEnv`/`query_key` pair with `retstart`/`retmax`, so every call has a bounded payload.
+
+    Example:
+        session = HistorySession()
+        session.post(id_list)
+        for pmid, xml_data in session.iter_articles():
+            ...
+    """
+
+    def __init__(self, db="pubmed", page_size=500, policy=None):
+        self.db = db
+        self.page_size = page_size
+        self.policy = policy or RETRY_POLICY
+        self.webenv = None
+        self.query_key = None
+        self.count = 0
+        self.failed_pages = []
+
+    def post(self, id_list):
+        """
+        Uploads a PMID set to the History server with EPost.
+
+        Args:
+            id_list (list): PubMed IDs to be stored.
+
+        Returns:
+            int: The number of PMIDs stored in the session.
+        """
+        id_list = [str(pmid) for pmid in dict.fromkeys(id_list)]
+        params = {"db": self.db, "id": ",".join(id_list)}
+        if self.webenv:
+            # Reuse the existing environment so earlier query keys stay valid
+            params["WebEnv"] = self.webenv
+
+        record = call_with_retry(read_eutils, "epost", policy=self.policy, **params)
+
+        self.webenv = record["WebEnv"]
+        self.query_key = record["QueryKey"]
+        self.count = len(id_list)
+        logging.info(f"EPost: {self.count} PMIDs stored - query_key {self.query_key}")
+        return self.count
+
+    def search(self, query):
+        """
+        Runs an ESearch whose result set is kept on the History server.
+
+        Args:
+            query (str): The search term to query the database.
+
+        Returns:
+            int: The total number of results stored in the session.
+        """
+        record = call_with_retry(read_eutils, "esearch", policy=self.policy,
+                                 db=self.db, term=query, usehistory="y", retmax=0)
+
+        self.webenv = record["WebEnv"]
+        self.query_key = record["QueryKey"]
+        self.count = int(record["Count"])
+        logging.info(f"ESearch with history: {self.count} results - query_key {self.query_key}")
+        return self.count
+
+    def _history_params(self, retstart, retmax):
+        if self.webenv is None:
+            raise RuntimeError("HistorySession has no WebEnv. Call post() or search() first.")
+        return {
+            "db": self.db,
+            "WebEnv": self.webenv,
+            "query_key": self.query_key,
+            "retstart": retstart,
+            "retmax": retmax,
+        }
+
+    def _page_starts(self):
+        return range(0, self.count, self.page_size)
+
+    def iter_articles(self):
+        """
+        Pages EFetch XML through the session and splits it into single articles.
+
+        A failed page is retried on its own with the session retry policy; articles
+        already yielded from a partially read page are skipped on the retry. Pages that
+        still fail are kept in `failed_pages` as (retstart, retmax) tuples.
+
+        Yields:
+            tuple: (pmid, xml_data) for every article in the session.
+        """
+        self.failed_pages = []
+
+        for retstart in self._page_starts():
+            try:
+                yield from stream_articles_with_retry(
+                    "efetch", policy=self.policy, retmode="xml", **self._history_params(retstart, self.page_size)
+                )
+            except Exception as e:
+                logging.error(f"EFetch page {retstart} failed: {e}")
+                self.failed_pages.append((retstart, self.page_size))
+
+    def iter_summaries(self):
+        """
+        Pages ESummary records through the session.
+
+        Each page is retried on its own; pages that still fail are kept in `failed_pages`.
+
+        Yields:
+            dict: One DocSum record per article, as returned by `Entrez.read`.
+        """
+        self.failed_pages = []
+
+        for retstart in self._page_starts():
+            try:
+                records = call_with_retry(
+                    read_eutils, "esummary", policy=self.policy, **self._history_params(retstart, self.page_size)
+                )
+            except Exception as e:
+                logging.error(f"ESummary page {retstart} failed: {e}")
+                self.failed_pages.append((retstart, self.page_size))
+                continue
+
+            for record in records:
+                yield record
+
+
+def run_sync(coroutine):
+    """
+    Runs a coroutine to completion from synchronous code.
+
+    Inside Jupyter an event loop is already running, so the coroutine is executed
+    in a separate thread with its own loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+class AsyncEntrezClient:
+    """
+    asyncio client that keeps several E-utilities requests in flight.
+
+    Requests run in a thread pool bounded by `max_in_flight`, and every request still
+    goes through the shared `RATE_LIMITER`, so throughput reaches the NCBI limit for
+    the configured key without exceeding it.
+
+    Example:
+        async with AsyncEntrezClient() as client:
+            results = await client.count_many(queries)
+    """
+
+    def __init__(self, max_in_flight=None):
+        self.max_in_flight = max_in_flight or CLIENT_SETTINGS["max_in_flight"]
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args):
+        # The semaphore is created lazily so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def count(self, query, retmax=200):
+        """
+        Asynchronous version of `request_count`.
+        """
+        return await self._run(request_count, query, retmax)
+
+    async def count_outcome(self, query, retmax=200):
+        """
+        Asynchronous version of `request_count_outcome`.
+        """
+        return await self._run(request_count_outcome, query, retmax)
+
+    async def fetch(self, id):
+        """
+        Asynchronous version of `request_data`.
+        """
+        return await self._run(request_data, id)
+
+    async def count_many(self, queries, retmax=200):
+        """
+        Runs `request_count` for many queries concurrently.
+
+        Returns:
+            list: (count, id_list) tuples in the same order as `queries`.
+        """
+        return await asyncio.gather(*(self.count(query, retmax) for query in queries))
+
+    async def fetch_many(self, id_list):
+        """
+        Runs `request_data` for many PMIDs concurrently.
+
+        Returns:
+            list: XML responses in the same order as `id_list`.
+        """
+        return await asyncio.gather(*(self.fetch(id) for id in id_list))
+
+
+def request_count_many(queries, retmax=200, max_in_flight=None):
+    """
+    Synchronous wrapper around `AsyncEntrezClient.count_many` for notebooks.
+
+    Args:
+        queries (list): Search terms to query the PubMed database.
+        retmax (int): Maximum number of PMIDs to return per query.
+        max_in_flight (int, optional): Number of concurrent requests.
+
+    Returns:
+        list: (count, id_list) tuples in the same order as `queries`.
+    """
+    async def _count_many():
+        async with AsyncEntrezClient(max_in_flight) as client:
+            return await client.count_many(queries, retmax)
+
+    return run_sync(_count_many())
+
+
+def request_data_many(id_list, max_in_flight=None):
+    """
+    Synchronous wrapper around `AsyncEntrezClient.fetch_many` for notebooks.
+
+    Args:
+        id_list (list): PubMed IDs to be fetched.
+        max_in_flight (int, optional): Number of concurrent requests.
+
+    Returns:
+        list: XML responses in the same order as `id_list`.
+    """
+    async def _fetch_many():
+        async with AsyncEntrezClient(max_in_flight) as client:
+            return await client.fetch_many(id_list)
+
+    return run_sync(_fetch_many())
@@ -4,20 +4,38 @@ parsing.py
 This module contains functions to process PubMed XML data.
 """
 
+import gzip
+import hashlib
+import io
+import os
 import xml.etree.ElementTree as ET
 import pandas as pd
 import logging
 
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from scripts import xml_backend
+
 
 def extract_abstract_text(article):
     """
     Extrai e concatena textos de AbstractText, lidando com casos com ou sem o atributo 'Label'.
     """
+    return join_abstract_text(article.findall('.//Abstract/AbstractText'))
+
+
+def join_abstract_text(abstract_texts):
+    """
+    Concatena os elementos <AbstractText> já localizados (ver `extract_abstract_text`).
+    """
     # Lista para armazenar os fragmentos
     abstract_fragments = []
 
     # Itera sobre todas as tags <AbstractText>
-    for abstract in article.findall('.//Abstract/AbstractText'):
+    for abstract in abstract_texts:
         # Verifica se a tag possui o atributo Label
         label = abstract.attrib.get('Label', '').strip()  # Obtém o valor de 'Label', se existir
         text = abstract.text.strip() if abstract.text else ""  # Texto principal da tag
@@ -45,10 +63,17 @@ def process_mesh_headings(article):
     """
     Processa os MeshHeadings de um artigo XML e cria uma string formatada conforme as regras.
     """
+    return format_mesh_headings(article.findall('.//MeshHeadingList/MeshHeading'))
+
+
+def format_mesh_headings(mesh_headings):
+    """
+    Formata os elementos <MeshHeading> já localizados (ver `process_mesh_headings`).
+    """
     mesh_descriptors = []
 
     # Itera sobre todas as tags MeshHeading
-    for mesh_heading in article.findall('.//MeshHeadingList/MeshHeading'):
+    for mesh_heading in mesh_headings:
         # Localiza a tag DescriptorName e verifica o atributo MajorTopicYN
         descriptor_element = mesh_heading.find('DescriptorName')
         if descriptor_element is not None:
@@ -83,10 +108,17 @@ def process_mesh_headings_bibliometrix(article):
     """
     Processa os MeshHeadings de um artigo XML e cria uma string formatada conforme as regras.
     """
+    return format_mesh_headings_bibliometrix(article.findall('.//MeshHeadingList/MeshHeading'))
+
+
+def format_mesh_headings_bibliometrix(mesh_headings):
+    """
+    Formata os elementos <MeshHeading> já localizados (ver `process_mesh_headings_bibliometrix`).
+    """
     mesh_descriptors = []
 
     # Itera sobre todas as tags MeshHeading
-    for mesh_heading in article.findall('.//MeshHeadingList/MeshHeading'):
+    for mesh_heading in mesh_headings:
         # Localiza a tag DescriptorName e verifica o atributo MajorTopicYN
         descriptor_element = mesh_heading.find('DescriptorName')
         if descriptor_element is not None:
@@ -238,146 +270,991 @@ def parse_xml_to_df(xml_data, df=None):
         row["Citations"] = "; ".join(citations)
 
 
+# Descendant lookups of the output shapes, as `.//Tag`, `.//Parent/Tag` or
+# `.//Parent/Tag[@Attribute='value']` paths (any number of parents) relative to a
+# PubmedArticle element
+FIELD_PATHS = {
+    "pmid": ".//PMID",
+    "medline_citation": ".//MedlineCitation",
+    "data_bank_name": ".//DataBankName",
+    "publication_status": ".//PublicationStatus",
+    "date_completed_year": ".//DateCompleted/Year",
+    "date_completed_month": ".//DateCompleted/Month",
+    "date_completed_day": ".//DateCompleted/Day",
+    "date_revised_year": ".//DateRevised/Year",
+    "date_revised_month": ".//DateRevised/Month",
+    "date_revised_day": ".//DateRevised/Day",
+    "article_date_year": ".//ArticleDate/Year",
+    "article_date_month": ".//ArticleDate/Month",
+    "article_date_day": ".//ArticleDate/Day",
+    "elocation_doi": ".//ELocationID[@EIdType='doi']",
+    "elocation_pii": ".//ELocationID[@EIdType='pii']",
+    "article_id_doi": ".//PubmedData/ArticleIdList/ArticleId[@IdType='doi']",
+    "article_id_pii": ".//PubmedData/ArticleIdList/ArticleId[@IdType='pii']",
+    "article_id_pmc": ".//PubmedData/ArticleIdList/ArticleId[@IdType='pmc']",
+    "issn": ".//ISSN",
+    "issn_electronic": ".//ISSN[@IssnType='Electronic']",
+    "issn_linking": ".//ISSNLinking",
+    "journal_title": ".//Journal/Title",
+    "iso_abbreviation": ".//Journal/ISOAbbreviation",
+    "country": ".//MedlineJournalInfo/Country",
+    "medline_ta": ".//MedlineJournalInfo/MedlineTA",
+    "nlm_unique_id": ".//MedlineJournalInfo/NlmUniqueID",
+    "volume": ".//JournalIssue/Volume",
+    "issue": ".//JournalIssue/Issue",
+    "pub_date_year": ".//PubDate/Year",
+    "journal_pub_year": ".//JournalIssue/PubDate/Year",
+    "journal_pub_season": ".//JournalIssue/PubDate/Season",
+    "article_title": ".//ArticleTitle",
+    "abstract_texts": ".//Abstract/AbstractText",
+    "copyright": ".//Abstract/CopyrightInformation",
+    "start_page": ".//StartPage",
+    "medline_pgn": ".//MedlinePgn",
+    "pagination_pgn": ".//Pagination/MedlinePgn",
+    "accession_number": ".//AccessionNumberList/AccessionNumber",
+    "pubmed_pub_dates": ".//PubMedPubDate",
+    "citation_subset": ".//CitationSubset",
+    "mesh_headings": ".//MeshHeadingList/MeshHeading",
+    "keyword_list": ".//KeywordList",
+    "keywords": ".//Keyword",
+    "language": ".//Language",
+    "publication_types": ".//PublicationType",
+    "authors": ".//Author",
+    "chemicals": ".//Chemical",
+    "grants": ".//Grant",
+    "coi_statement": ".//CoiStatement",
+    "references": ".//ReferenceList/Reference",
+}
+
+XML_BACKEND = xml_backend.get_backend()
+FIELD_EXTRACTOR = XML_BACKEND.compile_extractor(FIELD_PATHS)
+
+
+def set_xml_backend(name=xml_backend.DEFAULT_BACKEND):
+    """
+    Selects the XML library used by the parsers.
 
+    Args:
+        name (str): "etree", "lxml", or "auto" for the default backend (etree).
 
-def parse_xml_to_bibliometrix_df(xml_data, df=None):
+    Returns:
+        str: The name of the backend in use.
     """
-    Parse PubMed XML data and append the extracted metadata to an existing DataFrame.
+    global XML_BACKEND, FIELD_EXTRACTOR
+    XML_BACKEND = xml_backend.get_backend(name)
+    FIELD_EXTRACTOR = XML_BACKEND.compile_extractor(FIELD_PATHS)
+    logging.info(f"XML backend: {XML_BACKEND.name}")
+    return XML_BACKEND.name
+
+
+def extract_fields(article):
+    """
+    Collects the matches of every `FIELD_PATHS` lookup from a PubmedArticle element in
+    one pass, with the current XML backend.
+
+    Returns:
+        dict: {name: list of matching elements in document order}; names without
+        matches are absent.
+    """
+    return FIELD_EXTRACTOR(article)
+
+
+class Fields:
+    """
+    Read access to the matches of `extract_fields`, with `findtext`-like semantics.
+    """
+
+    __slots__ = ("found",)
+
+    def __init__(self, found):
+        self.found = found
+
+    def first(self, name):
+        matches = self.found.get(name)
+        return matches[0] if matches else None
+
+    def all(self, name):
+        return self.found.get(name, ())
+
+    def text(self, name, default=None):
+        matches = self.found.get(name)
+        if not matches:
+            return default
+        return matches[0].text or ""
+
+
+def _joined_date(fields, prefix):
+    return "".join(filter(None, [fields.text(f"{prefix}_year"), fields.text(f"{prefix}_month"), fields.text(f"{prefix}_day")]))
+
+
+def _padded_date(fields, prefix):
+    year, month, day = fields.text(f"{prefix}_year"), fields.text(f"{prefix}_month"), fields.text(f"{prefix}_day")
+    return f"{year or '0000'}-{month or '00'}-{day or '00'}"
+
+
+def _bibliometrix_authors(fields):
+    authors = []
+    affiliations = []
+    for author in fields.all("authors"):
+        last_name = author.findtext('LastName', default="")
+        fore_name = author.findtext('ForeName', default="")
+        initials = author.findtext('Initials', default="")
+        authors.append(f"{last_name}, {fore_name} {initials}".strip(", "))
+
+        affiliation = author.findtext('.//AffiliationInfo/Affiliation', default="")
+        if affiliation:
+            affiliations.append(affiliation)
+
+    return {"Authors": "; ".join(authors), "Affiliations": "; ".join(affiliations)}
+
+
+def _publication_history(fields):
+    history = []
+    for pub_date in fields.all("pubmed_pub_dates"):
+        status = pub_date.get("PubStatus", "unknown")
+        history.append(f"{status}: {pub_date.findtext('Year')}-{pub_date.findtext('Month')}-{pub_date.findtext('Day')}")
+    return "; ".join(history)
+
+
+def _pubmed_pub_dates(fields):
+    dates = {}
+    for pub_date in fields.all("pubmed_pub_dates"):
+        status = pub_date.get('PubStatus', "unknown")
+        year = pub_date.findtext('Year', "")
+        month = pub_date.findtext('Month', "").zfill(2)
+        day = pub_date.findtext('Day', "").zfill(2)
+        hour = pub_date.findtext('Hour', "00").zfill(2)
+        minute = pub_date.findtext('Minute', "00").zfill(2)
+        column = PUBMED_PUB_DATE_COLUMNS.get(status)
+        if column:
+            dates[column] = f"{year}/{month}/{day} {hour}:{minute}"
+    return dates
+
+
+PUBMED_PUB_DATE_COLUMNS = {
+    "received": "PubMedPubDateReceived",
+    "accepted": "PubMedPubDateAccepted",
+    "entrez": "PubMedPubDateEntrez",
+    "pubmed": "PubMedPubDatePubmed",
+    "medline": "PubMedPubDateMedline",
+}
+
+
+def _pubmed_authors(fields):
+    authors = []
+    authors_dtl = []
+    for author in fields.all("authors"):
+        fore_name = author.findtext('ForeName', "").strip()
+        last_name = author.findtext('LastName', "").strip()
+        initials = author.findtext('Initials', "").strip()
+        full_name = f"{last_name}, {fore_name}".strip(", ")
+        authors.append(full_name)
+
+        orcid = author.findtext(".//Identifier[@Source='ORCID']", "").strip()
+        affiliations = [aff.text.strip() for aff in author.findall(".//AffiliationInfo/Affiliation") if aff.text]
+
+        author_detail = f"FAU:{full_name}|AU:{last_name} {initials}"
+        if orcid:
+            author_detail += f"|AUID:{orcid}"
+        if affiliations:
+            author_detail += f"|AD:{' |AD: '.join(affiliations)}"
+        authors_dtl.append(author_detail)
+
+    # Both columns only exist for articles with authors
+    if not authors:
+        return {}
+    return {"AuthorListAuthor": "| ".join(authors), "AuthorListDTL": "| ".join(authors_dtl)}
+
+
+def _keyword_owner(fields):
+    keyword_list = fields.first("keyword_list")
+    return keyword_list.get("Owner", "Unknown") if keyword_list is not None else "Unknown"
+
+
+# Output columns of each shape: (column, value function) pairs in column order. A column
+# of None marks a function that returns several columns as a dict.
+BIBLIOMETRIX_FIELDS = [
+    ("PMID", lambda f: f.text("pmid")),
+    ("ArticleTitle", lambda f: f.text("article_title")),
+    ("JournalTitle", lambda f: f.text("journal_title")),
+    ("ISOAbbreviation", lambda f: f.text("iso_abbreviation")),
+    ("Country", lambda f: f.text("country")),
+    ("Volume", lambda f: f.text("volume")),
+    ("Pages", lambda f: f.text("pagination_pgn")),
+    ("ISSN", lambda f: f.text("issn")),
+    ("Language", lambda f: f.text("language")),
+    ("AbstractText", lambda f: join_abstract_text(f.all("abstract_texts"))),
+    ("CopyrightInformation", lambda f: f.text("copyright", "")),
+    ("DOI", lambda f: f.text("elocation_doi")),
+    ("PII", lambda f: f.text("elocation_pii")),
+    ("PublicationYear", lambda f: f.text("journal_pub_year")),
+    ("PublicationSeason", lambda f: f.text("journal_pub_season")),
+    (None, _bibliometrix_authors),
+    ("Keywords", lambda f: "; ".join(kw.text for kw in f.all("keywords") if kw.text)),
+    ("MeshTerms", lambda f: format_mesh_headings_bibliometrix(f.all("mesh_headings"))),
+    ("ChemicalSubstances", lambda f: "; ".join(c.findtext('NameOfSubstance', default="") for c in f.all("chemicals"))),
+    ("GrantIDs", lambda f: "; ".join(g.findtext('GrantID', default="") for g in f.all("grants"))),
+    ("GrantOrganizations", lambda f: "; ".join(g.findtext('Agency', default="") for g in f.all("grants"))),
+    ("DocumentTypes", lambda f: "; ".join(dt.text for dt in f.all("publication_types") if dt.text)),
+    ("Status", lambda f: f.first("medline_citation").get('Status', 'Unknown')),
+    ("LastRevisionDate", lambda f: _padded_date(f, "date_revised")),
+    ("CompletionDate", lambda f: _padded_date(f, "date_completed")),
+    ("PublicationHistory", _publication_history),
+    ("ConflictOfInterest", lambda f: f.text("coi_statement")),
+    ("PMCID", lambda f: f.text("article_id_pmc")),
+    ("Citations", lambda f: "; ".join(
+        citation for citation in (r.findtext('Citation', default="") for r in f.all("references")) if citation
+    )),
+]
+
+PUBMED_FIELDS = [
+    ("PMID", lambda f: f.text("pmid", "Unknown")),
+    ("Owner", lambda f: f.first("medline_citation").get('Owner', 'Unknown')),
+    ("MedlineCitation.Status", lambda f: f.first("medline_citation").get('Status', "Unknown")),
+    ("DataBankName", lambda f: f.text("data_bank_name", "Unknown")),
+    ("PublicationStatus", lambda f: f.text("publication_status", "Unknown")),
+    ("DateCompleted", lambda f: _joined_date(f, "date_completed")),
+    ("DateRevised", lambda f: _joined_date(f, "date_revised")),
+    ("ArticleDate", lambda f: _joined_date(f, "article_date")),
+    ("ELocationDOI", lambda f: f.text("elocation_doi", "Unknown")),
+    ("LocationPII", lambda f: f.text("elocation_pii", "Unknown")),
+    ("ArticleIdListPII", lambda f: f.text("article_id_pii", "Unknown")),
+    ("ArticleIdListDOI", lambda f: f.text("article_id_doi", "Unknown")),
+    ("ISSN", lambda f: f.text("issn_electronic", "Unknown")),
+    ("ISSNLinking", lambda f: f.text("issn_linking", "Unknown")),
+    ("JournalIssue.Volume", lambda f: f.text("volume", "Unknown")),
+    ("JournalIssue.Issue", lambda f: f.text("issue", "Unknown")),
+    ("PubDate.Year", lambda f: f.text("pub_date_year", "Unknown")),
+    ("PublicationSeason", lambda f: f.text("journal_pub_season", "Unknown")),
+    ("ArticleTitle", lambda f: f.text("article_title", "Unknown")),
+    ("Abstract.AbstractText", lambda f: join_abstract_text(f.all("abstract_texts"))),
+    ("CopyrightInformation", lambda f: f.text("copyright", "Unknown")),
+    ("StartPage", lambda f: f.text("start_page", "Unknown")),
+    ("MedlinePgn", lambda f: f.text("medline_pgn", "Unknown")),
+    ("AccessionNumber", lambda f: f.text("accession_number") or "Unknown"),
+    (None, _pubmed_pub_dates),
+    ("Country", lambda f: f.text("country", "Unknown")),
+    ("MedlineTA", lambda f: f.text("medline_ta", "Unknown")),
+    ("Title", lambda f: f.text("journal_title", "Unknown")),
+    ("NlmUniqueID", lambda f: f.text("nlm_unique_id", "Unknown")),
+    ("CitationSubset", lambda f: f.text("citation_subset", "Unknown")),
+    ("MeshHeadingList", lambda f: format_mesh_headings(f.all("mesh_headings"))),
+    ("Keyword", _keyword_owner),
+    ("KeywordList", lambda f: "; ".join(kw.text.strip() if kw.text else "Unknown" for kw in f.all("keywords"))),
+    ("ArticleIdListPMC", lambda f: f.text("article_id_pmc", "Unknown")),
+    ("Language", lambda f: f.text("language", "Unknown")),
+    ("PublicationType", lambda f: "; ".join(pt.text for pt in f.all("publication_types") if pt.text)),
+    (None, _pubmed_authors),
+    ("CoiStatement", lambda f: f.text("coi_statement", "Unknown")),
+]
+
+
+# Columns of parse_xml_to_bibliometrix_df, in output order
+BIBLIOMETRIX_COLUMNS = [
+    "PMID", "ArticleTitle", "JournalTitle", "ISOAbbreviation", "Country", "Volume", "Pages", "ISSN",
+    "Language", "AbstractText", "CopyrightInformation", "DOI", "PII", "PublicationYear",
+    "PublicationSeason", "Authors", "Affiliations", "Keywords", "MeshTerms", "ChemicalSubstances",
+    "GrantIDs", "GrantOrganizations", "DocumentTypes", "Status", "LastRevisionDate", "CompletionDate",
+    "PublicationHistory", "ConflictOfInterest", "PMCID", "Citations",
+]
+
+# Columns of parse_xml_to_pubmed_df. Authors and PubMed history dates are only present
+# in the rows of articles that have them.
+PUBMED_COLUMNS = [
+    "PMID", "Owner", "MedlineCitation.Status", "DataBankName", "PublicationStatus", "DateCompleted",
+    "DateRevised", "ArticleDate", "ELocationDOI", "LocationPII", "ArticleIdListPII", "ArticleIdListDOI",
+    "ISSN", "ISSNLinking", "JournalIssue.Volume", "JournalIssue.Issue", "PubDate.Year", "PublicationSeason",
+    "ArticleTitle", "Abstract.AbstractText", "CopyrightInformation", "StartPage", "MedlinePgn",
+    "AccessionNumber", *PUBMED_PUB_DATE_COLUMNS.values(), "Country", "MedlineTA", "Title", "NlmUniqueID",
+    "CitationSubset", "MeshHeadingList", "Keyword", "KeywordList", "ArticleIdListPMC", "Language",
+    "PublicationType", "AuthorListAuthor", "AuthorListDTL", "CoiStatement",
+]
+
+# Columns whose values repeat across articles (journals, countries, languages, publication
+# types, statuses): interned while parsing and exported as pandas categoricals
+CATEGORICAL_COLUMNS = {
+    "bibliometrix": (
+        "JournalTitle", "ISOAbbreviation", "Country", "Language", "PublicationYear", "PublicationSeason",
+        "GrantOrganizations", "DocumentTypes", "Status",
+    ),
+    "pubmed": (
+        "Owner", "MedlineCitation.Status", "DataBankName", "PublicationStatus", "ISSN", "ISSNLinking",
+        "PubDate.Year", "PublicationSeason", "Country", "MedlineTA", "Title", "NlmUniqueID",
+        "CitationSubset", "Keyword", "Language", "PublicationType",
+    ),
+}
+
+
+class Vocabulary:
+    """
+    Shared pool of repeated values: equal strings parsed from different articles are
+    replaced by one object, so a journal title or country is stored once per corpus.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value):
+        if value is None:
+            return None
+        return self.values.setdefault(value, value)
+
+
+VOCABULARY = Vocabulary()
+
+
+class Record:
+    """
+    Compact row of an output shape: one slot per column instead of a dict per row.
+
+    Columns missing from a row (e.g. the authors of an article without authors) are left
+    unset and are skipped by `items`, so a record converts back to the exact row it was
+    built from.
+    """
+
+    __slots__ = ()
+    COLUMNS = ()
+    CATEGORICAL = frozenset()
+    _ATTRIBUTES = {}
+
+    @classmethod
+    def from_row(cls, row, vocabulary=VOCABULARY):
+        """
+        Builds a record from a row (dict), interning the values of its categorical columns.
+        """
+        record = cls()
+        for column, value in row.items():
+            attribute = cls._ATTRIBUTES.get(column)
+            if attribute is None:
+                raise ValueError(f"{cls.__name__} has no column '{column}'")
+            if vocabulary is not None and column in cls.CATEGORICAL:
+                value = vocabulary.intern(value)
+            setattr(record, attribute, value)
+        return record
+
+    def items(self):
+        for column, attribute in self._ATTRIBUTES.items():
+            try:
+                yield column, getattr(self, attribute)
+            except AttributeError:
+                continue
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def record_type(name, columns, categorical=()):
+    """
+    Creates a `Record` subclass with one slot per column. Column names that are not
+    identifiers (e.g. "MedlineCitation.Status") are stored in slots with "_" for ".".
+    """
+    attributes = {column: column.replace(".", "_") for column in columns}
+    return type(name, (Record,), {
+        "__slots__": tuple(attributes.values()),
+        "COLUMNS": tuple(columns),
+        "CATEGORICAL": frozenset(categorical),
+        "_ATTRIBUTES": attributes,
+    })
+
+
+BibliometrixRecord = record_type("BibliometrixRecord", BIBLIOMETRIX_COLUMNS, CATEGORICAL_COLUMNS["bibliometrix"])
+PubmedRecord = record_type("PubmedRecord", PUBMED_COLUMNS, CATEGORICAL_COLUMNS["pubmed"])
+
+RECORD_TYPES = {"bibliometrix": BibliometrixRecord, "pubmed": PubmedRecord}
+
+
+def categorize(df, columns):
+    """
+    Converts the given columns of a DataFrame, when present, to pandas categoricals.
+    """
+    for column in columns:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def build_row(fields, field_specs):
+    """
+    Builds one output row from the collected fields of an article.
+    """
+    row = {}
+    for column, value in field_specs:
+        if column is None:
+            row.update(value(fields))
+        else:
+            row[column] = value(fields)
+    return row
+
+
+def _yes(element):
+    return element is not None and element.get("MajorTopicYN") == "Y"
+
+
+def _stripped(element, path):
+    text = element.findtext(path)
+    return text.strip() if text and text.strip() else None
+
+
+def _author_rows(fields, pmid):
+    rows = []
+    for position, author in enumerate(fields.all("authors"), start=1):
+        rows.append({
+            "PMID": pmid,
+            "Position": position,
+            "LastName": _stripped(author, "LastName"),
+            "ForeName": _stripped(author, "ForeName"),
+            "Initials": _stripped(author, "Initials"),
+            "CollectiveName": _stripped(author, "CollectiveName"),
+            "ORCID": _stripped(author, ".//Identifier[@Source='ORCID']"),
+        })
+    return rows
+
+
+def _affiliation_rows(fields, pmid):
+    rows = []
+    for author_position, author in enumerate(fields.all("authors"), start=1):
+        affiliations = (aff.text.strip() for aff in author.findall(".//AffiliationInfo/Affiliation") if aff.text)
+        for position, affiliation in enumerate(affiliations, start=1):
+            rows.append({"PMID": pmid, "AuthorPosition": author_position, "Position": position, "Affiliation": affiliation})
+    return rows
+
+
+def _mesh_rows(fields, pmid):
+    rows = []
+    for position, heading in enumerate(fields.all("mesh_headings"), start=1):
+        descriptor = heading.find("DescriptorName")
+        if descriptor is None or not descriptor.text:
+            continue
+        row = {
+            "PMID": pmid,
+            "Position": position,
+            "DescriptorUI": descriptor.get("UI"),
+            "Descriptor": descriptor.text.strip(),
+            "DescriptorMajor": _yes(descriptor),
+        }
+        # One row per qualifier, or a single row without qualifier
+        qualifiers = [qualifier for qualifier in heading.findall("QualifierName") if qualifier.text]
+        for qualifier in qualifiers or [None]:
+            rows.append({
+                **row,
+                "QualifierUI": qualifier.get("UI") if qualifier is not None else None,
+                "Qualifier": qualifier.text.strip() if qualifier is not None else None,
+                "QualifierMajor": _yes(qualifier) if qualifier is not None else None,
+            })
+    return rows
+
+
+def _keyword_rows(fields, pmid):
+    rows = []
+    position = 0
+    for keyword_list in fields.all("keyword_list"):
+        owner = keyword_list.get("Owner", "Unknown")
+        for keyword in keyword_list.findall("Keyword"):
+            if not keyword.text or not keyword.text.strip():
+                continue
+            position += 1
+            rows.append({
+                "PMID": pmid, "Position": position, "Keyword": keyword.text.strip(),
+                "Owner": owner, "Major": _yes(keyword),
+            })
+    return rows
+
+
+def _grant_rows(fields, pmid):
+    return [
+        {
+            "PMID": pmid,
+            "Position": position,
+            "GrantID": _stripped(grant, "GrantID"),
+            "Acronym": _stripped(grant, "Acronym"),
+            "Agency": _stripped(grant, "Agency"),
+            "Country": _stripped(grant, "Country"),
+        }
+        for position, grant in enumerate(fields.all("grants"), start=1)
+    ]
+
+
+def _reference_rows(fields, pmid):
+    return [
+        {
+            "PMID": pmid,
+            "Position": position,
+            "Citation": _stripped(reference, "Citation"),
+            "ReferencePMID": _stripped(reference, ".//ArticleId[@IdType='pubmed']"),
+            "ReferenceDOI": _stripped(reference, ".//ArticleId[@IdType='doi']"),
+        }
+        for position, reference in enumerate(fields.all("references"), start=1)
+    ]
+
+
+# Normalized long tables keyed by PMID, built from the same walk as the output shapes:
+# name -> (row builder, columns). They hold the many-valued fields that the shapes join
+# into "; " or "| " separated strings.
+SIDE_TABLES = {
+    "article_author": (
+        _author_rows, ["PMID", "Position", "LastName", "ForeName", "Initials", "CollectiveName", "ORCID"],
+    ),
+    "author_affiliation": (_affiliation_rows, ["PMID", "AuthorPosition", "Position", "Affiliation"]),
+    "article_mesh": (
+        _mesh_rows,
+        ["PMID", "Position", "DescriptorUI", "Descriptor", "DescriptorMajor", "QualifierUI", "Qualifier", "QualifierMajor"],
+    ),
+    "keyword": (_keyword_rows, ["PMID", "Position", "Keyword", "Owner", "Major"]),
+    "grant": (_grant_rows, ["PMID", "Position", "GrantID", "Acronym", "Agency", "Country"]),
+    "reference": (_reference_rows, ["PMID", "Position", "Citation", "ReferencePMID", "ReferenceDOI"]),
+}
+
+# Side table columns whose values repeat across articles
+CATEGORICAL_COLUMNS.update({
+    "article_mesh": ("DescriptorUI", "Descriptor", "QualifierUI", "Qualifier"),
+    "keyword": ("Owner",),
+    "grant": ("Agency", "Country", "Acronym"),
+})
+
+
+def build_side_tables(fields, tables=None):
+    """
+    Builds the rows of the side tables of one article.
+
+    Args:
+        fields (Fields): The collected fields of the article.
+        tables (list, optional): Names of the `SIDE_TABLES`. Defaults to all of them.
+
+    Returns:
+        dict: {table name: list of rows}.
+    """
+    pmid = fields.text("pmid")
+    return {name: SIDE_TABLES[name][0](fields, pmid) for name in (tables or SIDE_TABLES)}
+
+
+# Output shapes produced from each PubmedArticle: name -> (builder, skip_errors, fields)
+OUTPUT_SHAPES = {}
+
+
+def register_shape(name, builder=None, skip_errors=False, fields=None, field_paths=None):
+    """
+    Registers an output shape of the single-pass parser.
+
+    A shape is either declarative (`fields`), filled from the single walk of
+    `extract_fields`, or a `builder` called as `builder(article, root)` for every
+    PubmedArticle element that returns the row (dict) of the article.
+
+    Args:
+        name (str): Name of the shape, used as key of the parser results.
+        builder (callable, optional): Row builder of the shape.
+        skip_errors (bool): Log and skip articles whose row cannot be built, instead of
+            failing the whole payload.
+        fields (list, optional): (column, value function) pairs, as in `BIBLIOMETRIX_FIELDS`.
+        field_paths (dict, optional): Additional `FIELD_PATHS` entries used by `fields`.
+    """
+    global FIELD_EXTRACTOR
+    if (builder is None) == (fields is None):
+        raise ValueError("A shape needs either a builder or fields")
+    if field_paths:
+        FIELD_PATHS.update(field_paths)
+        FIELD_EXTRACTOR = XML_BACKEND.compile_extractor(FIELD_PATHS)
+    OUTPUT_SHAPES[name] = (builder, skip_errors, fields)
+
+
+register_shape("bibliometrix", fields=BIBLIOMETRIX_FIELDS)
+register_shape("pubmed", fields=PUBMED_FIELDS, skip_errors=True)
+
+
+# Bump when the rows change for a reason the source fingerprint of `parser_version` does
+# not see (e.g. a dependency that changes the parsed values)
+PARSER_VERSION = 1
+
+
+def parser_version(names=()):
+    """
+    Returns an identifier of the parser code and of the requested shapes and tables.
+
+    It changes whenever this module or the XML backends are edited, so records cached
+    by an older parser (see scripts.manifest) are parsed again.
+    """
+    digest = hashlib.sha256()
+    for path in (__file__, xml_backend.__file__):
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    digest.update(",".join(names).encode("utf-8"))
+    return f"{PARSER_VERSION}-{digest.hexdigest()[:16]}"
+
+
+def _shape_builders(shapes):
+    return [(name, *OUTPUT_SHAPES[name]) for name in shapes]
+
+
+def _build_rows(article, root, builders, fields=None):
+    rows = {}
+    for name, builder, skip_errors, field_specs in builders:
+        try:
+            if field_specs is None:
+                rows[name] = builder(article, root)
+                continue
+            if fields is None:
+                fields = Fields(extract_fields(article))
+            rows[name] = build_row(fields, field_specs)
+        except Exception as e:
+            if not skip_errors:
+                raise
+            logging.error(f"Error parsing article: {e}")
+    return rows
+
+
+def parse_xml_records(xml_data, shapes=None):
+    """
+    Parses PubMed XML once and builds the rows of every requested shape per article.
 
     Args:
         xml_data (str): String containing the PubMed XML data.
-        df (pd.DataFrame, optional): Existing DataFrame to append new rows to. Defaults to None.
+        shapes (list, optional): Names of the registered shapes. Defaults to all of them.
 
     Returns:
-        pd.DataFrame: Updated DataFrame containing parsed PubMed article metadata.
+        dict: {shape name: list of rows}.
     """
-    if df is None:
-        df = pd.DataFrame()
+    shapes = list(shapes or OUTPUT_SHAPES)
+    builders = _shape_builders(shapes)
+    records = {name: [] for name in shapes}
+
+    root = XML_BACKEND.fromstring(xml_data)
+    for article in root.findall('.//PubmedArticle'):
+        for name, row in _build_rows(article, root, builders).items():
+            records[name].append(row)
+
+    return records
+
+
+class RecordAccumulator:
+    """
+    Collects the rows of the registered shapes in per-column lists and builds the
+    DataFrames only on `flush`.
+
+    Appending a row extends one list per column, so the cost of each article does not
+    depend on how many rows were collected before it, unlike concatenating a DataFrame
+    per payload. Columns seen for the first time are backfilled with None, and columns
+    missing from a row get None, like `pd.DataFrame(list of rows)`. Values of the
+    `CATEGORICAL_COLUMNS` are interned in the shared `VOCABULARY`.
+
+    Side tables (`SIDE_TABLES`) requested with `tables` are collected the same way, with
+    several rows per article, and are flushed with the shapes.
+
+    Example:
+        accumulator = RecordAccumulator(["bibliometrix", "pubmed"], tables=["article_author"])
+        for xml_data in payloads:
+            accumulator.add_xml(xml_data)
+        dfs = accumulator.flush()
+    """
+
+    def __init__(self, shapes=None, tables=()):
+        self.shapes = list(shapes or OUTPUT_SHAPES)
+        self.tables = list(SIDE_TABLES if tables is True else tables or ())
+        self._builders = _shape_builders(self.shapes)
+        self._categorical = {
+            name: frozenset(CATEGORICAL_COLUMNS.get(name, ())) for name in self.shapes + self.tables
+        }
+        self._reset()
+
+    def _reset(self):
+        self._columns = {name: {} for name in self.shapes}
+        self._columns.update({name: {column: [] for column in SIDE_TABLES[name][1]} for name in self.tables})
+        self._rows = {name: 0 for name in self._columns}
+
+    def __len__(self):
+        return max(self._rows.values(), default=0)
+
+    def rows(self, name):
+        """
+        Returns the number of rows of a shape or table collected since the last flush.
+        """
+        return self._rows[name]
+
+    def append(self, name, row):
+        """
+        Appends the row (dict or `Record`) of one article to a shape.
+        """
+        columns = self._columns[name]
+        categorical = self._categorical[name]
+        count = self._rows[name]
+        for column, value in row.items():
+            values = columns.get(column)
+            if values is None:
+                values = columns[column] = [None] * count
+            values.append(VOCABULARY.intern(value) if column in categorical else value)
+        if len(columns) > len(row):
+            for values in columns.values():
+                if len(values) == count:
+                    values.append(None)
+        self._rows[name] = count + 1
+
+    def add_rows(self, rows):
+        """
+        Appends {shape name: row} of one article, as yielded by `iter_xml_records`.
+        """
+        for name, row in rows.items():
+            if name in self._columns:
+                self.append(name, row)
+
+    def add_article(self, article, root=None):
+        """
+        Appends the rows of every shape and side table of one PubmedArticle element.
+        """
+        fields = Fields(extract_fields(article)) if self.tables else None
+        self.add_rows(_build_rows(article, article if root is None else root, self._builders, fields))
+        if fields is not None:
+            for name, rows in build_side_tables(fields, self.tables).items():
+                for row in rows:
+                    self.append(name, row)
+
+    def add_xml(self, xml_data):
+        """
+        Parses PubMed XML once and appends the rows of every shape.
+
+        The payload is added entirely or not at all: if it cannot be parsed, the rows
+        already appended from it are removed before the error is raised.
+
+        Returns:
+            int: Number of PubmedArticle elements in the payload.
+        """
+        checkpoint = {name: (self._rows[name], len(columns)) for name, columns in self._columns.items()}
+        try:
+            root = XML_BACKEND.fromstring(xml_data)
+            articles = root.findall('.//PubmedArticle')
+            for article in articles:
+                self.add_article(article, root)
+        except Exception:
+            self._rollback(checkpoint)
+            raise
+        return len(articles)
+
+    def _rollback(self, checkpoint):
+        for name, (count, known) in checkpoint.items():
+            columns = self._columns[name]
+            # Columns are kept in insertion order, so the ones added since the
+            # checkpoint are the last ones
+            for position, column in enumerate(list(columns)):
+                if position >= known:
+                    del columns[column]
+                else:
+                    del columns[column][count:]
+            self._rows[name] = count
+
+    def columns(self, name):
+        """
+        Returns {column: list of values} of a shape, without copying.
+        """
+        return self._columns[name]
+
+    def take_rows(self):
+        """
+        Returns the collected rows as dicts and starts over, for callers that keep the
+        rows of each article apart (e.g. a per-article cache).
+
+        Returns:
+            dict: {shape or table name: list of rows}; every row has all the columns
+            collected since the last flush.
+        """
+        rows = {
+            name: [dict(zip(columns, values)) for values in zip(*columns.values())] if columns else []
+            for name, columns in self._columns.items()
+        }
+        self._reset()
+        return rows
+
+    def flush(self, categorical=False):
+        """
+        Builds one DataFrame per shape from the collected columns and starts over.
+
+        Args:
+            categorical (bool): Export the `CATEGORICAL_COLUMNS` as pandas categoricals.
+
+        Returns:
+            dict: {shape or table name: DataFrame}; shapes without rows give an empty
+            DataFrame, side tables keep their columns.
+        """
+        dfs = {name: pd.DataFrame(columns) for name, columns in self._columns.items()}
+        if categorical:
+            for name, df in dfs.items():
+                categorize(df, CATEGORICAL_COLUMNS.get(name, ()))
+        self._reset()
+        return dfs
+
+    def to_arrow(self):
+        """
+        Builds one pyarrow Table per shape from the collected columns and starts over.
+
+        Requires the optional pyarrow package.
+
+        Returns:
+            dict: {shape or table name: pyarrow.Table}.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is not installed; use flush() for DataFrames")
+        tables = {name: pa.table(columns) for name, columns in self._columns.items()}
+        self._reset()
+        return tables
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def open_xml_source(source):
+    """
+    Opens a PubMed XML source as a binary stream, decompressing gzip transparently.
+
+    Args:
+        source: A file path, XML text (str or bytes) or a binary file object. Gzip
+            content is recognized by its magic number, not by the file name.
+
+    Returns:
+        tuple: (binary stream, whether the caller must close it).
+    """
+    close = False
+    if isinstance(source, (bytes, bytearray)):
+        stream = io.BytesIO(source)
+    elif isinstance(source, str) and source.lstrip().startswith("<"):
+        stream = io.BytesIO(source.encode("utf-8"))
+    elif isinstance(source, (str, os.PathLike)):
+        stream = open(source, "rb")
+        close = True
+    else:
+        stream = source
+
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream) if isinstance(stream, io.RawIOBase) else _PeekableStream(stream)
+
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream), True
+    return stream, close
+
+
+class _PeekableStream(io.RawIOBase):
+    """
+    Adds `peek` to a binary file object that only supports `read`.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def peek(self, size=1):
+        if len(self._buffer) < size:
+            self._buffer += self._stream.read(size - len(self._buffer)) or b""
+        return self._buffer
+
+    def readinto(self, buffer):
+        data = self._buffer[:len(buffer)] if self._buffer else self._stream.read(len(buffer))
+        self._buffer = self._buffer[len(data):] if self._buffer else b""
+        buffer[:len(data)] = data
+        return len(data)
+
 
+def iter_article_elements(source, tags=("PubmedArticle",)):
+    """
+    Streams the PubmedArticle elements of a PubmedArticleSet with `iterparse`.
+
+    Each article is removed from the tree once the caller moves on, so memory stays
+    flat regardless of the size of the input.
+
+    Args:
+        source: A file path, XML text, binary file object or gzip stream.
+        tags (tuple): Tags of the elements to yield, e.g. ("PubmedArticle", "DeleteCitation")
+            for the update files of the annual baseline.
+
+    Yields:
+        Element: One element at a time, valid until the next one is requested.
+    """
+    stream, close = open_xml_source(source)
     try:
-        # Parse the XML
-        root = ET.fromstring(xml_data)
-
-        # Create an empty DataFrame if none is provided
-        if df is None:
-            df = pd.DataFrame()
-
-        # List to temporarily store rows
-        rows = []
-
-        # Iterate through articles in the XML
-        for article in root.findall('.//PubmedArticle'):
-            row = {}
-
-            # Direct mapping with XML tag names
-            row["PMID"] = article.findtext('.//PMID')
-            row["ArticleTitle"] = article.findtext('.//ArticleTitle')
-            row["JournalTitle"] = article.findtext('.//Journal/Title')
-            row["ISOAbbreviation"] = article.findtext('.//Journal/ISOAbbreviation')
-            row["Country"] = article.findtext('.//MedlineJournalInfo/Country')
-            row["Volume"] = article.findtext('.//JournalIssue/Volume')
-            row["Pages"] = article.findtext('.//Pagination/MedlinePgn')
-            row["ISSN"] = article.findtext('.//ISSN')
-            row["Language"] = article.findtext('.//Language')
-            row["AbstractText"] = extract_abstract_text(article) 
-            row["CopyrightInformation"] = article.findtext('.//Abstract/CopyrightInformation', "")
-            row["DOI"] = article.findtext(".//ELocationID[@EIdType='doi']")
-            row["PII"] = article.findtext(".//ELocationID[@EIdType='pii']")
-
-            row["PublicationYear"] = article.findtext('.//JournalIssue/PubDate/Year')
-            row["PublicationSeason"] = article.findtext('.//JournalIssue/PubDate/Season')
-
-
-            # Authors and affiliations
-            authors = []
-            affiliations = []
-            for author in article.findall('.//Author'):
-                last_name = author.findtext('LastName', default="")
-                fore_name = author.findtext('ForeName', default="")
-                initials = author.findtext('Initials', default="")
-                full_name = f"{last_name}, {fore_name} {initials}".strip(", ")
-                authors.append(full_name)
-                
-                affiliation = author.findtext('.//AffiliationInfo/Affiliation', default="")
-                if affiliation:
-                    affiliations.append(affiliation)
-
-            row["Authors"] = "; ".join(authors)
-            row["Affiliations"] = "; ".join(affiliations)
-
-            # Keywords and MeSH terms
-            keywords = [kw.text for kw in article.findall('.//Keyword') if kw.text]
-            #mesh_terms = [
-            #    f"{mesh.findtext('DescriptorName')} (MajorTopic: {mesh.find('DescriptorName').get('MajorTopicYN', 'N')})"
-            #    for mesh in article.findall('.//MeshHeading')
-            #]
-
-            row["Keywords"] = "; ".join(keywords)
-            #row["MeshTerms"] = "; ".join(mesh_terms)
-            row["MeshTerms"] = process_mesh_headings_bibliometrix(article)
-            
-            # Chemical substances
-            chemicals = [
-                chemical.findtext('NameOfSubstance', default="")
-                for chemical in article.findall('.//Chemical')
-            ]
-            row["ChemicalSubstances"] = "; ".join(chemicals)
-
-            # Grants
-            grants = [grant.findtext('GrantID', default="") for grant in article.findall('.//Grant')]
-            grant_agencies = [grant.findtext('Agency', default="") for grant in article.findall('.//Grant')]
-
-            row["GrantIDs"] = "; ".join(grants)
-            row["GrantOrganizations"] = "; ".join(grant_agencies)
-
-            # Document types
-            doc_types = [dt.text for dt in article.findall('.//PublicationType') if dt.text]
-            row["DocumentTypes"] = "; ".join(doc_types)
-
-            # Additional fields
-            row["Status"] = article.find('.//MedlineCitation').get('Status', 'Unknown')
-
-            year_revised = article.findtext('.//DateRevised/Year')
-            month_revised = article.findtext('.//DateRevised/Month')
-            day_revised = article.findtext('.//DateRevised/Day')
-            
-            row["LastRevisionDate"] = f"{year_revised or '0000'}-{month_revised or '00'}-{day_revised or '00'}"
-                   
-            year_completed = article.findtext('.//DateCompleted/Year')
-            month_completed = article.findtext('.//DateCompleted/Month')
-            day_completed = article.findtext('.//DateCompleted/Day')
-
-            row["CompletionDate"] = f"{year_completed or '0000'}-{month_completed or '00'}-{day_completed or '00'}"
-
-            # Publication history
-            history = []
-            for pub_date in article.findall('.//PubMedPubDate'):
-                status = pub_date.get("PubStatus", "unknown")
-                date = f"{pub_date.findtext('Year')}-{pub_date.findtext('Month')}-{pub_date.findtext('Day')}"
-                history.append(f"{status}: {date}")
-            row["PublicationHistory"] = "; ".join(history)
-
-            # Conflict of interest
-            row["ConflictOfInterest"] = article.findtext(".//CoiStatement")
-
-            # PubMed Central ID
-            row["PMCID"] = article.findtext(".//ArticleId[@IdType='pmc']")
-
-            # Citações
-            citations = []
-            for reference in article.findall('.//ReferenceList/Reference'):
-                citation_text = reference.findtext('Citation', default="")
-                if citation_text:
-                    citations.append(citation_text)
-            row["Citations"] = "; ".join(citations)
+        parents = []
+        for event, element in XML_BACKEND.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                continue
+
+            parents.pop()
+            if element.tag in tags:
+                yield element
+            elif len(parents) != 1:
+                continue
+
+            # Processed children of the document root (articles, book articles, deletions)
+            # are dropped, so the tree never grows beyond the current record
+            if parents:
+                parents[-1].remove(element)
+            element.clear()
+    finally:
+        if close:
+            stream.close()
+
+
+def iter_xml_records(source, shapes=None, records=False):
+    """
+    Streams the rows of every requested shape, one PubmedArticle at a time.
 
-            rows.append(row)
+    The rows have exactly the fields of `parse_xml_to_dfs`; every lookup is scoped to
+    its own article.
 
-        # Convert the list of dictionaries into a DataFrame and concatenate it with the existing one
-        new_df = pd.DataFrame(rows)
-        df = pd.concat([df, new_df], ignore_index=True)
+    Args:
+        source: A file path, XML text, binary file object or gzip stream.
+        shapes (list, optional): Names of the registered shapes. Defaults to all of them.
+        records (bool): Yield compact `Record` objects (`RECORD_TYPES`) with interned
+            repeated values instead of dicts, for callers that keep many rows.
+
+    Yields:
+        dict: {shape name: row} for each article.
+    """
+    builders = _shape_builders(list(shapes or OUTPUT_SHAPES))
+    for article in iter_article_elements(source):
+        rows = _build_rows(article, article, builders)
+        if records:
+            rows = {name: RECORD_TYPES[name].from_row(row) if name in RECORD_TYPES else row for name, row in rows.items()}
+        yield rows
 
-        return df
+
+def parse_xml_to_dfs(xml_data, dfs=None, shapes=None):
+    """
+    Parses PubMed XML once and appends the rows of every shape to its DataFrame.
+
+    Args:
+        xml_data (str): String containing the PubMed XML data.
+        dfs (dict, optional): {shape name: existing DataFrame or None} to append to.
+        shapes (list, optional): Names of the registered shapes. Defaults to the keys of
+            `dfs`, or to all registered shapes.
+
+    Returns:
+        dict: {shape name: updated DataFrame}.
+
+    Example:
+        dfs = parse_xml_to_dfs(xml_data, {"bibliometrix": df_bibliometrix, "pubmed": df_pubmed})
+
+    Appending to a DataFrame copies it, so loops over many payloads should collect
+    them in a `RecordAccumulator` and flush it once instead.
+    """
+    dfs = dict(dfs or {})
+    shapes = list(shapes or dfs or OUTPUT_SHAPES)
+
+    accumulator = RecordAccumulator(shapes)
+    try:
+        accumulator.add_xml(xml_data)
     except ET.ParseError as e:
         logging.error(f"Error parsing XML data: {e}")
         raise
@@ -385,6 +1262,25 @@ def parse_xml_to_bibliometrix_df(xml_data, df=None):
         logging.error(f"Unexpected error: {e}")
         raise
 
+    for name, new_df in accumulator.flush().items():
+        df = dfs.get(name)
+        dfs[name] = new_df if df is None or df.empty else pd.concat([df, new_df], ignore_index=True)
+    return dfs
+
+
+def parse_xml_to_bibliometrix_df(xml_data, df=None):
+    """
+    Parse PubMed XML data and append the extracted metadata to an existing DataFrame.
+
+    Args:
+        xml_data (str): String containing the PubMed XML data.
+        df (pd.DataFrame, optional): Existing DataFrame to append new rows to. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Updated DataFrame containing parsed PubMed article metadata.
+    """
+    return parse_xml_to_dfs(xml_data, {"bibliometrix": df})["bibliometrix"]
+
 
 def parse_xml_to_pubmed_df(xml_data, df=None):
     """
@@ -397,213 +1293,120 @@ def parse_xml_to_pubmed_df(xml_data, df=None):
     Returns:
         pd.DataFrame: Updated DataFrame containing parsed PubMed article metadata.
     """
+    df = parse_xml_to_dfs(xml_data, {"pubmed": df})["pubmed"]
+    logging.info("Parsing completed successfully.")
+    return df
+
+
+# ESummary reports language names, while EFetch XML uses the MEDLINE codes
+SUMMARY_LANGUAGES = {
+    "English": "eng", "Portuguese": "por", "Spanish": "spa", "French": "fre", "German": "ger",
+    "Italian": "ita", "Chinese": "chi", "Japanese": "jpn", "Russian": "rus", "Dutch": "dut",
+    "Polish": "pol", "Korean": "kor",
+}
+
+
+def _summary_text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+# Columns ESummary fills in a reduced form: authors have initials but no fore names
+SUMMARY_DEGRADED_COLUMNS = ("Authors",)
+
+
+def _summary_author(author):
+    # ESummary authors look like "Souza LRS"; EFetch-based rows use "Souza, Leandro LRS"
+    parts = str(author).strip().rsplit(" ", 1)
+    if len(parts) == 2 and parts[1].isupper():
+        return f"{parts[0]}, {parts[1]}"
+    return str(author).strip()
+
+
+def parse_esummary_to_bibliometrix_df(summaries, df=None):
+    """
+    Fill the bibliometrix columns from ESummary records instead of full EFetch XML.
+
+    Only the columns available in ESummary (authors, title, journal, year, DOI, volume,
+    pages, ISSN, language, document types and PMC ID) are filled. Each row is marked with
+    `MetadataSource = "esummary"`, lists the columns it could not fill in `MissingFields`
+    and the columns it filled in a reduced form (authors without fore names) in
+    `DegradedFields`, so a later full fetch can enrich only those records.
+
+    Args:
+        summaries (iterable): DocSum records, e.g. `request_summaries(pmids).values()`.
+        df (pd.DataFrame, optional): Existing DataFrame to append new rows to. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Updated DataFrame with the bibliometrix columns plus `MetadataSource`,
+        `MissingFields` and `DegradedFields`.
+    """
     if df is None:
         df = pd.DataFrame()
 
-    try:
-        root = ET.fromstring(xml_data)
-        rows = []
-
-        for article in root.findall('.//PubmedArticle'):
-            row = {}
-
-            try:     
-                # Core fields from XML
-                row["PMID"] = article.findtext('.//PMID', "Unknown")
-                row["Owner"] = article.find('.//MedlineCitation').get('Owner', 'Unknown')
-
-                # MedlineCitation Status
-                row["MedlineCitation.Status"] = article.find('.//MedlineCitation').get('Status', "Unknown")
-                row["DataBankName"] = article.findtext('.//DataBankName', "Unknown")
-
-                row["PublicationStatus"] = article.findtext('.//PublicationStatus', "Unknown")
-
-
-                # DateCompleted and DateRevised
-                row["DateCompleted"] = "".join(
-                    filter(None, [
-                        article.findtext('.//DateCompleted/Year'),
-                        article.findtext('.//DateCompleted/Month'),
-                        article.findtext('.//DateCompleted/Day')
-                    ])
-                )
-                row["DateRevised"] = "".join(
-                    filter(None, [
-                        article.findtext('.//DateRevised/Year'),
-                        article.findtext('.//DateRevised/Month'),
-                        article.findtext('.//DateRevised/Day')
-                    ])
-                )
-                # Extração do campo ArticleDate no formato esperado
-                row["ArticleDate"] = "".join(
-                    filter(None, [
-                            article.findtext('.//ArticleDate/Year'),
-                            article.findtext('.//ArticleDate/Month'),
-                            article.findtext('.//ArticleDate/Day'),
-                        ])
-                )
-
-                row["ELocationDOI"] = root.findtext('.//ELocationID[@EIdType="doi"]', "Unknown")
-                row["LocationPII"] = root.findtext('.//ELocationID[@EIdType="pii"]', "Unknown")
-                row["ArticleIdListPII"] = root.findtext('.//ArticleId[@IdType="pii"]', "Unknown")
-                row["ArticleIdListDOI"] = root.findtext('.//ArticleId[@IdType="doi"]', "Unknown")
-
-
-                # ISSN and Linking
-                row["ISSN"] = article.findtext('.//ISSN[@IssnType="Electronic"]', "Unknown")
-                row["ISSNLinking"] = article.findtext('.//ISSNLinking', "Unknown")
-
-                # Journal Issue
-                row["JournalIssue.Volume"] = article.findtext('.//JournalIssue/Volume', "Unknown")
-                row["JournalIssue.Issue"] = article.findtext('.//JournalIssue/Issue', "Unknown")
-                row["PubDate.Year"] = article.findtext('.//PubDate/Year', "Unknown")
-                row["PublicationSeason"] = article.findtext('.//JournalIssue/PubDate/Season', "Unknown")
-
-                # Article Title and Abstract
-                row["ArticleTitle"] = article.findtext('.//ArticleTitle', "Unknown")
-                #row["Abstract.AbstractText"] = " ".join(
-                #    [abstract.text.strip() for abstract in article.findall('.//Abstract/AbstractText') if abstract.text]
-                #)
-                row["Abstract.AbstractText"] = extract_abstract_text(article)
-                row["CopyrightInformation"] = article.findtext('.//Abstract/CopyrightInformation', "Unknown")
-
-                # StartPage and MedlinePgn
-                row["StartPage"] = article.findtext('.//StartPage', "Unknown")
-                row["MedlinePgn"] = article.findtext('.//MedlinePgn', "Unknown")
-
-                # AccessionNumber
-                accession_number = article.findtext('.//AccessionNumberList/AccessionNumber', None)
-                row["AccessionNumber"] = accession_number if accession_number else "Unknown"
-
-                # PubMedPubDate fields
-                pub_dates = article.findall('.//PubMedPubDate')
-                for pub_date in pub_dates:
-                    status = pub_date.get('PubStatus', "unknown")
-                    year = pub_date.findtext('Year', "")
-                    month = pub_date.findtext('Month', "").zfill(2)
-                    day = pub_date.findtext('Day', "").zfill(2)
-                    hour = pub_date.findtext('Hour', "00").zfill(2)
-                    minute = pub_date.findtext('Minute', "00").zfill(2)
-                    formatted_date = f"{year}/{month}/{day} {hour}:{minute}"
-                    if status == "received":
-                        row["PubMedPubDateReceived"] = formatted_date
-                    elif status == "accepted":
-                        row["PubMedPubDateAccepted"] = formatted_date
-                    elif status == "entrez": 
-                        row["PubMedPubDateEntrez"] = formatted_date
-                    elif status == "pubmed":
-                        row["PubMedPubDatePubmed"] = formatted_date
-                    elif status == "medline":
-                        row["PubMedPubDateMedline"] = formatted_date
-
-                # PublicationStatus
-                row["PublicationStatus"] = article.findtext('.//PublicationStatus', "Unknown")
-
-                # Country
-                row["Country"] = article.findtext('.//MedlineJournalInfo/Country', "Unknown")
-
-                # MedlineTA
-                row["MedlineTA"] = article.findtext('.//MedlineJournalInfo/MedlineTA', "Unknown")
-
-                # Title
-                row["Title"] = article.findtext('.//Journal/Title', "Unknown")
-
-                # NlmUniqueID
-                row["NlmUniqueID"] = article.findtext('.//MedlineJournalInfo/NlmUniqueID', "Unknown")
-
-                # CitationSubset
-                row["CitationSubset"] = article.findtext('.//CitationSubset', "Unknown")
-               
-                row["MeshHeadingList"] = process_mesh_headings(article)
-
-                 # OT
-                keyword_list = article.find('.//KeywordList')
-                if keyword_list is not None:
-                    row["Keyword"] = keyword_list.get("Owner", "Unknown")
-                else:
-                    row["Keyword"] = "Unknown"
-
-                keywords = []
-                for keyword in article.findall('.//Keyword'):
-                    keyword_value = keyword.text.strip() if keyword.text else "Unknown"
-                    major_topic_yn = keyword.get("MajorTopicYN", "Unknown")
-                    keywords.append(f"{keyword_value}")
-
-                # Adicionar ao campo KeywordList
-                row["KeywordList"] = "; ".join(keywords)
-
-                # ArticleIdList PMC
-                row["ArticleIdListPMC"] = article.findtext('.//ArticleId[@IdType="pmc"]', "Unknown")
-
-                # Language and PublicationType
-                row["Language"] = article.findtext('.//Language', "Unknown")
-                row["PublicationType"] = "; ".join(
-                    [pt.text for pt in article.findall('.//PublicationType') if pt.text]
-                )
-
-                # Author list
-                # Author list
-                authors = []
-                authors_dtl = []
-
-               # Inicializando listas para armazenar informações dos autores
-                authors = []
-                authors_dtl = []
-
-                # Iterando pela lista de autores
-                for author in article.findall('.//Author'):
-                    # Extraindo detalhes básicos
-                    fore_name = author.findtext('ForeName', "").strip()
-                    last_name = author.findtext('LastName', "").strip()
-                    initials = author.findtext('Initials', "").strip()
-                    full_name = f"{last_name}, {fore_name}".strip(", ")
-                    authors.append(full_name)
-
-                    # Extraindo ORCID (se disponível)
-                    orcid = author.findtext(".//Identifier[@Source='ORCID']", "").strip()
-
-                    # Extraindo afiliações
-                    affiliations = [
-                        aff.text.strip() for aff in author.findall(".//AffiliationInfo/Affiliation") if aff.text
-                    ]
-
-                    # Formatando a string detalhada do autor
-                    author_detail = f"FAU:{full_name}|AU:{last_name} {initials}"
-                    if orcid:
-                        author_detail += f"|AUID:{orcid}"
-                    if affiliations:
-                        author_detail += f"|AD:{' |AD: '.join(affiliations)}"
-                    authors_dtl.append(author_detail)
-
-                    # Salvando as informações em um dicionário ou DataFrame
-                    row["AuthorListAuthor"] = "| ".join(authors)
-                    row["AuthorListDTL"] = "| ".join(authors_dtl)
-
-                    # Exibindo o resultado
-                    #print("Autores Simples:", row["AuthorListAuthor"])
-                    #print("Autores Detalhados:", row["AuthorListDTL"])
-
-                # CoiStatement
-                row["CoiStatement"] = article.findtext('.//CoiStatement', "Unknown")
-
-                #print(xml_data)
-                logging.info(row)
-                rows.append(row)
-
-            except Exception as e:
-                logging.error(f"Error parsing article: {e}")
-        
-        
-        logging.info("Adicionando Row in DF: %s",rows)
-        new_df = pd.DataFrame(rows)
-        df = pd.concat([df, new_df], ignore_index=True)
-        
-        logging.info("Parsing completed successfully.")
-        return df
+    rows = []
+    for summary in summaries:
+        try:
+            article_ids = summary.get("ArticleIds") or {}
+            if not isinstance(article_ids, dict):
+                article_ids = {}
+            languages = [SUMMARY_LANGUAGES.get(str(lang), str(lang)) for lang in summary.get("LangList", [])]
+            pub_date = _summary_text(summary.get("PubDate")) or ""
+
+            row = dict.fromkeys(BIBLIOMETRIX_COLUMNS)
+            row["PMID"] = _summary_text(summary.get("Id"))
+            row["ArticleTitle"] = _summary_text(summary.get("Title"))
+            row["JournalTitle"] = _summary_text(summary.get("FullJournalName"))
+            row["ISOAbbreviation"] = _summary_text(summary.get("Source"))
+            row["Volume"] = _summary_text(summary.get("Volume"))
+            row["Pages"] = _summary_text(summary.get("Pages"))
+            row["ISSN"] = _summary_text(summary.get("ISSN")) or _summary_text(summary.get("ESSN"))
+            row["Language"] = languages[0] if languages else None
+            row["DOI"] = _summary_text(summary.get("DOI")) or _summary_text(article_ids.get("doi"))
+            row["PII"] = _summary_text(article_ids.get("pii"))
+            row["PublicationYear"] = pub_date[:4] if pub_date[:4].isdigit() else None
+            row["Authors"] = "; ".join(_summary_author(author) for author in summary.get("AuthorList", [])) or None
+            row["DocumentTypes"] = "; ".join(str(pub_type) for pub_type in summary.get("PubTypeList", [])) or None
+            row["PMCID"] = _summary_text(article_ids.get("pmc"))
+
+            row["MetadataSource"] = "esummary"
+            row["MissingFields"] = "; ".join(column for column in BIBLIOMETRIX_COLUMNS if not row[column])
+            row["DegradedFields"] = "; ".join(column for column in SUMMARY_DEGRADED_COLUMNS if row[column])
+            rows.append(row)
 
-    except ET.ParseError as e:
-        logging.error(f"Error parsing XML data: {e}")
-        raise
-    except Exception as e:
-        logging.error(f"Unexpected error: {e}")
-        raise
\ No newline at end of file
+        except Exception as e:
+            logging.error(f"Error parsing summary {summary.get('Id')}: {e}")
+
+    new_df = pd.DataFrame(rows, columns=BIBLIOMETRIX_COLUMNS + ["MetadataSource", "MissingFields", "DegradedFields"])
+    df = pd.concat([df, new_df], ignore_index=True)
+    return df
+
+
+def records_to_enrich(df, fields=None):
+    """
+    Returns the PMIDs of summary-mode rows that still need a full EFetch.
+
+    Args:
+        df (pd.DataFrame): DataFrame produced by `parse_esummary_to_bibliometrix_df`.
+        fields (list, optional): Only consider rows missing any of these columns or
+            filling them in a reduced form (`DegradedFields`). Defaults to every
+            summary-mode row.
+
+    Returns:
+        list: PMIDs to be fetched with the full XML parsers.
+    """
+    if "MetadataSource" not in df.columns:
+        return []
+
+    summary_rows = df[df["MetadataSource"] == "esummary"]
+    if fields:
+        wanted = set(fields)
+        incomplete = summary_rows["MissingFields"].fillna("")
+        if "DegradedFields" in summary_rows.columns:
+            incomplete = incomplete + "; " + summary_rows["DegradedFields"].fillna("")
+        summary_rows = summary_rows[incomplete.apply(
+            lambda columns: bool(wanted.intersection(columns.split("; ")))
+        )]
+    return summary_rows["PMID"].dropna().astype(str).tolist()
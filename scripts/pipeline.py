@@ -0,0 +1,176 @@
+"""
+pipeline.py
+
+This module runs the reference list harvest of the notebooks (`process_all_articles`)
+with a job journal, so a crashed run can be resumed without duplicated rows in the
+output files.
+
+Resume a job from the notebook by running `process_all_articles` again with the same
+input, or from the command line with `python -m scripts.pipeline --resume`.
+"""
+
+import argparse
+import logging
+import os
+
+from tqdm import tqdm
+
+from scripts import ncbi
+from scripts import utils
+from scripts.journal import JobJournal, input_fingerprint, FOUND, NOT_FOUND, AMBIGUOUS, ERROR
+from scripts.parsing import RecordAccumulator
+from scripts.planning import plan_queries
+
+
+DEFAULT_JOURNAL_FILE = "./metadata/job_journal.sqlite"
+
+
+def _flush(journal, pubmed_file, bibliometrix_file, accumulator):
+    dfs = accumulator.flush()
+    frames = {
+        pubmed_file: dfs["pubmed"].replace(r"\n", " ", regex=True),
+        bibliometrix_file: dfs["bibliometrix"].replace(r"\n", " ", regex=True),
+    }
+    committed = journal.commit(frames)
+    logging.info(f"Journal: {committed} rows committed with the metadata flush")
+
+
+def process_all_articles(df_search, pubmed_file, bibliometrix_file, journal_file=None, config=None):
+    """
+    Processes the input rows, parses the PubMed records of each one into the pubmed and
+    bibliometrix formats and appends them to the output files.
+
+    Every row outcome (found, not found, ambiguous or error) and every parsed PMID is
+    written to the job journal in the same step as the periodic metadata flush. Running
+    the function again with the same input resumes the job: the output files are
+    truncated to the last committed flush and only unfinished rows are processed.
+    Rows that failed with a transient error are retried.
+
+    The queries are planned before the first request: the unique DOIs, and then the
+    titles of the rows without a DOI match, are resolved with batched searches, so rows
+    with the same normalized DOI or title share one outcome. The PMIDs found are
+    fetched with batched EFetch requests, and a PMID returned for several rows is
+    fetched and parsed only once. A PMID missing from the EFetch response marks its
+    row as an error, to be retried by the next run.
+
+    Args:
+        df_search (pd.DataFrame): Input rows with the 'doi' and 'title' columns.
+        pubmed_file (str): Output file of the pubmed format.
+        bibliometrix_file (str): Output file of the bibliometrix format.
+        journal_file (str, optional): SQLite file of the journal. Defaults to
+            `files.file_job_journal` of config.yaml, relative to the output directory.
+        config (dict, optional): The loaded config.yaml. Defaults to `utils.CONFIG`.
+
+    Returns:
+        dict: Committed rows per outcome and the number of parsed PMIDs.
+    """
+    config = config or utils.CONFIG
+    if journal_file is None:
+        journal_file = os.path.join(
+            utils.OUTPUT_PATH, config["files"].get("file_job_journal", DEFAULT_JOURNAL_FILE)
+        )
+
+    expected = 1 if config["config"]["search_article_one"] else None
+    save_every = int(config["config"]["file_save_periodically"])
+
+    journal = JobJournal(
+        os.path.normpath(journal_file), outputs=[pubmed_file, bibliometrix_file],
+        fingerprint=input_fingerprint(df_search),
+    )
+    journal.recover()
+    rows = journal.unfinished_rows(df_search.index)
+    parsed = journal.processed_pmids()
+    if len(rows) < len(df_search):
+        logging.info(f"Resuming job: {len(df_search) - len(rows)} rows already finished - {len(rows)} to process")
+    plan = plan_queries(df_search.loc[rows])
+
+    # Parsed rows are collected per column and turned into DataFrames at each flush
+    accumulator = RecordAccumulator(["bibliometrix", "pubmed"])
+
+    # The articles of a window of rows are fetched with batched EFetch requests
+    window = max(save_every, ncbi.FETCH_BATCH_SIZE)
+
+    with tqdm(total=len(rows), desc="Processing PubMed articles", unit="row") as pbar:
+        for start in range(0, len(rows), window):
+            outcomes = {i: plan.resolve(i) for i in rows[start:start + window]}
+            wanted = [
+                article_id
+                for outcome in outcomes.values()
+                if outcome.status == ncbi.FOUND and (expected is None or outcome.count == expected)
+                for article_id in outcome.id_list
+                if article_id not in parsed
+            ]
+            pbar.set_postfix({"Status": f"Fetching {len(set(wanted))} articles"})
+            # PMIDs of failed batches are missing from `articles` and checked per row below
+            articles = dict(ncbi.fetch_articles(wanted, failed=[]))
+
+            for position, (i, outcome) in enumerate(outcomes.items(), start=start + 1):
+                if outcome.status == ncbi.TRANSIENT:
+                    journal.record_row(i, ERROR)
+                elif outcome.status == ncbi.NOT_FOUND:
+                    journal.record_row(i, NOT_FOUND)
+                elif expected is not None and outcome.count != expected:
+                    logging.info({"error": "Query failed", "row": int(i), "count": outcome.count, "query": outcome.id_list})
+                    journal.record_row(i, AMBIGUOUS, outcome.count, outcome.id_list)
+                else:
+                    article_ids = list(dict.fromkeys(outcome.id_list))
+                    missing = [article_id for article_id in article_ids if article_id not in parsed and article_id not in articles]
+                    if missing:
+                        # fetch_articles logs failed batches; the row is retried by the next run
+                        logging.error(f"Error processing row {i}: EFetch returned no article for PMIDs {missing}")
+                        journal.record_row(i, ERROR, outcome.count, outcome.id_list)
+                    else:
+                        try:
+                            for article_id in article_ids:
+                                pbar.set_postfix({"Current PubMed ID": f"{i} - {article_id}"})
+                                if article_id not in parsed:
+                                    accumulator.add_xml(articles.pop(article_id))
+                                    parsed.add(article_id)
+                                journal.record_article(article_id, i)
+                            journal.record_row(i, FOUND, outcome.count, outcome.id_list)
+                        except Exception as e:
+                            logging.error(f"Error processing row {i}: {e}")
+                            journal.record_row(i, ERROR, outcome.count, outcome.id_list)
+
+                pbar.update(1)
+
+                if position % save_every == 0 or position == len(rows):
+                    pbar.set_postfix({"Status": "Saving metadata files"})
+                    _flush(journal, pubmed_file, bibliometrix_file, accumulator)
+
+    summary = journal.summary()
+    journal.close()
+    logging.info(
+        f"Query plan: {plan.stats['batched']} keys resolved in batches - {plan.stats['queries']} single queries - "
+        f"{plan.stats['reused']} reused outcomes"
+    )
+    logging.info(f"Job finished: {summary}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harvest the PubMed metadata of the configured reference list.")
+    parser.add_argument("--resume", action="store_true", help="resume the job recorded in the journal")
+    args = parser.parse_args()
+
+    # initialize_environment resolves the project root as the parent of the working directory
+    os.chdir(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "notebook"))
+    utils.initialize_environment()
+    config = utils.CONFIG
+    input_file = os.path.join(utils.INPUT_PATH, config["files"].get("file_data_input", "InputSearchDoi.csv"))
+    pubmed_file = os.path.join(utils.OUTPUT_PATH, config["files"].get("file_parsing_pubmed", "PubMed_Metadata.csv"))
+    bibliometrix_file = os.path.join(
+        utils.OUTPUT_PATH, config["files"].get("file_parsing_bibliometrix", "Bibliometrix_Metadata.csv")
+    )
+    journal_file = os.path.join(utils.OUTPUT_PATH, config["files"].get("file_job_journal", DEFAULT_JOURNAL_FILE))
+
+    if not args.resume and os.path.exists(journal_file):
+        parser.error(f"A job journal already exists at {journal_file}; use --resume or clear_all_processec() first")
+
+    df_search = utils.load_csv_to_dataframe(input_file, "|")
+    summary = process_all_articles(df_search, pubmed_file, bibliometrix_file, journal_file, config)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
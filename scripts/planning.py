@@ -0,0 +1,186 @@
+"""
+planning.py
+
+This module plans the queries of an input reference list before any request is made.
+DOIs and titles are normalized, every normalized key is mapped to the input rows that
+share it, and the unique keys are resolved in batches (`ncbi.resolve_dois`, then
+`ncbi.resolve_titles` for the rows whose DOI is missing or not found); each outcome is
+then reused for every row of the key.
+"""
+
+import logging
+
+import pandas as pd
+
+from scripts import ncbi
+
+
+DOI = "doi"
+TITLE = "title"
+
+
+class QueryPlan:
+    """
+    Index of the normalized DOI and title keys of the input rows.
+
+    `resolve(row)` returns the DOI outcome of a row and falls back to its title. After
+    `resolve_batches()` every key already has its outcome; otherwise each key is sent to
+    PubMed as a single query the first time it is needed. Transient failures of single
+    queries are not remembered, so a later row retries the key, while keys whose batch
+    failed stay TRANSIENT and their rows are retried by the next run.
+
+    Example:
+        plan = plan_queries(df_search)
+        for i in df_search.index:
+            outcome = plan.resolve(i)
+    """
+
+    def __init__(self, df, doi_column="doi", title_column="title"):
+        self.row_keys = {}
+        self.keys = {DOI: {}, TITLE: {}}
+        self.terms = {}
+        self.outcomes = {}
+        self.stats = {"queries": 0, "batched": 0, "reused": 0}
+        self._used = set()
+
+        dois = df[doi_column] if doi_column in df.columns else pd.Series(None, index=df.index)
+        titles = df[title_column] if title_column in df.columns else pd.Series(None, index=df.index)
+
+        for row, doi, title in zip(df.index, dois, titles):
+            doi_key = ncbi.normalize_doi(doi)
+            title_key = ncbi.normalize_title(title) if isinstance(title, str) else ""
+            self.row_keys[row] = (doi_key, title_key)
+
+            if doi_key:
+                self.keys[DOI].setdefault(doi_key, []).append(row)
+                self.terms.setdefault((DOI, doi_key), f"{doi_key}[DOI]")
+            if title_key:
+                self.keys[TITLE].setdefault(title_key, []).append(row)
+                # The first spelling of the title is the one sent to PubMed
+                self.terms.setdefault((TITLE, title_key), " ".join(title.split()))
+
+    def rows(self, key_type, key):
+        """
+        Returns the input rows that share a normalized DOI or title.
+        """
+        return self.keys[key_type].get(key, [])
+
+    def _outcome(self, key_type, key):
+        if (key_type, key) in self._used:
+            self.stats["reused"] += 1
+        self._used.add((key_type, key))
+
+        if (key_type, key) in self.outcomes:
+            return self.outcomes[(key_type, key)]
+
+        outcome = ncbi.request_count_outcome(self.terms[(key_type, key)])
+        self.stats["queries"] += 1
+        if outcome.status != ncbi.TRANSIENT:
+            self.outcomes[(key_type, key)] = outcome
+        return outcome
+
+    def _store_batch(self, key_type, result, normalize):
+        outcomes = {}
+        for value, pmid in result["resolved"].items():
+            outcomes[normalize(value)] = ncbi.QueryOutcome(ncbi.FOUND, 1, [pmid], None)
+        for value, pmids in result["ambiguous"].items():
+            outcomes[normalize(value)] = ncbi.QueryOutcome(ncbi.FOUND, len(pmids), list(pmids), None)
+        for value in result["unmatched"]:
+            outcomes[normalize(value)] = ncbi.QueryOutcome(ncbi.NOT_FOUND, 0, [], None)
+        for value in result["failed"]:
+            outcomes[normalize(value)] = ncbi.QueryOutcome(ncbi.TRANSIENT, 0, [], "Batch request failed")
+
+        for key, outcome in outcomes.items():
+            self.outcomes[(key_type, key)] = outcome
+        self.stats["batched"] += len(outcomes)
+
+    def resolve_batches(self):
+        """
+        Resolves every DOI key with `ncbi.resolve_dois`, then the title keys of the rows
+        whose DOI is missing or not found with `ncbi.resolve_titles`.
+
+        The outcomes are stored like those of single queries, so `resolve(row)` makes no
+        request afterwards. A title outcome is FOUND only for titles matched by the local
+        similarity score.
+        """
+        doi_keys = [key for key in self.keys[DOI] if (DOI, key) not in self.outcomes]
+        if doi_keys:
+            self._store_batch(DOI, ncbi.resolve_dois(doi_keys), ncbi.normalize_doi)
+
+        title_keys = [
+            title_key
+            for doi_key, title_key in self.row_keys.values()
+            if title_key and (TITLE, title_key) not in self.outcomes
+            and (not doi_key or self.outcomes[(DOI, doi_key)].status == ncbi.NOT_FOUND)
+        ]
+        if title_keys:
+            titles = [self.terms[(TITLE, key)] for key in dict.fromkeys(title_keys)]
+            self._store_batch(TITLE, ncbi.resolve_titles(titles), ncbi.normalize_title)
+
+    def resolve(self, row):
+        """
+        Returns the outcome of a row: its DOI search, or its title search when the DOI
+        is missing or finds nothing.
+
+        Returns:
+            QueryOutcome: The outcome shared by every row with the same key.
+        """
+        doi_key, title_key = self.row_keys[row]
+        outcome = ncbi.QueryOutcome(ncbi.NOT_FOUND, 0, [], None)
+
+        if doi_key:
+            outcome = self._outcome(DOI, doi_key)
+            logging.info(f"{row} - Number of results: {outcome.count} - Searching by DOI: {doi_key}")
+
+        if outcome.status == ncbi.NOT_FOUND and title_key:
+            outcome = self._outcome(TITLE, title_key)
+            logging.info(f"{row} - Number of results: {outcome.count} - Searching by title: {self.terms[(TITLE, title_key)]}")
+
+        return outcome
+
+    def duplicates(self):
+        """
+        Returns the keys shared by more than one input row.
+
+        Returns:
+            pd.DataFrame: Columns `key_type`, `key`, `count` and `rows`.
+        """
+        records = [
+            {"key_type": key_type, "key": key, "count": len(rows), "rows": ";".join(str(row) for row in rows)}
+            for key_type, index in self.keys.items()
+            for key, rows in index.items()
+            if len(rows) > 1
+        ]
+        return pd.DataFrame(records, columns=["key_type", "key", "count", "rows"])
+
+    def summary(self):
+        """
+        Returns the number of rows, of unique keys and of rows whose DOI repeats another row.
+        """
+        return {
+            "rows": len(self.row_keys),
+            "unique_dois": len(self.keys[DOI]),
+            "unique_titles": len(self.keys[TITLE]),
+            "duplicated_doi_rows": sum(len(rows) - 1 for rows in self.keys[DOI].values()),
+            "rows_without_doi": sum(1 for doi_key, _ in self.row_keys.values() if not doi_key),
+        }
+
+
+def plan_queries(df, doi_column="doi", title_column="title", batched=True):
+    """
+    Builds the query plan of an input reference list.
+
+    Args:
+        df (pd.DataFrame): Input rows.
+        doi_column (str): Column with the DOIs.
+        title_column (str): Column with the titles.
+        batched (bool): Resolves the DOI and title keys in batches right away.
+
+    Returns:
+        QueryPlan: The plan, ready to resolve rows.
+    """
+    plan = QueryPlan(df, doi_column, title_column)
+    logging.info(f"Query plan: {plan.summary()}")
+    if batched:
+        plan.resolve_batches()
+    return plan
@@ -0,0 +1,352 @@
+"""
+reparse.py
+
+This module regenerates the metadata files from the XML already stored by earlier
+harvests, without querying PubMed. The stored articles (the compressed XmlStore and the
+`<row>_article_<pmid>.xml` files written by older versions) are split into chunks that
+a process pool parses in parallel; each worker returns its rows as columns and the
+partial results are merged in PMID order, so the output does not depend on the number
+of processes.
+
+With `--incremental`, a parse manifest (scripts.manifest) keeps the rows of every
+article with the hash of its XML and the parser version, and only new or changed
+articles are parsed again.
+
+Run with `python -m scripts.reparse --processes 8` after changing a field rule.
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from scripts import parsing
+from scripts import utils
+from scripts.journal import JobJournal
+from scripts.manifest import ParseManifest
+from scripts.xml_store import content_hash
+
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MANIFEST_FILE = "./metadata/parse_manifest.sqlite"
+
+# File names of the XML saved one file per article before the XmlStore
+LEGACY_XML = re.compile(r"^\d+_article_(\d+)\.xml$")
+
+
+def collect_sources(directory, store=None):
+    """
+    Lists the stored XML of every PMID, in the order the files are read.
+
+    Articles in the XmlStore take precedence over legacy per-article files of the same
+    PMID, since the store keeps the latest version.
+
+    Args:
+        directory (str): XML directory (`directories.xml` of config.yaml).
+        store (XmlStore, optional): The open store of the directory.
+
+    Returns:
+        list: (pmid, path, offset, length) tuples; offset and length are None for legacy files.
+    """
+    sources = list(store.locations()) if store is not None else []
+    stored = {pmid for pmid, _, _, _ in sources}
+
+    legacy = {}
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        match = LEGACY_XML.match(name)
+        if match and match.group(1) not in stored:
+            legacy.setdefault(match.group(1), os.path.join(directory, name))
+
+    return sources + [(pmid, path, None, None) for pmid, path in legacy.items()]
+
+
+def read_source(path, offset=None, length=None):
+    """
+    Returns the XML bytes of one source of `collect_sources`.
+    """
+    with open(path, "rb") as file:
+        if offset is None:
+            return file.read()
+        file.seek(offset)
+        return gzip.decompress(file.read(length))
+
+
+def _init_worker(backend):
+    logging.disable(logging.INFO)
+    parsing.set_xml_backend(backend)
+
+
+def parse_chunk(sources, shapes, tables=()):
+    """
+    Parses one chunk of sources in a worker.
+
+    Returns:
+        tuple: ({shape or table name: DataFrame}, [(pmid, error message), ...]).
+    """
+    accumulator = parsing.RecordAccumulator(shapes, tables)
+    errors = []
+    for pmid, path, offset, length in sources:
+        try:
+            accumulator.add_xml(read_source(path, offset, length))
+        except Exception as e:
+            errors.append((pmid, str(e)))
+    return accumulator.flush(), errors
+
+
+def parse_articles(sources, shapes, tables=()):
+    """
+    Parses one chunk of sources in a worker, keeping the rows of each article apart.
+
+    Returns:
+        tuple: ([(pmid, {shape or table name: list of rows}), ...], [(pmid, error message), ...]).
+    """
+    accumulator = parsing.RecordAccumulator(shapes, tables)
+    parsed = []
+    errors = []
+    for pmid, path, offset, length in sources:
+        try:
+            accumulator.add_xml(read_source(path, offset, length))
+        except Exception as e:
+            errors.append((pmid, str(e)))
+            continue
+        parsed.append((pmid, accumulator.take_rows()))
+    return parsed, errors
+
+
+def merge_partials(partials):
+    """
+    Concatenates the partial results of the workers and sorts every frame by PMID.
+
+    The sort is stable, so the rows of one article in a side table keep their order.
+
+    Returns:
+        dict: {shape or table name: DataFrame}.
+    """
+    merged = {}
+    for name in partials[0] if partials else ():
+        df = pd.concat([partial[name] for partial in partials], ignore_index=True)
+        if "PMID" in df.columns:
+            df = df.sort_values(
+                "PMID", key=lambda pmids: pd.to_numeric(pmids, errors="coerce"), kind="mergesort", na_position="last"
+            ).reset_index(drop=True)
+        merged[name] = df
+    return merged
+
+
+def reparse_sources(sources, shapes=("bibliometrix", "pubmed"), tables=(), processes=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE, backend="etree"):
+    """
+    Parses stored XML with a process pool, one chunk of sources per task.
+
+    Args:
+        sources (list): Sources from `collect_sources`.
+        shapes (tuple): Output shapes to build.
+        tables (tuple): Side tables (`parsing.SIDE_TABLES`) to build, or True for all.
+        processes (int, optional): Worker processes. Defaults to the number of CPUs;
+            1 parses in the current process.
+        chunk_size (int): Sources per task.
+        backend (str): XML backend of the workers.
+
+    Returns:
+        tuple: ({shape or table name: DataFrame sorted by PMID}, [(pmid, error message), ...]).
+    """
+    shapes = list(shapes)
+    tables = list(parsing.SIDE_TABLES if tables is True else tables or ())
+
+    started = time.perf_counter()
+    results = _run_chunks(parse_chunk, sources, shapes, tables, processes, chunk_size, backend)
+    partials = [frames for frames, _ in results]
+    errors = _log_errors(results)
+
+    merged = merge_partials(partials) if partials else parsing.RecordAccumulator(shapes, tables).flush()
+    _log_throughput(len(sources), time.perf_counter() - started, errors)
+    return merged, errors
+
+
+def _run_chunks(function, sources, shapes, tables, processes, chunk_size, backend):
+    processes = processes or os.cpu_count() or 1
+    chunks = [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+
+    if processes == 1 or len(chunks) <= 1:
+        previous = parsing.XML_BACKEND.name
+        parsing.set_xml_backend(backend)
+        try:
+            return [function(chunk, shapes, tables) for chunk in chunks]
+        finally:
+            parsing.set_xml_backend(previous)
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(backend,)) as executor:
+        return list(executor.map(function, chunks, [shapes] * len(chunks), [tables] * len(chunks)))
+
+
+def _log_errors(results):
+    errors = [error for _, chunk_errors in results for error in chunk_errors]
+    for pmid, message in errors:
+        logging.error(f"Reparse: article {pmid} could not be parsed: {message}")
+    return errors
+
+
+def _log_throughput(articles, elapsed, errors):
+    logging.info(
+        f"Reparse: {articles} articles parsed in {elapsed:.1f}s "
+        f"({articles / elapsed if elapsed else 0:.0f} articles/s), {len(errors)} errors"
+    )
+
+
+def source_hashes(sources, store=None):
+    """
+    Returns {pmid: content hash} of the sources. Hashes of the XmlStore come from its
+    index; legacy files are read and hashed.
+    """
+    stored = store.hashes() if store is not None else {}
+    return {
+        pmid: stored[pmid] if offset is not None and pmid in stored else content_hash(read_source(path, offset, length))
+        for pmid, path, offset, length in sources
+    }
+
+
+def reparse_incremental(sources, manifest_file, store=None, shapes=("bibliometrix", "pubmed"), tables=(),
+                        processes=None, chunk_size=DEFAULT_CHUNK_SIZE, backend="etree"):
+    """
+    Parses only the sources whose XML or parser version changed since the last run and
+    rebuilds the full output from the parse manifest.
+
+    Articles that fail to parse keep their previous record, if any, and are retried by
+    the next run.
+
+    Args:
+        sources (list): Sources from `collect_sources`.
+        manifest_file (str): SQLite file of the parse manifest.
+        store (XmlStore, optional): The store of the sources, whose index has the hashes.
+        shapes, tables, processes, chunk_size, backend: As in `reparse_sources`.
+
+    Returns:
+        tuple: ({shape or table name: DataFrame sorted by PMID}, [(pmid, error message), ...],
+        {"parsed": ..., "reused": ..., "removed": ...}).
+    """
+    shapes = list(shapes)
+    tables = list(parsing.SIDE_TABLES if tables is True else tables or ())
+    manifest = ParseManifest(manifest_file, parsing.parser_version(shapes + tables))
+
+    try:
+        hashes = source_hashes(sources, store)
+        stale = set(manifest.stale(hashes))
+        removed = manifest.forget(hashes)
+
+        started = time.perf_counter()
+        results = _run_chunks(
+            parse_articles, [source for source in sources if source[0] in stale],
+            shapes, tables, processes, chunk_size, backend,
+        )
+        parsed = [article for articles, _ in results for article in articles]
+        errors = _log_errors(results)
+        manifest.update(parsed, hashes)
+        _log_throughput(len(stale), time.perf_counter() - started, errors)
+
+        accumulator = parsing.RecordAccumulator(shapes, tables)
+        names = set(shapes + tables)
+        for _, rows in manifest.rows():
+            for name, name_rows in rows.items():
+                if name in names:
+                    for row in name_rows:
+                        accumulator.append(name, row)
+        stats = {"parsed": len(parsed), "reused": len(hashes) - len(stale), "removed": removed}
+    finally:
+        manifest.close()
+
+    logging.info(f"Incremental reparse: {stats}")
+    return accumulator.flush(), errors, stats
+
+
+def write_metadata_file(df, path):
+    """
+    Replaces a metadata file with the rows of a DataFrame, formatted like the harvest
+    output ("|" separated, line breaks replaced by spaces). The new file is written
+    next to the old one and renamed over it, so a failed run keeps the old file.
+    """
+    temporary = f"{path}.tmp"
+    df.replace(r"\n", " ", regex=True).to_csv(temporary, sep="|", index=False)
+    os.replace(temporary, path)
+
+
+def _clear_side_tables(directory, tables):
+    for name in tables:
+        table_dir = os.path.join(directory, name)
+        if os.path.isdir(table_dir):
+            for part in os.listdir(table_dir):
+                if part.endswith(".parquet"):
+                    os.remove(os.path.join(table_dir, part))
+        if os.path.exists(os.path.join(directory, f"{name}.csv")):
+            os.remove(os.path.join(directory, f"{name}.csv"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the metadata files from the stored PubMed XML.")
+    parser.add_argument("--processes", type=int, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="articles per task")
+    parser.add_argument("--backend", default=None, choices=["auto", "etree", "lxml"],
+                        help="XML backend (default: config.xml_backend)")
+    parser.add_argument("--output-dir", help="write the metadata files here instead of replacing the configured ones")
+    parser.add_argument("--tables", help="also write the normalized side tables to this directory")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only parse articles whose XML or parser version changed (files.file_parse_manifest)")
+    args = parser.parse_args()
+
+    # initialize_environment resolves the project root as the parent of the working directory
+    os.chdir(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "notebook"))
+    utils.initialize_environment()
+    config = utils.CONFIG
+    backend = args.backend or config["config"].get("xml_backend", "etree")
+
+    sources = collect_sources(utils.XML_STORE.directory, utils.XML_STORE)
+    tables = list(parsing.SIDE_TABLES) if args.tables else []
+    if args.incremental:
+        manifest_file = os.path.normpath(os.path.join(
+            utils.OUTPUT_PATH, config["files"].get("file_parse_manifest", DEFAULT_MANIFEST_FILE)
+        ))
+        dfs, errors, _ = reparse_incremental(
+            sources, manifest_file, utils.XML_STORE, tables=tables,
+            processes=args.processes, chunk_size=args.chunk_size, backend=backend,
+        )
+    else:
+        dfs, errors = reparse_sources(
+            sources, tables=tables, processes=args.processes, chunk_size=args.chunk_size, backend=backend,
+        )
+
+    output_dir = args.output_dir or utils.OUTPUT_PATH
+    files = {
+        "pubmed": config["files"].get("file_parsing_pubmed", "PubMed_Metadata.csv"),
+        "bibliometrix": config["files"].get("file_parsing_bibliometrix", "Bibliometrix_Metadata.csv"),
+    }
+    written = []
+    for name, file_name in files.items():
+        path = os.path.normpath(os.path.join(output_dir, file_name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_metadata_file(dfs[name], path)
+        written.append(path)
+
+    # The harvest journal truncates its outputs to their committed size on resume, so
+    # the size of a replaced output must be committed again
+    journal_file = os.path.normpath(os.path.join(
+        utils.OUTPUT_PATH, config["files"].get("file_job_journal", "./metadata/job_journal.sqlite")
+    ))
+    if os.path.exists(journal_file):
+        journal = JobJournal(journal_file)
+        for path in journal.sync_outputs(written):
+            logging.info(f"Journal: committed size of {path} updated")
+        journal.close()
+
+    if tables:
+        _clear_side_tables(args.tables, tables)
+        utils.save_side_tables({name: dfs[name] for name in tables}, args.tables)
+
+    print(f"{len(sources)} articles reparsed, {len(errors)} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,15 @@ import logging
 from Bio import Entrez
 from pathlib import Path
 
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from scripts.ncbi import configure_client, configure_cache, configure_xml_store
+from scripts.xml_store import XmlStore
+from scripts.parsing import set_xml_backend
+
 # var global
 CONFIG = None
 FILE_PATHS = None
@@ -136,6 +145,80 @@ def save_data_to_file(df, file_path):
         logging.error(f"Error saving file: {e}")
 
 
+def save_side_tables(dfs, directory, file_format="auto"):
+    """
+    Save the normalized side tables (`parsing.SIDE_TABLES`) as columnar files.
+
+    With pyarrow installed, each call adds one part file per table
+    (`<directory>/<table>/part-00000.parquet`, ...), read back as one dataset with
+    `load_side_tables`. Without pyarrow, the rows are appended to `<directory>/<table>.csv`
+    ("|" separated, like `save_data_to_file`).
+
+    Parameters:
+        dfs (dict): {table name: DataFrame}, e.g. from `RecordAccumulator.flush()`.
+        directory (str): Output directory of the tables.
+        file_format (str): "parquet", "csv" or "auto" (parquet when pyarrow is installed).
+
+    Returns:
+        dict: {table name: path written}.
+
+    Example:
+        save_side_tables({name: dfs[name] for name in SIDE_TABLES}, "./data/processed/tables")
+    """
+    if file_format == "auto":
+        file_format = "parquet" if pa is not None else "csv"
+    os.makedirs(directory, exist_ok=True)
+
+    written = {}
+    for name, df in dfs.items():
+        if df is None:
+            continue
+        if file_format == "parquet":
+            table_dir = os.path.join(directory, name)
+            os.makedirs(table_dir, exist_ok=True)
+            part = len([f for f in os.listdir(table_dir) if f.endswith(".parquet")])
+            path = os.path.join(table_dir, f"part-{part:05d}.parquet")
+            df.to_parquet(path, index=False)
+        else:
+            path = os.path.join(directory, f"{name}.csv")
+            save_data_to_file(df, path)
+        written[name] = path
+    return written
+
+
+def load_side_tables(directory, tables=None):
+    """
+    Load the side tables written by `save_side_tables` (parquet datasets or CSV files).
+
+    Parameters:
+        directory (str): Directory of the tables.
+        tables (list, optional): Table names to load. Defaults to every table found.
+
+    Returns:
+        dict: {table name: DataFrame}.
+    """
+    found = {}
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        if os.path.isdir(path):
+            found[entry] = path
+        elif entry.endswith(".csv"):
+            found.setdefault(entry[:-len(".csv")], path)
+
+    dfs = {}
+    for name, path in found.items():
+        if tables is not None and name not in tables:
+            continue
+        if os.path.isdir(path):
+            parts = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".parquet"))
+            if not parts:
+                continue
+            dfs[name] = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+        else:
+            dfs[name] = pd.read_csv(path, sep="|")
+    return dfs
+
+
 def load_csv_to_dataframe(file_path, separator="|"):
     """
     Load a CSV file into a Pandas DataFrame with error handling.
@@ -168,39 +251,29 @@ def load_csv_to_dataframe(file_path, separator="|"):
     return None
 
 
-from xml.dom.minidom import parseString
-
 def save_xml_data(article_id, i, xml_data):
     """
-    Saves provided XML data to a file named dynamically based on the article ID.
+    Saves provided XML data to the compressed XML store, keyed by the article ID.
+
+    The same PMID is stored only once, whatever the input row it was found for.
     
     Args:
-        article_id (int or str): The ID of the article to use for naming the file.
-        xml_data (str): The XML data to be saved to the file.
+        article_id (int or str): The PubMed ID of the article.
+        i (int): Index of the input row, used in log messages.
+        xml_data (bytes or str): The XML data to be saved.
         
     Returns:
-        str: The filename where the XML data was saved, or None if an error occurred.
+        bool: True if the XML data is in the store, None if no data was provided, or False if an error occurred.
     """
     try:
-        PATH_XML = os.path.join(PATH_ROOT, CONFIG["directories"].get("xml", "xml"))
-        path_xml_filename = os.path.join(PATH_XML, f"{i}_article_{article_id}.xml")
-        path_xml_filename = os.path.normpath(path_xml_filename)
-        
-        decoded_data = xml_data.decode("utf-8")
-
-        # Formata o XML automaticamente
-        dom = parseString(decoded_data)  # Parse o XML
-        formatted_xml = dom.toprettyxml(indent="  ")  # Adiciona identação e quebras de linha
-
-        #print(formatted_xml)
-        if not decoded_data:
+        if not xml_data:
             logging.warning(f"No XML data provided for article ID: {article_id} {i}")
             return None
 
-        with open(path_xml_filename, "w", encoding="utf-8") as file:
-            file.write(formatted_xml)
-
-        logging.info(f"XML data successfully saved to file: {article_id} {i}")
+        if XML_STORE.put(article_id, xml_data):
+            logging.info(f"XML data successfully saved to store: {article_id} {i}")
+        else:
+            logging.info(f"XML data already in store: {article_id} {i}")
         return True
     
     except Exception as e:
@@ -237,8 +310,10 @@ def clear_all_processec():
 
 
     #clear xml process
+    global XML_STORE
     FILE_XML = os.path.join(PATH_ROOT, CONFIG["directories"]["xml"])
     PATH_FILE_XML = os.path.normpath(os.path.join(PATH_ROOT, FILE_XML))
+    XML_STORE.close()
 
     # Iterate through all files in the directory
     for file_name in os.listdir(PATH_FILE_XML):
@@ -251,6 +326,9 @@ def clear_all_processec():
         else:
             logging.warning(f"Skipping non-file item: {file_name}")
 
+    XML_STORE = XmlStore(PATH_FILE_XML)
+    configure_xml_store(XML_STORE, CONFIG["config"].get("save_xml", False))
+
 
     # clean log file 
     FILE_LOG_TMP = os.path.join(PATH_ROOT, CONFIG["logging"].get("log_file", "execution.log"))
@@ -286,13 +364,14 @@ FILE_PATHS = None
 PATH_ROOT = None
 INPUT_PATH = None
 OUTPUT_PATH = None
+XML_STORE = None
 
 def initialize_environment():
     """
     Initialize the application environment by loading configuration, 
     setting up directories, and configuring logging.
     """
-    global CONFIG, FILE_PATHS, PATH_ROOT, INPUT_PATH, OUTPUT_PATH
+    global CONFIG, FILE_PATHS, PATH_ROOT, INPUT_PATH, OUTPUT_PATH, XML_STORE
 
     # Root path for the application
     PATH_ROOT = os.path.abspath(os.path.join(os.getcwd(), ".."))
@@ -306,6 +385,8 @@ def initialize_environment():
     # Define email and API key for Entrez
     Entrez.email = CONFIG["api_email"]
     Entrez.api_key = CONFIG["api_key"] 
+    configure_client(CONFIG.get("ncbi"), CONFIG["api_key"])
+    configure_cache(CONFIG.get("cache"), PATH_ROOT)
 
     setup_directories(PATH_ROOT, CONFIG["directories"])
 
@@ -320,5 +401,11 @@ def initialize_environment():
     RESEARCH_OUTPUT_PATH_TMP = CONFIG["directories"]['output'] 
     OUTPUT_PATH     = os.path.normpath(os.path.join(PATH_ROOT, RESEARCH_OUTPUT_PATH_TMP))
 
+    # raw XML store, read before requesting articles again
+    PATH_XML = os.path.normpath(os.path.join(PATH_ROOT, CONFIG["directories"].get("xml", "xml")))
+    XML_STORE = XmlStore(PATH_XML)
+    configure_xml_store(XML_STORE, CONFIG["config"].get("save_xml", False))
+    set_xml_backend(CONFIG["config"].get("xml_backend", "etree"))
+
 
 
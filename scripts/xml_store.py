@@ -0,0 +1,290 @@
+"""
+xml_store.py
+
+This module stores the raw PubMed XML of each article, keyed by PMID, in compressed
+append-only shard files with an SQLite index. Several processes may write to the same
+store: appends are serialized with a lock file, and a forked child reopens the shard
+and the index instead of sharing the handles of its parent.
+"""
+
+import contextlib
+import gzip
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DEFAULT_SHARD_SIZE = 256 * 1024 * 1024
+SHARD_NAME = "shard_{:05d}.xml.gz"
+SHARD_PATTERN = re.compile(r"^shard_(\d{5})\.xml\.gz$")
+INDEX_NAME = "index.sqlite"
+LOCK_NAME = "store.lock"
+
+
+def content_hash(xml_data):
+    """
+    Returns the SHA-256 hex digest of the raw XML bytes.
+    """
+    if isinstance(xml_data, str):
+        xml_data = xml_data.encode("utf-8")
+    return hashlib.sha256(xml_data).hexdigest()
+
+
+class XmlStore:
+    """
+    Content store of raw PubMed XML keyed by PMID.
+
+    Every article is written as its own gzip member at the end of the current shard,
+    so a shard is a valid multi-member gzip file that can also be read with `zcat`.
+    The index keeps the shard, offset, length and content hash of the latest version
+    of each PMID. Storing the same bytes again for a PMID is a no-op.
+
+    Example:
+        store = XmlStore("data/processed/xml")
+        store.put("39000000", xml_data)
+        xml_data = store.get("39000000")
+    """
+
+    def __init__(self, directory, shard_size=DEFAULT_SHARD_SIZE, compresslevel=6):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.compresslevel = compresslevel
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._open()
+        self._index.execute(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                pmid TEXT PRIMARY KEY,
+                shard INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+        self._index.commit()
+
+    def _open(self):
+        # Handles are per process: the shard offset and the SQLite connection of a
+        # parent must not be used by a forked child
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(os.path.join(self.directory, INDEX_NAME), timeout=60, check_same_thread=False)
+        self._shard = self._latest_shard()
+        self._writer = None
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            self._open()
+
+    def _latest_shard(self):
+        shards = [int(match.group(1)) for match in map(SHARD_PATTERN.match, os.listdir(self.directory)) if match]
+        return max(shards) if shards else 0
+
+    def _shard_path(self, shard):
+        return os.path.join(self.directory, SHARD_NAME.format(shard))
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        """
+        Holds an exclusive lock on the store across processes while appending.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open_writer(self):
+        """
+        Returns the writer of the latest shard and its current end offset. Another
+        process may have appended to the shard or started a new one, so both are read
+        from the file system under the write lock.
+        """
+        shard = self._latest_shard()
+        if self._writer is None or shard != self._shard:
+            if self._writer is not None:
+                self._writer.close()
+            self._shard = shard
+            self._writer = open(self._shard_path(shard), "ab")
+
+        size = os.fstat(self._writer.fileno()).st_size
+        if size >= self.shard_size:
+            self._writer.close()
+            self._shard += 1
+            self._writer = open(self._shard_path(self._shard), "ab")
+            size = 0
+        return self._writer, size
+
+    def __contains__(self, pmid):
+        self._check_process()
+        with self._lock:
+            return self._index.execute(
+                "SELECT 1 FROM articles WHERE pmid = ?", (str(pmid),)
+            ).fetchone() is not None
+
+    def __len__(self):
+        self._check_process()
+        with self._lock:
+            return self._index.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def get_hash(self, pmid):
+        """
+        Returns the content hash of the stored XML of a PMID, or None.
+        """
+        self._check_process()
+        with self._lock:
+            row = self._index.execute(
+                "SELECT content_hash FROM articles WHERE pmid = ?", (str(pmid),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, pmid, xml_data):
+        """
+        Stores the raw XML of an article.
+
+        Args:
+            pmid (str): The PubMed ID of the article.
+            xml_data (bytes or str): The raw XML returned by EFetch.
+
+        Returns:
+            bool: True if the XML was written, False if the same content was already stored.
+        """
+        if isinstance(xml_data, str):
+            xml_data = xml_data.encode("utf-8")
+        pmid = str(pmid)
+        digest = content_hash(xml_data)
+        member = gzip.compress(xml_data, compresslevel=self.compresslevel, mtime=0)
+
+        self._check_process()
+        with self._lock, self._write_lock():
+            row = self._index.execute(
+                "SELECT content_hash FROM articles WHERE pmid = ?", (pmid,)
+            ).fetchone()
+            if row and row[0] == digest:
+                return False
+
+            writer, offset = self._open_writer()
+            writer.write(member)
+            writer.flush()
+
+            # The index only points to data already written, so a crash leaves at most unused bytes
+            self._index.execute(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?)",
+                (pmid, self._shard, offset, len(member), digest, time.time()),
+            )
+            self._index.commit()
+            return True
+
+    def get(self, pmid):
+        """
+        Returns the stored XML bytes of a PMID, or None if it is not in the store.
+        """
+        self._check_process()
+        with self._lock:
+            row = self._index.execute(
+                "SELECT shard, offset, length FROM articles WHERE pmid = ?", (str(pmid),)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._writer is not None:
+                self._writer.flush()
+
+        shard, offset, length = row
+        with open(self._shard_path(shard), "rb") as file:
+            file.seek(offset)
+            return gzip.decompress(file.read(length))
+
+    def pmids(self):
+        """
+        Returns the list of stored PMIDs.
+        """
+        self._check_process()
+        with self._lock:
+            return [row[0] for row in self._index.execute("SELECT pmid FROM articles")]
+
+    def hashes(self):
+        """
+        Returns {pmid: content hash} of every stored article.
+        """
+        self._check_process()
+        with self._lock:
+            return dict(self._index.execute("SELECT pmid, content_hash FROM articles"))
+
+    def locations(self):
+        """
+        Returns where the latest XML of every PMID is stored, in shard order, so other
+        processes can read the articles without opening the index.
+
+        Returns:
+            list: (pmid, shard path, offset, length) tuples.
+        """
+        self._check_process()
+        with self._lock:
+            rows = self._index.execute(
+                "SELECT pmid, shard, offset, length FROM articles ORDER BY shard, offset"
+            ).fetchall()
+            if self._writer is not None:
+                self._writer.flush()
+        return [(pmid, self._shard_path(shard), offset, length) for pmid, shard, offset, length in rows]
+
+    def iter_articles(self, pmids=None):
+        """
+        Yields stored articles in shard order, so reprocessing reads each shard sequentially.
+
+        Args:
+            pmids (iterable, optional): Restrict the output to these PMIDs.
+
+        Yields:
+            tuple: (pmid, xml_data) for every stored article.
+        """
+        self._check_process()
+        with self._lock:
+            rows = self._index.execute(
+                "SELECT pmid, shard, offset, length FROM articles ORDER BY shard, offset"
+            ).fetchall()
+            if self._writer is not None:
+                self._writer.flush()
+
+        if pmids is not None:
+            wanted = {str(pmid) for pmid in pmids}
+            rows = [row for row in rows if row[0] in wanted]
+
+        file, current_shard = None, None
+        try:
+            for pmid, shard, offset, length in rows:
+                if shard != current_shard:
+                    if file is not None:
+                        file.close()
+                    file, current_shard = open(self._shard_path(shard), "rb"), shard
+                file.seek(offset)
+                yield pmid, gzip.decompress(file.read(length))
+        finally:
+            if file is not None:
+                file.close()
+
+    def close(self):
+        self._check_process()
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._index.close()
+        logging.info(f"XML store closed: {self.directory}")